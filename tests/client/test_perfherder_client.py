@@ -3,6 +3,7 @@ import unittest
 import responses
 
 from treeherder.client.thclient import PerfherderClient
+from treeherder.webapp.api.renderers import MessagePackRenderer
 
 
 class PerfherderClientTest(unittest.TestCase):
@@ -45,3 +46,34 @@ class PerfherderClientTest(unittest.TestCase):
         self.assertEqual(len(series_list), 2)
         self.assertEqual(series_list['signature1']['value'], [1, 2])
         self.assertEqual(series_list['signature2']['value'], [2, 1])
+
+    @responses.activate
+    def test_get_columnar_performance_data(self):
+        pc = PerfherderClient()
+
+        url = '{}?{}'.format(pc._get_endpoint_url(pc.PERFORMANCE_DATA_ENDPOINT, project='mozilla-central'),
+                             'layout=columnar&delta_encode=true&signature_id=1')
+        content = {
+            'signature1': {
+                'signature_id': 1,
+                'push_id': [3, 1, 2],
+                'push_timestamp': [1000, 10, 20],
+                'value': [1.5, 2.5, 0.5],
+                'delta_encoded': ['push_id', 'push_timestamp']
+            }
+        }
+        responses.add(responses.GET, url, json=content, match_querystring=True, status=200)
+        responses.add(responses.GET, url + '&format=msgpack', body=MessagePackRenderer().render(content),
+                      content_type='application/x-msgpack', match_querystring=True, status=200)
+
+        for extra_params in [{}, {'format': 'msgpack'}]:
+            series_list = pc.get_performance_data('mozilla-central',
+                                                  layout='columnar',
+                                                  delta_encode='true',
+                                                  signature_id=1,
+                                                  **extra_params)
+            series = series_list['signature1']
+            self.assertEqual(series['push_id'], [3, 4, 6])
+            self.assertEqual(series['push_timestamp'], [1000, 1010, 1030])
+            self.assertEqual(series['value'], [1.5, 2.5, 0.5])
+            self.assertEqual(series['signature_id'], [1, 1, 1])
@@ -27,13 +27,18 @@ def pytest_addoption(parser):
         action="store_true",
         help="run slow tests",
     )
+    parser.addoption(
+        "--update-golden",
+        action="store_true",
+        help="rewrite golden output files with the current output, rather than checking it",
+    )
 
 
 def pytest_runtest_setup(item):
     """
     Per-test setup.
     - Add an option to run those tests marked as 'slow'
-    - Clear the django cache between runs
+    - Clear the django cache (and in-process caches of database rows) between runs
     """
 
     if 'slow' in item.keywords and not item.config.getoption("--runslow"):
@@ -42,6 +47,9 @@ def pytest_runtest_setup(item):
     from django.core.cache import cache
     cache.clear()
 
+    from treeherder.etl.perf import _signature_cache
+    _signature_cache.clear()
+
 
 @pytest.fixture(scope="session", autouse=True)
 def block_unmocked_requests():
@@ -636,3 +644,16 @@ def generic_reference_data(test_repository):
         first_submission_timestamp=0)
 
     return r
+
+
+@pytest.fixture
+def updates_hub(monkeypatch, settings):
+    """
+    A hub for job and push updates with a fresh in-memory message bus
+    """
+    from treeherder.model import updates
+
+    settings.UPDATES_BUS_URL = 'memory://'
+    monkeypatch.setattr(updates, '_bus', updates.InMemoryBus())
+    monkeypatch.setattr(updates, '_hub', None)
+    return updates.get_hub()
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management import call_command
+
+from treeherder.model.models import (Job,
+                                     Repository)
+
+
+def test_benchmark_ingestion(transactional_db, failure_classifications, tmpdir):
+    output = tmpdir.join('results.json')
+    call_command('benchmark_ingestion', jobs=10, repositories=2, pushes=3,
+                 batch_size=4, log_steps=2, interactive=False,
+                 output=str(output))
+
+    results = json.loads(output.read())
+    assert results['options']['jobs'] == 10
+    assert results['jobs_per_second'] > 0
+    assert results['queries'] > 0
+    stages = results['stages']
+    assert stages['process_job_list']['calls'] == 3
+    assert stages['_load_job']['calls'] == 10
+    assert stages['_load_job']['queries'] > 0
+    assert stages['store_job_artifacts']['calls'] > 0
+
+    # the benchmark data is removed afterwards
+    assert not Repository.objects.filter(name__startswith='benchmark-ingestion-').exists()
+    assert not Job.objects.exists()
+
+    # a second run can be compared with the first
+    call_command('benchmark_ingestion', jobs=10, repositories=2, pushes=3,
+                 batch_size=4, interactive=False, compare=str(output),
+                 output=str(output))
+    results = json.loads(output.read())
+    # unparsed logs are scheduled for parsing, but not parsed
+    assert results['scheduled_tasks']
+    assert results['stages']['_schedule_log_parsing']['calls'] == 10
@@ -10,7 +10,8 @@ from treeherder.etl.buildapi import (CACHE_KEYS,
                                      Builds4hJobsProcess,
                                      PendingJobsProcess,
                                      RunningJobsProcess)
-from treeherder.model.models import Job
+from treeherder.model.models import (BuildapiBuild,
+                                     Job)
 
 
 @pytest.fixture
@@ -137,11 +138,69 @@ def test_ingest_builds4h_jobs(push_stored,
 
     new_jobs_were_added = etl_process.run()
     assert new_jobs_were_added is True
-    assert len(cache.get(CACHE_KEYS['complete'])) == 32
+    assert BuildapiBuild.objects.count() == 32
 
     new_jobs_were_added = etl_process.run()
     assert new_jobs_were_added is False
 
+    # unchanged builds are still skipped if the cache has been flushed
+    cache.clear()
+    new_jobs_were_added = etl_process.run()
+    assert new_jobs_were_added is False
+
+    assert Job.objects.count() == 32
+
+
+def test_ingest_builds4h_jobs_changed(push_stored,
+                                      failure_classifications,
+                                      mock_buildapi_builds4h_url,
+                                      mock_log_parser):
+    """
+    a buildapi completed job whose build has changed is ingested again
+    """
+    etl_process = Builds4hJobsProcess()
+    etl_process.run()
+
+    build = BuildapiBuild.objects.all()[0]
+    build.content_hash = 'changed'
+    build.save()
+
+    new_jobs_were_added = etl_process.run()
+    assert new_jobs_were_added is True
+    assert BuildapiBuild.objects.get(id=build.id).content_hash != 'changed'
+
+    assert Job.objects.count() == 32
+
+
+def test_ingest_builds4h_jobs_not_modified(push_stored,
+                                           failure_classifications,
+                                           activate_responses,
+                                           mock_log_parser):
+    """
+    builds-4hr is not processed again if it has not been modified
+    """
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                        "sample_data",
+                        "buildbot_text.json")
+    with open(path) as f:
+        mocked_content = f.read()
+
+    def builds4h_callback(request):
+        if request.headers.get('If-None-Match') == 'abc':
+            return (304, {}, '')
+        return (200, {'ETag': 'abc'}, mocked_content)
+
+    responses.add_callback(responses.GET, settings.BUILDAPI_BUILDS4H_URL,
+                           callback=builds4h_callback,
+                           content_type='application/json')
+
+    etl_process = Builds4hJobsProcess()
+    assert etl_process.run() is True
+    assert cache.get(CACHE_KEYS['complete_validators'])['etag'] == 'abc'
+
+    assert etl_process.run() is False
+    assert responses.calls[-1].response.status_code == 304
+
     assert Job.objects.count() == 32
 
 
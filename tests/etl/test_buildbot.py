@@ -1,3 +1,6 @@
+import json
+import os
+
 import pytest
 
 from treeherder.etl import buildbot
@@ -1910,3 +1913,51 @@ def test_buildername_translation(buildername, exp_result):
     assert buildbot.extract_platform_info(buildername) == exp_result["platform"]
     assert buildbot.extract_build_type(buildername) == exp_result["build_type"]
     assert buildbot.extract_name_info(buildername) == exp_result["name"]
+
+
+def fixture_buildernames():
+    """Return every buildername used by the buildbot test fixtures."""
+    names = set(buildername for buildername, _ in buildernames)
+
+    def find_buildernames(obj):
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                if key == 'buildername':
+                    names.add(value)
+                find_buildernames(value)
+        elif isinstance(obj, list):
+            for value in obj:
+                find_buildernames(value)
+
+    sample_data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sample_data')
+    for filename in os.listdir(sample_data_dir):
+        if filename.endswith('.json'):
+            with open(os.path.join(sample_data_dir, filename)) as f:
+                find_buildernames(json.load(f))
+    with open(os.path.join(sample_data_dir, 'job_data.txt')) as f:
+        for line in f:
+            names.add(json.loads(line)['job']['reference_data_name'])
+
+    return sorted(names)
+
+
+def test_get_symbols_and_platforms_cache():
+    """
+    test that the memoized buildername lookups give the same results as
+    when the cache is empty, and are unaffected by changes made by the caller
+    """
+    for f in (buildbot.extract_platform_info,
+              buildbot.extract_build_type,
+              buildbot.extract_name_info):
+        f.cache_clear()
+
+    names = fixture_buildernames()
+    expected = [buildbot.get_symbols_and_platforms(buildername) for buildername in names]
+
+    for buildername in names:
+        buildbot.extract_platform_info(buildername).update({'os': 'modified'})
+        buildbot.extract_name_info(buildername).update({'name': 'modified'})
+        buildbot.get_symbols_and_platforms(buildername).update({'branch': 'modified'})
+
+    for buildername, job in zip(names, expected):
+        assert buildbot.get_symbols_and_platforms(buildername) == job, buildername
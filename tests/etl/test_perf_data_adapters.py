@@ -1,9 +1,14 @@
 import copy
 import datetime
 import json
+import threading
 import time
 
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import patch
 
 from tests.test_utils import create_generic_job
 from treeherder.etl.perf import store_performance_artifact
@@ -12,8 +17,12 @@ from treeherder.model.models import (Push,
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
                                     PerformanceDatum,
+                                    PerformanceDatumDailyRollup,
+                                    PerformanceDatumPushRollup,
                                     PerformanceFramework,
                                     PerformanceSignature)
+from treeherder.perf.tasks import (generate_alerts,
+                                   update_daily_rollups)
 
 
 @pytest.fixture
@@ -252,6 +261,55 @@ def test_load_generic_data(test_repository,
     assert signature.last_updated == later_timestamp
 
 
+def test_load_data_for_known_signatures(test_repository, perf_push, perf_job,
+                                        generic_reference_data):
+    PerformanceFramework.objects.create(name='cheezburger', enabled=True)
+
+    def submit_datum(subtest_properties):
+        return {
+            'job_guid': 'fake_job_guid',
+            'name': 'test',
+            'type': 'test',
+            'blob': json.dumps({'performance_data': {
+                'framework': {'name': 'cheezburger'},
+                'suites': [{
+                    'name': 'cheezburger metrics',
+                    'value': 10.0,
+                    'subtests': [dict(subtest_properties, name='test%s' % i, value=i)
+                                 for i in range(20)]
+                }]
+            }})
+        }
+
+    store_performance_artifact(perf_job, submit_datum({}))
+    assert PerformanceSignature.objects.count() == 21
+    assert PerformanceDatum.objects.count() == 21
+
+    # storing data for signatures seen before takes the same number of
+    # queries however many there are (not counting alert generation)
+    later_timestamp = datetime.datetime.fromtimestamp(int(time.time()) + 5)
+    later_push = Push.objects.create(
+        repository=test_repository,
+        revision='1234abcd12',
+        author='foo@bar.com',
+        time=later_timestamp)
+    later_job = create_generic_job('lateguid', test_repository,
+                                   later_push.id, 2, generic_reference_data)
+    with CaptureQueriesContext(connection) as queries, \
+            patch('treeherder.perf.tasks.generate_alerts'):
+        store_performance_artifact(later_job, submit_datum({}))
+    assert len(queries) <= 8
+    assert PerformanceDatum.objects.count() == 42
+    assert set(PerformanceSignature.objects.values_list(
+        'last_updated', flat=True)) == {later_timestamp}
+
+    # changed properties are still stored
+    store_performance_artifact(later_job, submit_datum({'lowerIsBetter': False}))
+    assert PerformanceDatum.objects.count() == 42
+    assert not PerformanceSignature.objects.filter(
+        test='test1').values_list('lower_is_better', flat=True)[0]
+
+
 def test_no_performance_framework(test_repository,
                                   failure_classifications,
                                   generic_reference_data):
@@ -458,6 +516,164 @@ def test_alert_generation_repo_no_alerts(test_repository,
     assert 0 == PerformanceAlertSummary.objects.all().count()
 
 
+def test_alert_generation_coalesced(test_repository, perf_push,
+                                    failure_classifications,
+                                    generic_reference_data):
+    PerformanceFramework.objects.create(name='cheezburger', enabled=True)
+
+    def store_job_data(i):
+        guid = 'myguid%s' % i
+        job = create_generic_job(guid, test_repository, perf_push.id, i,
+                                 generic_reference_data)
+        store_performance_artifact(job, {
+            'job_guid': guid,
+            'name': 'test',
+            'type': 'test',
+            'blob': json.dumps({'performance_data': {
+                'framework': {'name': 'cheezburger'},
+                'suites': [{
+                    'name': 'cheezburger metrics',
+                    'subtests': [{'name': 'test%s' % j, 'value': j} for j in range(3)]
+                }]
+            }})
+        })
+
+    # all the subtests are analyzed by a single task
+    with patch('treeherder.perf.tasks.generate_alerts') as mock_generate_alerts:
+        store_job_data(1)
+    signature_ids = sorted(PerformanceSignature.objects.values_list('id', flat=True))
+    assert len(signature_ids) == 3
+    assert mock_generate_alerts.apply_async.call_count == 1
+    assert mock_generate_alerts.apply_async.call_args[1]['args'] == [signature_ids]
+
+    # a retrigger before that runs doesn't schedule another
+    with patch('treeherder.perf.tasks.generate_alerts') as mock_generate_alerts:
+        store_job_data(2)
+    assert not mock_generate_alerts.apply_async.called
+
+    # but does once it has
+    generate_alerts(signature_ids)
+    with patch('treeherder.perf.tasks.generate_alerts') as mock_generate_alerts:
+        store_job_data(3)
+    assert mock_generate_alerts.apply_async.call_args[1]['args'] == [signature_ids]
+
+    # an error analyzing one signature doesn't stop the others from being
+    # analyzed, or keep it from being scheduled again
+    analyzed = []
+
+    def generate_new_alerts_in_series(signature):
+        analyzed.append(signature.id)
+        if signature.id == signature_ids[0]:
+            raise ValueError("broken series")
+
+    with patch('treeherder.perf.tasks.generate_new_alerts_in_series',
+               side_effect=generate_new_alerts_in_series):
+        generate_alerts(signature_ids)
+    assert sorted(analyzed) == signature_ids
+    with patch('treeherder.perf.tasks.generate_alerts') as mock_generate_alerts:
+        store_job_data(4)
+    assert mock_generate_alerts.apply_async.call_args[1]['args'] == [signature_ids]
+
+
+def _store_subtest_value(job, value):
+    store_performance_artifact(job, {
+        'job_guid': job.guid,
+        'name': 'test',
+        'type': 'test',
+        'blob': json.dumps({'performance_data': {
+            'framework': {'name': 'cheezburger'},
+            'suites': [{
+                'name': 'cheezburger metrics',
+                'subtests': [{'name': 'test1', 'value': value}]
+            }]
+        }})
+    })
+
+
+def test_rollups(test_repository, perf_push, failure_classifications,
+                 generic_reference_data):
+    PerformanceFramework.objects.create(name='cheezburger', enabled=True)
+
+    def store_job_data(i, value):
+        _store_subtest_value(create_generic_job('myguid%s' % i, test_repository,
+                                                perf_push.id, i,
+                                                generic_reference_data), value)
+
+    # per-push rollups are kept up to date on ingestion, including retriggers
+    for (i, value) in enumerate([1.0, 2.0, 6.0]):
+        store_job_data(i, value)
+    rollup = PerformanceDatumPushRollup.objects.get()
+    assert (rollup.push_id, rollup.push_timestamp) == (perf_push.id, perf_push.time)
+    assert (rollup.count, rollup.min, rollup.max, rollup.mean, rollup.median) == \
+        (3, 1.0, 6.0, 3.0, 2.0)
+
+    # daily rollups are updated by a periodic task
+    assert not PerformanceDatumDailyRollup.objects.exists()
+    update_daily_rollups()
+    rollup = PerformanceDatumDailyRollup.objects.get()
+    assert (rollup.day, rollup.count, rollup.mean) == (perf_push.time.date(), 3, 3.0)
+
+    store_job_data(3, 3.0)
+    update_daily_rollups()
+    rollup = PerformanceDatumDailyRollup.objects.get()
+    assert (rollup.count, rollup.mean, rollup.median) == (4, 3.0, 2.5)
+
+    # and can be rebuilt from scratch
+    PerformanceDatumPushRollup.objects.all().delete()
+    PerformanceDatumDailyRollup.objects.all().delete()
+    call_command('update_perf_rollups', project=[test_repository.name], days=1)
+    assert PerformanceDatumPushRollup.objects.get().count == 4
+    assert PerformanceDatumDailyRollup.objects.get().count == 4
+
+
+@pytest.mark.skipif(connection.vendor != 'mysql',
+                    reason="needs row locks, which sqlite doesn't have")
+def test_rollups_concurrent_retriggers(test_repository, perf_push,
+                                       failure_classifications,
+                                       generic_reference_data):
+    PerformanceFramework.objects.create(name='cheezburger', enabled=True)
+    jobs = [create_generic_job('myguid%s' % i, test_repository, perf_push.id, i,
+                               generic_reference_data) for i in range(3)]
+    _store_subtest_value(jobs[0], 1.0)
+
+    # the first retrigger is paused just before writing its datum and the
+    # push's rollup, while the second is stored
+    paused = threading.Event()
+    resume = threading.Event()
+    bulk_create = PerformanceDatum.objects.bulk_create
+
+    def pausing_bulk_create(objs):
+        if threading.current_thread().name == 'first':
+            paused.set()
+            resume.wait(10)
+        return bulk_create(objs)
+
+    def store(job, value):
+        try:
+            _store_subtest_value(job, value)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=store, args=(jobs[1], 2.0), name='first'),
+               threading.Thread(target=store, args=(jobs[2], 6.0), name='second')]
+    with patch.object(PerformanceDatum.objects, 'bulk_create',
+                      side_effect=pausing_bulk_create), \
+            patch('treeherder.perf.tasks.generate_alerts'):
+        threads[0].start()
+        assert paused.wait(10)
+        threads[1].start()
+        # the second waits for the first to finish with the signature
+        threads[1].join(1)
+        assert threads[1].is_alive()
+        resume.set()
+        for thread in threads:
+            thread.join(10)
+
+    rollup = PerformanceDatumPushRollup.objects.get()
+    assert (rollup.count, rollup.min, rollup.max, rollup.mean, rollup.median) == \
+        (3, 1.0, 6.0, 3.0, 2.0)
+
+
 def test_framework_not_enabled(test_repository,
                                failure_classifications,
                                generic_reference_data):
@@ -3,9 +3,12 @@ import pytest
 from tests.test_utils import add_log_response
 from treeherder.etl.jobs import store_job_data
 from treeherder.etl.push import store_push_data
+from treeherder.log_parser import tasks
+from treeherder.log_parser.tasks import parse_logs
 from treeherder.model.error_summary import get_error_summary
 from treeherder.model.models import (Job,
                                      JobDetail,
+                                     JobLog,
                                      TextLogError)
 
 from ..sampledata import SampleData
@@ -74,3 +77,28 @@ def test_create_error_summary(failure_classifications,
     expected_keys = set(["search", "search_terms", "bugs"])
     for failure_line in bug_suggestions:
         assert set(failure_line.keys()) == expected_keys
+
+
+def test_parse_logs_runs_all_parsers(test_job, monkeypatch):
+    """
+    check that every log of a job is parsed even when one of the parsers
+    fails, and that the failure is then raised from the task
+    """
+    parsed = []
+
+    def failing_parser(job_log):
+        raise ValueError("Failed to parse %s" % job_log.name)
+
+    def parser(job_log):
+        parsed.append(job_log.name)
+
+    monkeypatch.setattr(tasks, "store_failure_lines", failing_parser)
+    monkeypatch.setattr(tasks, "parse_unstructured_log", parser)
+
+    job_logs = [JobLog.objects.create(job=test_job, name=name, url="http://example.com/%s" % name)
+                for name in ("errorsummary_json", "buildbot_text")]
+
+    with pytest.raises(ValueError):
+        parse_logs(test_job.id, [job_log.id for job_log in job_logs], "normal")
+
+    assert parsed == ["buildbot_text"]
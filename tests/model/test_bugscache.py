@@ -123,6 +123,27 @@ def test_get_recent_resolved_bugs(transactional_db, sample_bugs):
     assert all_others_bugs == exp_bugs
 
 
+def test_search_many(transactional_db, sample_bugs):
+    """Test that searching for several terms at once gets each its own bugs."""
+    resolved_search_term = "Recently modified resolved bugs should be returned in all_others"
+    bug_list = sample_bugs['bugs']
+    fifty_days_ago = datetime.now() - timedelta(days=50)
+    for bug in bug_list:
+        bug['last_change_time'] = fifty_days_ago
+    _update_bugscache(bug_list)
+
+    search_terms = [search_term for (search_term, _) in BUG_SEARCHES]
+    suggestions = Bugscache.search_many(search_terms + [resolved_search_term,
+                                                        search_terms[0]])
+    assert set(suggestions.keys()) == set(search_terms + [resolved_search_term])
+    for (search_term, exp_bugs) in BUG_SEARCHES:
+        assert [b['id'] for b in suggestions[search_term]['open_recent']] == exp_bugs
+        assert len(suggestions[search_term]['all_others']) == 0
+    assert len(suggestions[resolved_search_term]['open_recent']) == 0
+    assert [b['id'] for b in suggestions[resolved_search_term]['all_others']] == [100001]
+    assert Bugscache.search_many([]) == {}
+
+
 def test_bug_properties(transactional_db, sample_bugs):
     """Test that we retrieve recent, but fixed bugs for a search term."""
     search_term = "test_popup_preventdefault_chrome.xul"
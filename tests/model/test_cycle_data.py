@@ -2,6 +2,7 @@ import datetime
 
 import pytest
 from django.core.management import call_command
+from mock import patch
 
 from tests import test_utils
 from tests.autoclassify.utils import (create_failure_lines,
@@ -17,6 +18,8 @@ from treeherder.model.models import (FailureLine,
 from treeherder.model.search import TestFailureLine as _TestFailureLine
 from treeherder.model.search import refresh_all
 from treeherder.perf.models import (PerformanceDatum,
+                                    PerformanceDatumDailyRollup,
+                                    PerformanceDatumPushRollup,
                                     PerformanceSignature)
 
 
@@ -158,7 +161,6 @@ def test_cycle_job_model_reference_data(test_repository, failure_classifications
     assert Machine.objects.filter(id__in=original_machine_ids).count() == len(original_machine_ids)
 
 
-@pytest.mark.skip(reason="Perf data cycling temporarily disabled (bug 1346567)")
 def test_cycle_job_with_performance_data(test_repository, failure_classifications,
                                          test_job, mock_log_parser,
                                          test_perf_signature):
@@ -185,7 +187,6 @@ def test_cycle_job_with_performance_data(test_repository, failure_classification
     assert p.job is None
 
 
-@pytest.mark.skip(reason="Perf data cycling temporarily disabled (bug 1346567)")
 @pytest.mark.parametrize("test_repository_expire_data", [False, True])
 def test_cycle_performance_data(test_repository, push_stored,
                                 test_perf_signature,
@@ -245,3 +246,94 @@ def test_cycle_performance_data(test_repository, push_stored,
         assert list(PerformanceDatum.objects.values_list('id', flat=True)) == [1, 2]
         assert list(PerformanceSignature.objects.values_list('id', flat=True)) == [
             test_perf_signature.id, test_perf_signature_2.id]
+
+
+def test_cycle_performance_rollups(test_repository, push_stored,
+                                   test_perf_signature):
+    test_repository.expire_performance_data = True
+    test_repository.save()
+
+    expired_timestamp = datetime.datetime.now() - datetime.timedelta(weeks=1)
+    (push1, push2) = Push.objects.order_by('id')[:2]
+    push1.time = datetime.datetime.now()
+    push1.save()
+    push2.time = expired_timestamp
+    push2.save()
+
+    for push in [push1, push2]:
+        PerformanceDatum.objects.create(
+            repository=test_repository,
+            push=push,
+            signature=test_perf_signature,
+            push_timestamp=push.time,
+            value=1.0)
+        PerformanceDatumPushRollup.objects.create(
+            repository=test_repository,
+            signature=test_perf_signature,
+            push=push,
+            push_timestamp=push.time,
+            **PerformanceDatumPushRollup.summarize([1.0]))
+        PerformanceDatumDailyRollup.objects.create(
+            repository=test_repository,
+            signature=test_perf_signature,
+            day=push.time.date(),
+            **PerformanceDatumDailyRollup.summarize([1.0]))
+
+    call_command('cycle_data', sleep_time=0, days=1)
+
+    # the signature still has data, but only the rollups of it are kept
+    assert list(PerformanceDatumPushRollup.objects.values_list(
+        'push_id', flat=True)) == [push1.id]
+    assert list(PerformanceDatumDailyRollup.objects.values_list(
+        'day', flat=True)) == [push1.time.date()]
+
+
+def test_cycle_performance_data_resumes(test_repository, push_stored,
+                                        test_perf_signature):
+    expired_timestamp = datetime.datetime.now() - datetime.timedelta(weeks=1)
+    push = Push.objects.all()[0]
+    signatures = [test_perf_signature]
+    for i in range(2):
+        signatures.append(PerformanceSignature.objects.create(
+            signature_hash=str(i) * 40,
+            repository=test_perf_signature.repository,
+            framework=test_perf_signature.framework,
+            platform=test_perf_signature.platform,
+            option_collection=test_perf_signature.option_collection,
+            suite=test_perf_signature.suite,
+            test='test %s' % i,
+            last_updated=expired_timestamp,
+            has_subtests=False))
+    for signature in signatures:
+        for value in range(5):
+            PerformanceDatum.objects.create(
+                repository=test_repository,
+                push=push,
+                signature=signature,
+                push_timestamp=expired_timestamp,
+                value=value)
+
+    # interrupt cycling after the first signature's data has been deleted,
+    # in chunks
+    with patch('treeherder.perf.models._throttle',
+               side_effect=[None, None, KeyboardInterrupt]) as mock_throttle:
+        with pytest.raises(KeyboardInterrupt):
+            PerformanceDatum.objects.cycle_data(test_repository,
+                                                datetime.timedelta(days=1),
+                                                3, 0)
+    assert mock_throttle.call_count == 3
+    assert PerformanceDatum.objects.filter(signature=signatures[0]).count() == 0
+    assert PerformanceDatum.objects.filter(signature=signatures[1]).count() == 2
+
+    # the next run carries on from the second signature
+    with patch('treeherder.perf.models.PerformanceDatumManager.filter',
+               side_effect=PerformanceDatum.objects.filter) as mock_filter:
+        assert PerformanceDatum.objects.cycle_data(test_repository,
+                                                   datetime.timedelta(days=1),
+                                                   3, 0) == 7
+    assert [call[1]['signature_id'] for call in mock_filter.call_args_list] == [
+        signatures[1].id, signatures[2].id]
+    assert PerformanceDatum.objects.count() == 0
+    # signatures which have been updated recently are kept regardless
+    assert list(PerformanceSignature.objects.values_list('id', flat=True)) == [
+        test_perf_signature.id]
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.model.models import (Option,
+                                     OptionCollection,
+                                     OptionCollectionManager)
+
+
+def _create_option_collection(name):
+    OptionCollection.objects.create(
+        option_collection_hash=OptionCollection.calculate_hash([name]),
+        option=Option.objects.create(name=name))
+
+
+def test_option_collection_map_cache(transactional_db):
+    _create_option_collection('opt')
+    opt_hash = OptionCollection.calculate_hash(['opt'])
+    assert OptionCollection.objects.get_option_collection_map() == {opt_hash: 'opt'}
+    assert OptionCollection.objects.get_option_collection_map(
+        options_as_list=True) == {opt_hash: ['opt']}
+
+    # the map is only read from the database once
+    with CaptureQueriesContext(connection) as queries:
+        OptionCollection.objects.get_option_collection_map()
+    assert len(queries) == 0
+
+    # other processes' maps are rebuilt when an option collection is created
+    other_process_maps = OptionCollectionManager._cached_maps
+    _create_option_collection('debug')
+    debug_hash = OptionCollection.calculate_hash(['debug'])
+    OptionCollectionManager._cached_maps = other_process_maps
+    assert OptionCollection.objects.get_option_collection_map() == {
+        opt_hash: 'opt', debug_hash: 'debug'}
+
+    # as they are if the cache has been flushed
+    OptionCollection.objects.filter(option__name='debug').delete()
+    cache.clear()
+    assert OptionCollection.objects.get_option_collection_map() == {opt_hash: 'opt'}
@@ -0,0 +1,86 @@
+import copy
+
+from django.core.management import call_command
+from mock import patch
+
+from treeherder.etl.jobs import store_job_data
+from treeherder.model.models import (FailureClassification,
+                                     Job,
+                                     JobNote,
+                                     Push,
+                                     PushJobCount)
+
+
+def test_get_pushed_revisions(test_repository, test_repository_2, push_stored, sample_push):
+    revision = sample_push[0]['revision']
+    unknown_revision = 'f' * 40
+
+    requested = [revision, revision[:12], sample_push[1]['revision'][:12],
+                 unknown_revision, unknown_revision[:12], None]
+    expected = {revision, revision[:12], sample_push[1]['revision'][:12]}
+
+    assert Push.objects.get_pushed_revisions(test_repository, requested) == expected
+    assert Push.objects.get_pushed_revisions(test_repository.name, requested) == expected
+    assert Push.objects.get_pushed_revisions(test_repository_2, requested) == set()
+    assert Push.objects.get_pushed_revisions(test_repository, []) == set()
+
+
+def test_push_job_counts(eleven_jobs_stored, test_repository, test_user):
+    push_ids = list(Push.objects.values_list('id', flat=True))
+    # the counts are kept up to date as jobs are stored
+    assert PushJobCount.objects.count() > 0
+    assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == set()
+    statuses = PushJobCount.objects.get_statuses(push_ids)
+    # (with superseded jobs also counted as coalesced, for backwards compatibility)
+    assert sum(total for status in statuses.values() for (key, total) in status.items()
+               if key != 'coalesced') == Job.objects.count()
+
+    # and as they're classified
+    job = Job.objects.filter(result='success').first()
+    JobNote.objects.create(job=job, user=test_user, text='',
+                           failure_classification=FailureClassification.objects.get(
+                               name='intermittent'))
+    assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == set()
+    expected_status = dict(statuses[job.push_id])
+    expected_status['success'] -= 1
+    if not expected_status['success']:
+        del expected_status['success']
+    assert job.push.get_status() == expected_status
+
+    # pushes without stored counts are counted on the fly
+    PushJobCount.objects.filter(push=job.push).delete()
+    assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == {job.push_id}
+    assert job.push.get_status() == expected_status
+
+    # (the sample pushes are from years ago)
+    call_command('check_push_job_counts', '--days', '10000', '--dry-run')
+    assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == {job.push_id}
+    call_command('check_push_job_counts', '--days', '10000',
+                 '--project', test_repository.name)
+    assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == set()
+
+
+def test_push_job_counts_job_changes(test_repository, failure_classifications,
+                                     eleven_job_blobs):
+    # the counts are adjusted for the changes to each job as it is stored,
+    # rather than recalculated from all of its push's jobs
+    push_ids = list(Push.objects.values_list('id', flat=True))
+    (job, other_job) = copy.deepcopy(eleven_job_blobs[:2])
+    other_job['job'].update(state='running', result='unknown')
+
+    with patch.object(PushJobCount.objects, 'update_counts',
+                      side_effect=AssertionError):
+        for (state, result, superseded) in [('pending', 'unknown', []),
+                                            ('running', 'unknown', []),
+                                            ('completed', 'testfailed',
+                                             [other_job['job']['job_guid']])]:
+            job['job'].update(state=state, result=result)
+            job['superseded'] = superseded
+            store_job_data(test_repository, [job, other_job])
+            assert PushJobCount.objects.get_inconsistent_push_ids(push_ids) == set()
+
+    statuses = PushJobCount.objects.get_statuses(push_ids)
+    assert statuses[Job.objects.get(guid=job['job']['job_guid']).push_id] == {
+        'testfailed': 1}
+    assert statuses[Job.objects.get(guid=other_job['job']['job_guid']).push_id] == {
+        'superseded': 1, 'coalesced': 1}
@@ -0,0 +1,77 @@
+import copy
+
+from django.db.models import F
+
+from treeherder.etl.jobs import store_job_data
+from treeherder.etl.push import store_push
+from treeherder.model.models import (Job,
+                                     Push)
+
+
+def _event(event_id):
+    return {'id': event_id, 'type': 'job', 'data': {}}
+
+
+def test_hub_fan_out(updates_hub, settings):
+    settings.UPDATES_CLIENT_BUFFER_SIZE = 2
+    subscriptions = [updates_hub.subscribe('mozilla-central') for _ in range(2)]
+    other_subscription = updates_hub.subscribe('mozilla-inbound')
+
+    updates_hub.bus.publish('mozilla-central', _event('1'))
+    assert [s.get(0) for s in subscriptions] == [_event('1')] * 2
+    assert other_subscription.get(0) is None
+
+    # buffers are bounded, with clients that fall too far behind marked as
+    # having overflowed
+    for event_id in ['2', '3', '4']:
+        updates_hub.bus.publish('mozilla-central', _event(event_id))
+    assert subscriptions[0].overflowed
+    subscriptions[0].reset()
+    assert not subscriptions[0].overflowed
+    assert subscriptions[0].get(0) is None
+
+    subscriptions[1].close()
+    updates_hub.bus.publish('mozilla-central', _event('5'))
+    assert subscriptions[0].get(0) == _event('5')
+    assert subscriptions[1] not in updates_hub.subscriptions['mozilla-central']
+
+
+def test_hub_replay(updates_hub, settings):
+    settings.UPDATES_REPLAY_BUFFER_SIZE = 3
+    updates_hub.subscribe('mozilla-central')
+    for event_id in ['1', '2', '3', '4']:
+        updates_hub.bus.publish('mozilla-central', _event(event_id))
+
+    subscription = updates_hub.subscribe('mozilla-central', last_event_id='3')
+    assert subscription.get(0) == _event('4')
+    assert subscription.get(0) is None
+    assert not subscription.overflowed
+
+    # updates too old to replay have been missed
+    subscription = updates_hub.subscribe('mozilla-central', last_event_id='1')
+    assert subscription.overflowed
+
+
+def test_job_and_push_updates(updates_hub, test_repository,
+                              failure_classifications, eleven_job_blobs,
+                              sample_push):
+    subscription = updates_hub.subscribe(test_repository.name)
+
+    push_dict = copy.deepcopy(sample_push[0])
+    push_dict['revision'] = 'f' * 40
+    store_push(test_repository, push_dict)
+    event = subscription.get(0)
+    assert event['type'] == 'push'
+    assert event['data']['id'] == Push.objects.get(revision='f' * 40).id
+    assert event['data']['revision'] == 'f' * 40
+    # only new pushes are published
+    store_push(test_repository, push_dict)
+    assert subscription.get(0) is None
+
+    store_job_data(test_repository, eleven_job_blobs[:2])
+    events = [subscription.get(0) for _ in range(2)]
+    assert subscription.get(0) is None
+    assert all(event['type'] == 'job' for event in events)
+    assert (sorted(tuple(sorted(event['data'].items())) for event in events) ==
+            sorted(tuple(sorted(job.items())) for job in Job.objects.values(
+                'id', 'push_id', 'state', 'result', job_guid=F('guid'))))
@@ -2,10 +2,12 @@ import datetime
 
 import pytest
 from django.core.exceptions import ValidationError
+from mock import patch
 
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
-                                    PerformanceSignature)
+                                    PerformanceSignature,
+                                    batched_status_updates)
 
 
 def test_summary_modification(test_repository, test_perf_signature,
@@ -75,6 +77,47 @@ def test_summary_status(test_repository, test_perf_signature,
     assert s.status == PerformanceAlertSummary.IMPROVEMENT
 
 
+def test_batched_summary_status_updates(test_repository, test_perf_signature,
+                                        test_perf_alert_summary):
+    alerts = []
+    for i in range(5):
+        signature = PerformanceSignature.objects.create(
+            repository=test_repository,
+            signature_hash=(40*str(i)),
+            framework=test_perf_signature.framework,
+            platform=test_perf_signature.platform,
+            option_collection=test_perf_signature.option_collection,
+            suite='mysuite',
+            test='mytest_%s' % i,
+            has_subtests=False,
+            last_updated=datetime.datetime.now())
+        alerts.append(PerformanceAlert.objects.create(
+            summary=test_perf_alert_summary,
+            series_signature=signature,
+            is_regression=(i == 0),
+            amount_pct=0.5,
+            amount_abs=50.0,
+            prev_value=100.0,
+            new_value=150.0,
+            t_value=20.0))
+
+    autodetermine_status = PerformanceAlertSummary.autodetermine_status
+    with patch.object(PerformanceAlertSummary, 'autodetermine_status',
+                      autospec=True, side_effect=autodetermine_status) as mock_autodetermine:
+        with batched_status_updates():
+            for alert in alerts:
+                alert.status = PerformanceAlert.ACKNOWLEDGED
+                alert.save()
+            # nothing's updated until the end of the block
+            assert PerformanceAlertSummary.objects.get(
+                id=test_perf_alert_summary.id).status == PerformanceAlertSummary.UNTRIAGED
+
+    # and then the summary only once
+    assert mock_autodetermine.call_count == 1
+    assert PerformanceAlertSummary.objects.get(
+        id=test_perf_alert_summary.id).status == PerformanceAlertSummary.INVESTIGATING
+
+
 def test_alert_modification(test_perf_signature, test_perf_alert_summary,
                             push_stored, test_perf_alert):
     p = test_perf_alert
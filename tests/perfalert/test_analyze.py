@@ -1,7 +1,10 @@
+import copy
 import os
 
 import pytest
 
+from tests.perfalert.utils import (random_series,
+                                   reference_detect_changes)
 from tests.sampledata import SampleData
 from treeherder.perfalert.perfalert import (RevisionDatum,
                                             analyze,
@@ -125,3 +128,43 @@ def test_detect_changes_historical_data(filename, expected_timestamps):
     regression_timestamps = [d.push_timestamp for d in results if
                              d.change_detected]
     assert regression_timestamps == expected_timestamps
+
+
+@pytest.mark.parametrize(("seed", "min_back_window", "max_back_window",
+                          "fore_window", "t_threshold"), [
+    (0, 12, 24, 12, 7),
+    (1, 12, 24, 12, 7),
+    (2, 5, 10, 5, 2),
+    (3, 6, 30, 8, 5),
+    (4, 1, 1, 1, 3),
+    ])
+@pytest.mark.parametrize('series_kwargs', [
+    {},
+    # windows where every value is the same
+    dict(constant_probability=1.0),
+    # windows where the values hardly differ, between big steps
+    dict(noise=1e-6, constant_probability=0.0),
+    dict(noise=1e-6, constant_probability=0.5),
+    ], ids=['random', 'constant', 'near_constant', 'mixed'])
+def test_detect_changes_matches_reference(seed, min_back_window,
+                                          max_back_window, fore_window,
+                                          t_threshold, series_kwargs):
+    data = random_series(seed, 500, **series_kwargs)
+    kwargs = dict(min_back_window=min_back_window,
+                  max_back_window=max_back_window, fore_window=fore_window,
+                  t_threshold=t_threshold)
+    expected = reference_detect_changes(copy.deepcopy(data), **kwargs)
+    result = detect_changes(data, **kwargs)
+
+    assert [d.push_id for d in result] == [d.push_id for d in expected]
+    assert [d.change_detected for d in result] == [d.change_detected for d in expected]
+    assert any(d.change_detected for d in result)
+    for (d, e) in zip(result[1:], expected[1:]):
+        assert d.t == pytest.approx(e.t, rel=1e-6, abs=1e-6)
+        assert d.amount_prev_data == e.amount_prev_data
+        assert d.amount_next_data == e.amount_next_data
+        for stats in ('historical_stats', 'forward_stats'):
+            assert getattr(d, stats)['n'] == getattr(e, stats)['n']
+            assert getattr(d, stats)['avg'] == pytest.approx(getattr(e, stats)['avg'], rel=1e-9)
+            assert getattr(d, stats)['variance'] == pytest.approx(getattr(e, stats)['variance'],
+                                                                  rel=1e-6, abs=1e-9)
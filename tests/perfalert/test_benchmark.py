@@ -0,0 +1,92 @@
+"""
+Benchmarks of change detection on synthetic and real series, reporting time
+per point and peak memory use. These are slow, so only run with --runslow:
+
+    pytest tests/perfalert/test_benchmark.py --runslow -s
+"""
+import multiprocessing
+import resource
+import time
+
+import pytest
+
+from tests.perfalert.utils import (GRAPH_SERIES,
+                                   graph_series,
+                                   random_series,
+                                   reference_detect_changes)
+from treeherder.perfalert.perfalert import (analyze,
+                                            calc_t,
+                                            detect_changes,
+                                            linear_weights)
+
+slow = pytest.mark.slow
+
+# (description, random_series keyword arguments) of the synthetic series to
+# benchmark with, varying length, noise, values per revision and step changes
+BENCHMARK_SERIES = [
+    ('100 revisions', dict(seed=1, num_revisions=100)),
+    ('1000 revisions', dict(seed=1, num_revisions=1000)),
+    ('10000 revisions', dict(seed=1, num_revisions=10000)),
+    ('high noise', dict(seed=2, num_revisions=1000, noise=20.0)),
+    ('frequent steps', dict(seed=3, num_revisions=1000, step_probability=0.2)),
+    ('single values', dict(seed=4, num_revisions=1000, values_per_revision=(1,))),
+    ('retriggered', dict(seed=5, num_revisions=1000, values_per_revision=(5, 10, 20))),
+]
+
+
+def _analyze_windows(data, window=12):
+    for i in range(window, len(data) - window):
+        analyze(data[i - window:i])
+        calc_t(data[i - window:i], data[i:i + window], linear_weights)
+
+
+def _run(args):
+    """
+    Runs a benchmark in a fresh process, so that its peak memory use isn't
+    that of whichever benchmark ran before it
+    """
+    (func, data, repeat) = args
+    # ru_maxrss is in kilobytes on Linux, and starts out as the parent's
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    for _ in range(repeat):
+        func(list(data))
+    elapsed = (time.time() - start) / repeat
+    return (elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss)
+
+
+def _benchmark(capsys, description, func, data, repeat=3):
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        (elapsed, rss_increase) = pool.apply(_run, ((func, data, repeat),))
+    finally:
+        pool.terminate()
+    num_points = sum(len(d.values) for d in data)
+    with capsys.disabled():
+        print("\n{:<36} {:>8} points {:>10.2f} us/point {:>8} KiB peak RSS increase".format(
+            description, num_points, elapsed / num_points * 1e6, rss_increase))
+
+
+@slow
+@pytest.mark.parametrize(('description', 'kwargs'), BENCHMARK_SERIES)
+@pytest.mark.parametrize('func', [detect_changes, reference_detect_changes])
+def test_benchmark_detect_changes(capsys, description, kwargs, func):
+    if func is reference_detect_changes and kwargs['num_revisions'] > 1000:
+        pytest.skip("too slow")
+    _benchmark(capsys, '{} {}'.format(func.__name__, description), func,
+               random_series(**kwargs))
+
+
+@slow
+@pytest.mark.parametrize('filename', GRAPH_SERIES)
+@pytest.mark.parametrize('func', [detect_changes, reference_detect_changes])
+def test_benchmark_detect_changes_graph_series(capsys, filename, func):
+    _benchmark(capsys, '{} {}'.format(func.__name__, filename), func,
+               graph_series(filename))
+
+
+@slow
+@pytest.mark.parametrize(('description', 'kwargs'), BENCHMARK_SERIES[:2])
+def test_benchmark_analyze(capsys, description, kwargs):
+    _benchmark(capsys, 'analyze/calc_t {}'.format(description),
+               _analyze_windows, random_series(**kwargs))
@@ -2,13 +2,18 @@ import datetime
 import time
 
 import pytest
+from django.core.management import call_command
+from django.utils.six import StringIO
+from mock import patch
 
 from treeherder.model.models import Push
 from treeherder.perf.alerts import generate_new_alerts_in_series
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
+                                    PerformanceAnalysisState,
                                     PerformanceDatum,
                                     PerformanceSignature)
+from treeherder.perfalert.perfalert import detect_changes
 
 
 def _verify_alert(alertid, expected_push_id, expected_prev_push_id,
@@ -200,3 +205,125 @@ def test_alert_change_type_absolute(test_repository,
 
     assert PerformanceAlert.objects.count() == expected_num_alerts
     assert PerformanceAlertSummary.objects.count() == expected_num_alerts
+
+
+def test_detect_alerts_incrementally(test_repository,
+                                     failure_classifications,
+                                     generic_reference_data,
+                                     test_perf_signature):
+    # generating alerts after every new datum should give the same results
+    # as generating them once all the data is in
+    base_time = time.time()
+    for (t, v) in zip(range(1, 61), [0.5] * 15 + [1.0] * 15 + [2.0] * 30):
+        _generate_performance_data(test_repository, test_perf_signature,
+                                   generic_reference_data,
+                                   base_time, t, v, 1)
+        generate_new_alerts_in_series(test_perf_signature)
+
+    assert PerformanceAlert.objects.count() == 2
+    _verify_alert(1, 16, 15, test_perf_signature, 0.5, 1.0, True,
+                  PerformanceAlert.UNTRIAGED,
+                  PerformanceAlertSummary.UNTRIAGED, None)
+    _verify_alert(2, 31, 30, test_perf_signature, 1.0, 2.0, True,
+                  PerformanceAlert.UNTRIAGED,
+                  PerformanceAlertSummary.UNTRIAGED, None)
+
+    # everything since the last alert but the last fore window has been
+    # settled
+    state = PerformanceAnalysisState.objects.get(signature=test_perf_signature)
+    assert state.settled_timestamp == datetime.datetime.utcfromtimestamp(base_time + 48)
+    assert state.context_values == len(range(32, 49))
+
+
+def test_detect_alerts_resumes_analysis(test_repository,
+                                        failure_classifications,
+                                        generic_reference_data,
+                                        test_perf_signature):
+    base_time = time.time()
+    _generate_performance_data(test_repository, test_perf_signature,
+                               generic_reference_data,
+                               base_time, 1, 0.5, 50)
+    generate_new_alerts_in_series(test_perf_signature)
+    state = PerformanceAnalysisState.objects.get(signature=test_perf_signature)
+    assert state.settled_timestamp == datetime.datetime.utcfromtimestamp(base_time + 38)
+
+    # only the revisions after those settled (and enough before them for
+    # their back window) are analyzed when new data arrives
+    _generate_performance_data(test_repository, test_perf_signature,
+                               generic_reference_data,
+                               base_time, 51, 0.5, 1)
+    with patch('treeherder.perf.alerts.detect_changes',
+               side_effect=detect_changes) as mock_detect_changes:
+        generate_new_alerts_in_series(test_perf_signature)
+    (args, kwargs) = mock_detect_changes.call_args
+    assert len(args[0]) == 24 + 13
+    assert kwargs['first_index'] == 24
+    state = PerformanceAnalysisState.objects.get(signature=test_perf_signature)
+    assert state.settled_timestamp == datetime.datetime.utcfromtimestamp(base_time + 39)
+
+    # adding data to settled revisions means starting again
+    _generate_performance_data(test_repository, test_perf_signature,
+                               generic_reference_data,
+                               base_time, 30, 0.5, 1)
+    with patch('treeherder.perf.alerts.detect_changes',
+               side_effect=detect_changes) as mock_detect_changes:
+        generate_new_alerts_in_series(test_perf_signature)
+    (args, kwargs) = mock_detect_changes.call_args
+    assert len(args[0]) == 51
+    assert kwargs['first_index'] == 1
+
+
+def test_reanalyze_alerts(test_repository, failure_classifications,
+                          generic_reference_data, test_perf_signature):
+    base_time = time.time()
+    _generate_performance_data(test_repository, test_perf_signature,
+                               generic_reference_data,
+                               base_time, 1, 0.5, 15)
+    _generate_performance_data(test_repository, test_perf_signature,
+                               generic_reference_data,
+                               base_time, 16, 1.0, 15)
+
+    # alerts from before the series' settings changed, one of them triaged
+    stale_alerts = {}
+    for (i, status) in [(5, PerformanceAlert.UNTRIAGED),
+                        (8, PerformanceAlert.ACKNOWLEDGED)]:
+        summary = PerformanceAlertSummary.objects.create(
+            repository=test_repository,
+            framework=test_perf_signature.framework,
+            prev_push=Push.objects.get(revision='1234abcd%s' % (i - 1)),
+            push=Push.objects.get(revision='1234abcd%s' % i),
+            manually_created=False,
+            last_updated=datetime.datetime.now())
+        stale_alerts[status] = PerformanceAlert.objects.create(
+            summary=summary,
+            series_signature=test_perf_signature,
+            is_regression=True,
+            status=status,
+            amount_pct=10.0,
+            amount_abs=0.05,
+            prev_value=0.5,
+            new_value=0.55,
+            t_value=10.0)
+
+    out = StringIO()
+    call_command('reanalyze_perf_alerts', project=[test_repository.name],
+                 processes=1, dry_run=True, stdout=out, stderr=StringIO())
+    diff = [line for line in out.getvalue().splitlines() if line[0] in '+-']
+    assert len(diff) == 2
+    assert diff[0].startswith('+ ') and '1234abcd16 0.50 -> 1.00' in diff[0]
+    assert diff[1].startswith('- ') and '1234abcd5 (alert {})'.format(
+        stale_alerts[PerformanceAlert.UNTRIAGED].id) in diff[1]
+    assert PerformanceAlert.objects.count() == 2
+
+    call_command('reanalyze_perf_alerts', project=[test_repository.name],
+                 processes=1, stdout=StringIO(), stderr=StringIO())
+    assert set(PerformanceAlert.objects.values_list(
+        'summary__push__revision', flat=True)) == {'1234abcd8', '1234abcd16'}
+    assert set(PerformanceAlertSummary.objects.values_list(
+        'push__revision', flat=True)) == {'1234abcd8', '1234abcd16'}
+
+    # reanalyzing again changes nothing
+    out = StringIO()
+    call_command('reanalyze_perf_alerts', project=[test_repository.name],
+                 processes=1, stdout=out, stderr=StringIO())
+    assert 'Added 0 alerts and removed 0 alerts in 1 series' in out.getvalue()
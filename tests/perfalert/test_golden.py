@@ -0,0 +1,77 @@
+"""
+Checks the output of change detection on synthetic and real series against
+golden files recorded from the original scalar implementation
+(reference_detect_changes), so that changes to the t-test engine (e.g. for
+speed) can be shown not to change its results. The 'constant' and
+'near_constant' series cover windows whose values don't or hardly differ,
+whose t scores are the most sensitive to how they're calculated.
+
+Run with --update-golden to rewrite the files from the reference
+implementation after an intended change to it.
+"""
+import copy
+import json
+import os
+
+import pytest
+
+from tests.perfalert.utils import (GRAPH_SERIES,
+                                   SYNTHETIC_SERIES,
+                                   graph_series,
+                                   random_series,
+                                   reference_detect_changes)
+from treeherder.perfalert.perfalert import detect_changes
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                          'sample_data', 'artifacts', 'performance', 'golden')
+
+# analysis settings to check each series with
+SETTINGS = [
+    dict(min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7),
+    dict(min_back_window=5, max_back_window=10, fore_window=5, t_threshold=3),
+]
+
+
+def _get_golden_output(data, func):
+    """
+    Returns the parts of the output of a detect_changes implementation which
+    determine its results, in columns to keep the golden files small
+    """
+    output = []
+    for kwargs in SETTINGS:
+        results = func(copy.deepcopy(data), **kwargs)[1:]
+        output.append({
+            'settings': kwargs,
+            'changes': [d.push_id for d in results if d.change_detected],
+            # t scores are stored to 8 significant digits, plenty to tell
+            # any real change in the calculation from floating point noise
+            't': [float('%.8g' % d.t) for d in results],
+            'amount_prev_data': [d.amount_prev_data for d in results],
+            'amount_next_data': [d.amount_next_data for d in results]
+        })
+    return output
+
+
+@pytest.mark.parametrize('name', sorted(SYNTHETIC_SERIES) + GRAPH_SERIES)
+def test_detect_changes_golden_output(request, name):
+    if name in SYNTHETIC_SERIES:
+        data = random_series(**SYNTHETIC_SERIES[name])
+    else:
+        data = graph_series(name)
+
+    filename = os.path.join(GOLDEN_DIR, os.path.splitext(name)[0] + '.json')
+    if request.config.getoption('--update-golden'):
+        with open(filename, 'w') as f:
+            json.dump(_get_golden_output(data, reference_detect_changes), f,
+                      sort_keys=True, separators=(',', ':'))
+        return
+    output = _get_golden_output(data, detect_changes)
+    with open(filename) as f:
+        expected = json.load(f)
+
+    for (result, golden) in zip(output, expected):
+        assert result['settings'] == golden['settings']
+        assert result['changes'] == golden['changes']
+        assert result['amount_prev_data'] == golden['amount_prev_data']
+        assert result['amount_next_data'] == golden['amount_next_data']
+        assert result['t'] == pytest.approx(golden['t'], rel=1e-6, abs=1e-6)
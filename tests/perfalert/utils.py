@@ -0,0 +1,128 @@
+import os
+import random
+
+from tests.sampledata import SampleData
+from treeherder.perfalert.perfalert import (RevisionDatum,
+                                            analyze,
+                                            calc_t,
+                                            linear_weights)
+
+
+def reference_detect_changes(data, min_back_window=12, max_back_window=24,
+                             fore_window=12, t_threshold=7):
+    '''
+    The original, unvectorized implementation of detect_changes, built on
+    analyze() and calc_t()
+    '''
+    data = sorted(data)
+
+    last_seen_regression = 0
+    for i in range(1, len(data)):
+        di = data[i]
+
+        # keep on getting previous data until we've either got at least 12
+        # data points *or* we've hit the maximum back window
+        jw = []
+        di.amount_prev_data = 0
+        prev_indice = i - 1
+        while di.amount_prev_data < max_back_window and prev_indice >= 0 and (
+                (i - prev_indice) <= min(max(last_seen_regression,
+                                             min_back_window),
+                                         max_back_window)):
+            jw.append(data[prev_indice])
+            di.amount_prev_data += len(jw[-1].values)
+            prev_indice -= 1
+
+        # accumulate present + future data until we've got at least 12 values
+        kw = []
+        di.amount_next_data = 0
+        next_indice = i
+        while di.amount_next_data < fore_window and next_indice < len(data):
+            kw.append(data[next_indice])
+            di.amount_next_data += len(kw[-1].values)
+            next_indice += 1
+
+        di.historical_stats = analyze(jw)
+        di.forward_stats = analyze(kw)
+
+        di.t = abs(calc_t(jw, kw, linear_weights))
+        # add additional historical data points next time if we
+        # haven't detected a likely regression
+        if di.t > t_threshold:
+            last_seen_regression = 0
+        else:
+            last_seen_regression += 1
+
+    # Now that the t-test scores are calculated, go back through the data to
+    # find where changes most likely happened.
+    for i in range(1, len(data)):
+        di = data[i]
+
+        # if we don't have enough data yet, skip for now (until more comes
+        # in)
+        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
+            continue
+
+        if di.t <= t_threshold:
+            continue
+
+        # Check the adjacent points
+        prev = data[i-1]
+        if prev.t > di.t:
+            continue
+        # next may or may not exist if it's the last in the series
+        if (i+1) < len(data):
+            next = data[i+1]
+            if next.t > di.t:
+                continue
+
+        # This datapoint has a t value higher than the threshold and higher
+        # than either neighbor.  Mark it as the cause of a regression.
+        di.change_detected = True
+
+    return data
+
+
+def random_series(seed, num_revisions, noise=2.0, step_probability=0.05,
+                  values_per_revision=(1, 1, 1, 2, 5), constant_probability=0.1):
+    '''
+    A reproducible series with gaussian noise around a level which changes
+    in steps every so often, some revisions having several values (as if
+    retriggered) and some having no noise at all
+    '''
+    rng = random.Random(seed)
+    data = []
+    level = 100.0
+    for i in range(num_revisions):
+        if rng.random() < step_probability:
+            level *= rng.choice([0.8, 1.25])
+        num_values = rng.choice(values_per_revision)
+        if rng.random() < constant_probability:
+            values = [round(level)] * num_values
+        else:
+            values = [rng.gauss(level, noise) for _ in range(num_values)]
+        data.append(RevisionDatum(i // 2, i, values))
+    return data
+
+
+# synthetic series to check and benchmark change detection with
+SYNTHETIC_SERIES = {
+    'short': dict(seed=10, num_revisions=50),
+    'noisy': dict(seed=11, num_revisions=1000, noise=10.0),
+    'quiet': dict(seed=12, num_revisions=1000, noise=0.5, step_probability=0.01),
+    'retriggered': dict(seed=13, num_revisions=500, values_per_revision=(3, 5, 8)),
+    'single_values': dict(seed=14, num_revisions=1000, values_per_revision=(1,),
+                          constant_probability=0.0),
+    'constant': dict(seed=15, num_revisions=200, constant_probability=1.0),
+    'near_constant': dict(seed=16, num_revisions=200, noise=1e-6,
+                          constant_probability=0.0),
+}
+
+# real series, from http://graphs.mozilla.org/api/test/runs
+GRAPH_SERIES = ['runs1.json', 'runs2.json', 'runs3.json', 'runs4.json',
+                'runs5.json', 'a11y.json', 'tp5rss.json']
+
+
+def graph_series(filename):
+    runs = SampleData.get_perf_data(os.path.join('graphs', filename))['test_runs']
+    return [RevisionDatum(r[2], r[2], [r[3]]) for r in runs]
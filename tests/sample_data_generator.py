@@ -54,6 +54,61 @@ def job_data(**kwargs):
     return jobs_obj
 
 
+def pulse_job_data(**kwargs):
+    """
+    Return a sample job in the pulse job format consumed by ``JobLoader``,
+    with default values.
+
+    """
+    platform = {
+        u"name": u"bld-linux64-ec2-104",
+        u"platform": u"linux64",
+        u"os": u"linux",
+        u"architecture": u"x86_64",
+    }
+    platform.update(kwargs.pop("platform", {}))
+
+    job = {
+        u"taskId": kwargs.pop("task_id", u"218cac72-734c-4cbb-b1ce-76bb3cda9425/0"),
+        u"origin": {
+            u"kind": u"hg.mozilla.org",
+            u"project": kwargs.pop("project", u"mozilla-inbound"),
+            u"revision": kwargs.pop("revision",
+                                    u"24fd64b8251fac5cf60b54a915bffa7e51f636b5"),
+        },
+        u"buildSystem": kwargs.pop("build_system", u"taskcluster"),
+        u"display": {
+            u"jobSymbol": kwargs.pop("job_symbol", u"M"),
+            u"jobName": kwargs.pop("job_name", u"test-linux64/opt-mochitest-5"),
+            u"groupSymbol": kwargs.pop("group_symbol", u"?"),
+        },
+        u"state": kwargs.pop("state", u"completed"),
+        u"result": kwargs.pop("result", u"success"),
+        u"jobKind": kwargs.pop("job_kind", u"test"),
+        u"runMachine": platform,
+        u"buildMachine": platform,
+        u"owner": kwargs.pop("owner", u"sendchange-unittest"),
+        u"reason": kwargs.pop("reason", u"scheduler"),
+        u"productName": kwargs.pop("product_name", u"firefox"),
+        u"timeScheduled": kwargs.pop("time_scheduled", u"2014-12-19T16:39:57-08:00"),
+        u"timeStarted": kwargs.pop("time_started", u"2014-12-19T17:39:57-08:00"),
+        u"timeCompleted": kwargs.pop("time_completed", u"2014-12-19T18:39:57-08:00"),
+        u"labels": kwargs.pop("labels", [u"opt"]),
+        u"version": 1,
+        u"logs": kwargs.pop("logs", []),
+    }
+
+    job_info_links = kwargs.pop("job_info_links", [])
+    if job_info_links:
+        job[u"jobInfo"] = {u"links": job_info_links}
+
+    extra_artifacts = kwargs.pop("extra_artifacts", [])
+    if extra_artifacts:
+        job[u"extra"] = {u"artifacts": extra_artifacts}
+
+    return job
+
+
 def to_seconds(td):
     return (td.microseconds +
             (td.seconds + td.days * 24 * 3600) * 10 ** 6
@@ -1,7 +1,10 @@
 import datetime
 import json
+from contextlib import contextmanager
 
 import responses
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from tests.sampledata import SampleData
 from treeherder.client.thclient import TreeherderClient
@@ -264,3 +267,16 @@ def add_log_response(filename):
             }
         )
     return log_url
+
+
+@contextmanager
+def assert_query_budget(budget):
+    """
+    Asserts that no more than ``budget`` database queries are made within the
+    block, to catch N+1 query regressions
+    """
+    with CaptureQueriesContext(connection) as captured:
+        yield captured
+    assert len(captured) <= budget, "{} queries made, over the budget of {}:\n{}".format(
+        len(captured), budget,
+        '\n'.join(query['sql'] for query in captured.captured_queries))
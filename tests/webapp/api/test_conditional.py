@@ -0,0 +1,94 @@
+import pytest
+from django.core.urlresolvers import reverse
+
+from treeherder.log_parser.crossreference import crossreference_job
+from treeherder.model.models import (Job,
+                                     JobType,
+                                     Push)
+from treeherder.webapp.api import serializers
+
+
+def _get_conditional(webapp, url, etag):
+    return webapp.get(url, headers={'If-None-Match': str(etag)})
+
+
+def test_refdata_conditional(webapp, transactional_db, monkeypatch):
+    """
+    test reference data responses are not modified until the table changes
+    """
+    JobType.objects.create(name='mochitest', symbol='M')
+    url = reverse('jobtype-list')
+    resp = webapp.get(url)
+    etag = resp.headers['ETag']
+    assert [job_type['symbol'] for job_type in resp.json] == ['M']
+
+    resp = _get_conditional(webapp, url, etag)
+    assert resp.status_int == 304
+    assert resp.headers['ETag'] == etag
+
+    # other clients get the cached response, without it being serialized
+    def serialize(*args, **kwargs):
+        raise AssertionError("serialized")
+
+    monkeypatch.setattr(serializers.JobTypeSerializer, 'to_representation',
+                        serialize)
+    resp = webapp.get(url)
+    assert resp.headers['ETag'] == etag
+    assert [job_type['symbol'] for job_type in resp.json] == ['M']
+    monkeypatch.undo()
+
+    JobType.objects.create(name='reftest', symbol='R')
+    resp = _get_conditional(webapp, url, etag)
+    assert resp.status_int == 200
+    assert resp.headers['ETag'] != etag
+    assert [job_type['symbol'] for job_type in resp.json] == ['M', 'R']
+
+
+@pytest.mark.parametrize('url', ['optioncollectionhash-list', 'repository-list',
+                                 'performance-frameworks-list'])
+def test_refdata_conditional_endpoints(webapp, test_repository, url):
+    url = reverse(url)
+    etag = webapp.get(url).headers['ETag']
+    assert _get_conditional(webapp, url, etag).status_int == 304
+
+
+def test_job_detail_conditional(webapp, test_job):
+    """
+    test a job's details are not modified until the job is
+    """
+    url = reverse('jobs-detail', kwargs={'project': test_job.repository.name,
+                                         'pk': test_job.id})
+    resp = webapp.get(url)
+    etag = resp.headers['ETag']
+    assert 'Last-Modified' in resp.headers
+    assert _get_conditional(webapp, url, etag).status_int == 304
+    assert webapp.get(url, headers={
+        'If-Modified-Since': resp.headers['Last-Modified']}).status_int == 304
+
+    Job.objects.filter(id=test_job.id).update(
+        result='success', last_modified=test_job.last_modified.replace(
+            year=test_job.last_modified.year + 1))
+    resp = _get_conditional(webapp, url, etag)
+    assert resp.status_int == 200
+    assert resp.json['result'] == 'success'
+
+    # including by saves of only some of its fields, such as crossreferencing
+    # its errors does
+    etag = resp.headers['ETag']
+    assert crossreference_job(Job.objects.get(id=test_job.id)) is False
+    resp = _get_conditional(webapp, url, etag)
+    assert resp.status_int == 200
+    assert resp.json['autoclassify_status'] == 'crossreferenced'
+
+    resp = webapp.get(reverse('jobs-detail', kwargs={
+        'project': test_job.repository.name, 'pk': test_job.id + 1}),
+        expect_errors=True)
+    assert resp.status_int == 404
+    assert 'ETag' not in resp.headers
+
+
+def test_push_detail_conditional(webapp, push_stored, test_repository):
+    url = reverse('push-detail', kwargs={'project': test_repository.name,
+                                         'pk': Push.objects.first().id})
+    etag = webapp.get(url).headers['ETag']
+    assert _get_conditional(webapp, url, etag).status_int == 304
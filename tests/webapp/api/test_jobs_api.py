@@ -1,4 +1,5 @@
 import datetime
+import time
 
 import pytest
 from dateutil import parser
@@ -192,6 +193,210 @@ def test_job_list_in_filter(webapp, eleven_jobs_stored, test_repository):
     assert len(resp['results']) == 2
 
 
+def decode_job_list(resp):
+    """
+    Returns the jobs of a list or compact job list response as dicts
+    """
+    dictionaries = resp.get('dictionaries', {})
+    jobs = []
+    for values in resp['results']:
+        job = dict(zip(resp['job_property_names'], values))
+        for (name, dictionary) in dictionaries.items():
+            job[name] = dictionary[job[name]]
+        jobs.append(job)
+    return jobs
+
+
+@pytest.mark.parametrize('route', ['jobs-list', 'jobs-similar-jobs'])
+def test_job_list_compact(webapp, eleven_jobs_stored, test_repository, route):
+    """
+    test the compact job list gives the same jobs as the dict one, with the
+    reference data values given once
+    """
+    kwargs = {"project": test_repository.name}
+    if route == 'jobs-similar-jobs':
+        kwargs['pk'] = Job.objects.first().id
+    url = reverse(route, kwargs=kwargs)
+
+    expected = webapp.get(url, {'count': 20}).json
+    resp = webapp.get(url, {'count': 20, 'return_type': 'compact'}).json
+
+    assert resp['meta'] == expected['meta']
+    assert sorted(resp['dictionaries']) == sorted(
+        JobsViewSet._compact_property_names)
+    for dictionary in resp['dictionaries'].values():
+        assert len(dictionary) == len(set(dictionary))
+    assert len(resp['dictionaries']['build_platform']) < len(resp['results'])
+    assert decode_job_list(resp) == expected['results']
+
+
+@pytest.mark.parametrize('order_by', ['push_id', 'last_modified'])
+@pytest.mark.parametrize('return_type', ['dict', 'list', 'compact'])
+def test_job_list_cursor(webapp, eleven_jobs_stored, test_repository,
+                         order_by, return_type):
+    """
+    test paging through the job list with cursors
+    """
+    # give some jobs the same last modified time, to check ties are broken
+    Job.objects.filter(id__in=[j.id for j in Job.objects.all()[1:4]]).update(
+        last_modified=datetime.datetime(2016, 7, 18, 22, 16, 58))
+    url = reverse("jobs-list", kwargs={"project": test_repository.name})
+
+    job_ids = []
+    cursor = ''
+    while cursor is not None:
+        resp = webapp.get(url, {'cursor': cursor, 'count': 4,
+                                'order_by': order_by,
+                                'return_type': return_type}).json
+        assert resp['meta']['count'] == 4
+        if return_type in ('list', 'compact'):
+            jobs = decode_job_list(resp)
+        else:
+            jobs = resp['results']
+        assert len(jobs) == (4 if resp['meta']['next_cursor'] else 3)
+        job_ids.extend(job['id'] for job in jobs)
+        cursor = resp['meta']['next_cursor']
+
+    assert job_ids == list(Job.objects.order_by(order_by, 'id').values_list(
+        'id', flat=True))
+
+
+@pytest.mark.parametrize('params', [
+    {'cursor': '', 'offset': 0},
+    {'cursor': '', 'count': 0},
+    {'cursor': '', 'order_by': 'result'},
+    {'cursor': 'garbage'},
+    {'cursor': JobsViewSet._encode_cursor('push_id', 1, 1),
+     'order_by': 'last_modified'},
+])
+def test_job_list_bad_cursor(webapp, eleven_jobs_stored, test_repository,
+                             params):
+    url = reverse("jobs-list", kwargs={"project": test_repository.name})
+    resp = webapp.get(url, params, expect_errors=True)
+    assert resp.status_int == HTTP_400_BAD_REQUEST
+
+
+def test_job_changes(webapp, eleven_jobs_stored, test_repository, settings):
+    """
+    test following the feed of job changes
+    """
+    settings.JOB_CHANGES_DELAY = 0
+    url = reverse("jobs-changes", kwargs={"project": test_repository.name})
+
+    # each result only has the properties which differ from the one before
+    def get_jobs(results):
+        jobs = []
+        for result in results:
+            jobs.append(dict(jobs[-1] if jobs else {}, **result))
+        return jobs
+
+    resp = webapp.get(url, {'since': '2000-01-01', 'count': 10}).json
+    assert resp['meta']['more']
+    assert any(len(result) < len(JobsViewSet._property_names)
+               for result in resp['results'])
+    jobs = get_jobs(resp['results'])
+    resp = webapp.get(url, {'cursor': resp['meta']['cursor'], 'count': 10}).json
+    assert not resp['meta']['more']
+    assert len(resp['results']) == 1
+    jobs.extend(get_jobs(resp['results']))
+    assert [job['id'] for job in jobs] == list(Job.objects.order_by(
+        'last_modified', 'id').values_list('id', flat=True))
+    assert all(set(job.keys()) == set(JobsViewSet._property_names) for job in jobs)
+
+    # no changes since
+    cursor = resp['meta']['cursor']
+    resp = webapp.get(url, {'cursor': cursor}).json
+    assert resp['results'] == []
+    assert resp['meta']['cursor'] == cursor
+
+    job = Job.objects.get(id=jobs[0]['id'])
+    job.state = 'running'
+    job.save()
+    resp = webapp.get(url, {'cursor': cursor}).json
+    assert [result['id'] for result in resp['results']] == [job.id]
+    assert resp['results'][0]['state'] == 'running'
+
+    # only jobs of the given pushes
+    job.save()
+    resp = webapp.get(url, {'cursor': resp['meta']['cursor'],
+                            'push_id__in': '{}'.format(job.push_id + 1)}).json
+    assert resp['results'] == []
+
+
+def test_job_changes_retry_after(webapp, eleven_jobs_stored, test_repository,
+                                 settings):
+    """
+    test that clients are told when to poll the feed again once caught up
+    """
+    settings.JOB_CHANGES_DELAY = 0
+    settings.JOB_CHANGES_RETRY_AFTER = 7
+    url = reverse("jobs-changes", kwargs={"project": test_repository.name})
+
+    resp = webapp.get(url, {'since': '2000-01-01', 'count': 10})
+    assert resp.json['meta']['more']
+    assert 'Retry-After' not in resp.headers
+
+    resp = webapp.get(url, {'cursor': resp.json['meta']['cursor']})
+    assert not resp.json['meta']['more']
+    assert resp.headers['Retry-After'] == '7'
+
+
+def test_job_changes_timeout(webapp, eleven_jobs_stored, test_repository,
+                             settings):
+    """
+    test waiting for job changes when there are none yet
+    """
+    settings.JOB_CHANGES_DELAY = 0
+    settings.JOB_CHANGES_MAX_TIMEOUT = 0.3
+    settings.JOB_CHANGES_POLL_INTERVAL = 0.05
+    settings.JOB_CHANGES_MAX_POLL_INTERVAL = 0.1
+    url = reverse("jobs-changes", kwargs={"project": test_repository.name})
+
+    start = time.time()
+    resp = webapp.get(url, {'timeout': 10})
+    assert time.time() - start >= 0.3
+    assert resp.json['results'] == []
+    # clients waiting for changes can ask again straight away
+    assert 'Retry-After' not in resp.headers
+
+
+def test_job_changes_recent_uncommitted(webapp, eleven_jobs_stored,
+                                        test_repository, settings):
+    """
+    test that following the feed from now still gets the jobs modified just
+    before, whose transactions may not have been committed yet
+    """
+    settings.JOB_CHANGES_DELAY = 2
+    url = reverse("jobs-changes", kwargs={"project": test_repository.name})
+    Job.objects.update(last_modified=datetime.datetime(2017, 1, 1))
+    job = Job.objects.first()
+    Job.objects.filter(id=job.id).update(
+        last_modified=datetime.datetime.now() - datetime.timedelta(seconds=1))
+
+    resp = webapp.get(url).json
+    assert resp['results'] == []
+
+    # once the delay has passed
+    settings.JOB_CHANGES_DELAY = 0
+    resp = webapp.get(url, {'cursor': resp['meta']['cursor']}).json
+    assert [result['id'] for result in resp['results']] == [job.id]
+
+
+@pytest.mark.parametrize('params', [
+    {'count': 0},
+    {'count': 2001},
+    {'timeout': 'soon'},
+    {'push_id__in': 'a,b'},
+    {'cursor': 'garbage'},
+    {'cursor': JobsViewSet._encode_cursor('push_id', 1, 1)},
+    {'since': 'yesterday'},
+])
+def test_job_changes_bad_params(webapp, test_repository, params):
+    url = reverse("jobs-changes", kwargs={"project": test_repository.name})
+    resp = webapp.get(url, params, expect_errors=True)
+    assert resp.status_int == HTTP_400_BAD_REQUEST
+
+
 def test_job_detail(webapp, test_job):
     """
     test retrieving a single job from the jobs-detail
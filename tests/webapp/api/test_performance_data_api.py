@@ -1,6 +1,9 @@
 import datetime
+import time
 
+import msgpack
 import pytest
+import six
 from django.core.urlresolvers import reverse
 from rest_framework.test import APIClient
 
@@ -9,6 +12,7 @@ from treeherder.model.models import (MachinePlatform,
 from treeherder.perf.models import (PerformanceDatum,
                                     PerformanceFramework,
                                     PerformanceSignature)
+from treeherder.perf.rollups import rebuild_rollups
 
 NOW = datetime.datetime.now()
 ONE_DAY_AGO = NOW - datetime.timedelta(days=1)
@@ -148,9 +152,11 @@ def test_summary_performance_data(webapp, test_repository,
                               kwargs={"project": test_repository.name}))
     assert resp.status_code == 200
 
-    assert len(resp.data.keys()) == 2
-    assert set(resp.data.keys()) == set([test_perf_signature.signature_hash,
-                                        summary_signature_hash])
+    # the second response is served from the cache, so isn't a DRF response
+    data = resp.json()
+    assert len(data.keys()) == 2
+    assert set(data.keys()) == set([test_perf_signature.signature_hash,
+                                   summary_signature_hash])
 
     for signature in [summary_perf_signature, test_perf_signature]:
         expected = {
@@ -169,7 +175,7 @@ def test_summary_performance_data(webapp, test_repository,
         if signature.extra_options:
             # extra_options stored as charField but api returns as list
             expected['extra_options'] = signature.extra_options.split(' ')
-        assert resp.data[signature.signature_hash] == expected
+        assert data[signature.signature_hash] == expected
 
 
 def test_filter_signatures_by_framework(webapp, test_repository, test_perf_signature,
@@ -392,3 +398,114 @@ def test_filter_data_by_signature(webapp, test_repository, test_perf_signature,
             assert len(resp.data[signature.signature_hash]) == 1
             assert resp.data[signature.signature_hash][0]['signature_id'] == signature.id
             assert resp.data[signature.signature_hash][0]['value'] == float(i)
+
+
+def test_data_resolution(webapp, test_repository, test_perf_signature):
+    pushes = []
+    for (i, timestamp) in enumerate([NOW - datetime.timedelta(days=5),
+                                     NOW - datetime.timedelta(days=5, seconds=1),
+                                     NOW]):
+        push = Push.objects.create(repository=test_repository,
+                                   revision='abcdefgh%s' % i,
+                                   author='foo@bar.com',
+                                   time=timestamp)
+        pushes.append(push)
+        # two datums for each push, as if a job was retriggered
+        for value in [i, i + 0.5]:
+            PerformanceDatum.objects.create(
+                repository=test_perf_signature.repository,
+                result_set_id=push.id,
+                push=push,
+                signature=test_perf_signature,
+                value=value,
+                push_timestamp=timestamp)
+    rebuild_rollups(test_repository, [test_perf_signature.id],
+                    SEVEN_DAYS_AGO.date())
+
+    url = reverse('performance-data-list',
+                  kwargs={"project": test_repository.name})
+    resp = webapp.get(url + '?signature_id={}&resolution=push'.format(
+        test_perf_signature.id))
+    datums = resp.json[test_perf_signature.signature_hash]
+    assert [(datum['push_id'], datum['count'], datum['min'], datum['max'],
+             datum['value']) for datum in datums] == [
+                 (pushes[1].id, 2, 1.0, 1.5, 1.25),
+                 (pushes[0].id, 2, 0.0, 0.5, 0.25),
+                 (pushes[2].id, 2, 2.0, 2.5, 2.25)]
+
+    resp = webapp.get(url + '?signature_id={}&resolution=push&interval={}'.format(
+        test_perf_signature.id, 86400))
+    assert [datum['push_id'] for datum in
+            resp.json[test_perf_signature.signature_hash]] == [pushes[2].id]
+
+    resp = webapp.get(url + '?signature_id={}&resolution=day&start_date={}'.format(
+        test_perf_signature.id, THREE_DAYS_AGO.isoformat()))
+    datums = resp.json[test_perf_signature.signature_hash]
+    assert len(datums) == 1
+    assert (datums[0]['count'], datums[0]['median']) == (2, 2.25)
+
+    resp = webapp.get(url + '?signature_id={}&resolution=day'.format(
+        test_perf_signature.id))
+    datums = resp.json[test_perf_signature.signature_hash]
+    assert [datum['count'] for datum in datums] in ([4, 2], [2, 2, 2])
+    assert 'push_id' not in datums[0]
+
+    for params in ['resolution=week', 'resolution=push&job_id=1',
+                   'resolution=day&push_id={}'.format(pushes[0].id)]:
+        resp = webapp.get(url + '?signature_id={}&{}'.format(
+            test_perf_signature.id, params), expect_errors=True)
+        assert resp.status_code == 400
+
+
+def test_columnar_layout(webapp, test_repository, test_perf_signature):
+    pushes = []
+    for (i, timestamp) in enumerate([NOW - datetime.timedelta(days=2),
+                                     NOW - datetime.timedelta(days=1),
+                                     NOW]):
+        push = Push.objects.create(repository=test_repository,
+                                   revision='abcdefgh%s' % i,
+                                   author='foo@bar.com',
+                                   time=timestamp)
+        pushes.append(push)
+        PerformanceDatum.objects.create(
+            repository=test_perf_signature.repository,
+            result_set_id=push.id,
+            push=push,
+            signature=test_perf_signature,
+            value=i + 0.125,
+            push_timestamp=timestamp)
+    push_timestamps = [int(time.mktime(p.time.timetuple())) for p in pushes]
+
+    url = reverse('performance-data-list',
+                  kwargs={"project": test_repository.name}) + \
+        '?signature_id={}&layout=columnar'.format(test_perf_signature.id)
+    resp = webapp.get(url)
+    assert resp.json == {
+        test_perf_signature.signature_hash: {
+            'signature_id': test_perf_signature.id,
+            'id': list(PerformanceDatum.objects.order_by(
+                'push_timestamp').values_list('id', flat=True)),
+            'job_id': [None, None, None],
+            'push_id': [p.id for p in pushes],
+            'push_timestamp': push_timestamps,
+            'value': [0.125, 1.125, 2.125]
+        }
+    }
+
+    resp = webapp.get(url + '&delta_encode=true')
+    series = resp.json[test_perf_signature.signature_hash]
+    assert series['delta_encoded'] == ['id', 'push_id', 'push_timestamp']
+    assert series['push_id'] == [pushes[0].id, 1, 1]
+    assert series['push_timestamp'] == [push_timestamps[0], 86400, 86400]
+
+    # the same can be had as MessagePack
+    resp = webapp.get(url + '&format=msgpack')
+    assert resp.content_type == 'application/x-msgpack'
+    results = msgpack.unpackb(resp.body, encoding='utf-8')
+    assert results == webapp.get(url).json
+    # with its strings decoded as text (which compare equal to bytes on py2)
+    assert all(isinstance(key, six.text_type)
+               for key in results[test_perf_signature.signature_hash])
+
+    resp = webapp.get(url + '&layout=tabular', expect_errors=True)
+    assert resp.status_code == 400
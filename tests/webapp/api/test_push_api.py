@@ -422,6 +422,7 @@ def test_push_cancel_all(failure_classifications,
     for job in Job.objects.all():
         assert job.state == 'completed'
         assert job.result == 'usercancel'
+    assert push_with_three_jobs.get_status() == {'usercancel': 3}
 
     for _ in range(0, 3):
         message = pulse_action_consumer.get(block=True, timeout=2)
@@ -460,3 +461,20 @@ def test_push_status(webapp, test_job, test_user):
     assert resp.status_int == 200
     assert isinstance(resp.json, dict)
     assert resp.json == {}
+
+
+def test_push_statuses(webapp, eleven_jobs_stored, test_repository):
+    """
+    test retrieving the statuses of several pushes at once
+    """
+    pushes = Push.objects.order_by('id')[:3]
+    resp = webapp.get(
+        reverse("push-statuses", kwargs={"project": test_repository.name}),
+        {'id__in': ','.join(str(push.id) for push in pushes)})
+    assert resp.status_int == 200
+    assert resp.json == {str(push.id): push.get_status() for push in pushes}
+
+    resp = webapp.get(
+        reverse("push-statuses", kwargs={"project": test_repository.name}),
+        {'id__in': 'a,b'}, expect_errors=True)
+    assert resp.status_int == 400
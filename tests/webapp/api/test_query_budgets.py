@@ -0,0 +1,102 @@
+"""
+Query budgets of the hot API endpoints, whose query counts mustn't grow with
+the number of objects listed (N+1 queries)
+"""
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+
+from tests.test_utils import assert_query_budget
+from treeherder.model.models import (Bugscache,
+                                     Job,
+                                     Push,
+                                     TextLogError,
+                                     TextLogStep)
+from treeherder.perf.models import (PerformanceDatum,
+                                    PerformanceSignature)
+
+
+@pytest.fixture
+def text_log_errors(eleven_jobs_stored):
+    job = Job.objects.first()
+    step = TextLogStep.objects.create(
+        job=job, name='step', started_line_number=1, finished_line_number=100,
+        result=TextLogStep.TEST_FAILED)
+    for i in range(10):
+        TextLogError.objects.create(
+            step=step, line='TEST-UNEXPECTED-FAIL | test_{}.html | failed'.format(i),
+            line_number=i)
+    return job
+
+
+@pytest.fixture
+def performance_data(test_perf_signature, push_stored):
+    signatures = [test_perf_signature]
+    for i in range(4):
+        signatures.append(PerformanceSignature.objects.create(
+            repository=test_perf_signature.repository,
+            signature_hash='{:040d}'.format(i),
+            framework=test_perf_signature.framework,
+            platform=test_perf_signature.platform,
+            option_collection=test_perf_signature.option_collection,
+            suite='suite', test='test{}'.format(i), has_subtests=False,
+            last_updated=datetime.datetime.now()))
+    for push in Push.objects.all():
+        for signature in signatures:
+            PerformanceDatum.objects.create(
+                repository=signature.repository, push=push,
+                result_set_id=push.id, signature=signature, value=1.0,
+                push_timestamp=push.time)
+    return signatures
+
+
+def _get(webapp, url, params, budget):
+    # the budgets are for requests with a cold cache
+    cache.clear()
+    with assert_query_budget(budget):
+        webapp.get(url, params)
+
+
+@pytest.mark.parametrize(('params', 'budget'), [
+    ({'count': 20}, 3),
+    ({'count': 20, 'return_type': 'list'}, 3),
+    ({'count': 20, 'cursor': ''}, 3),
+])
+def test_jobs_list_query_budget(webapp, eleven_jobs_stored, test_repository,
+                                params, budget):
+    _get(webapp, reverse('jobs-list', kwargs={'project': test_repository.name}),
+         params, budget)
+
+
+def test_push_list_query_budget(webapp, eleven_jobs_stored, test_repository):
+    _get(webapp, reverse('push-list', kwargs={'project': test_repository.name}),
+         {'count': 20}, 3)
+
+
+def test_text_log_errors_query_budget(webapp, text_log_errors, monkeypatch):
+    searches = []
+
+    # the bugs are looked up with full text searches, which are counted
+    # separately: one for all the errors, rather than one each
+    def search_many(search_terms):
+        searches.append(search_terms)
+        return {search_term: {'open_recent': [], 'all_others': [{'id': 1}]}
+                for search_term in search_terms}
+
+    monkeypatch.setattr(Bugscache, 'search_many', staticmethod(search_many))
+    _get(webapp, reverse('jobs-text-log-errors', kwargs={
+        'project': text_log_errors.repository.name, 'pk': text_log_errors.id}),
+        {}, 3)
+    assert len(searches) == 1
+
+
+def test_performance_data_query_budget(webapp, test_repository, performance_data):
+    _get(webapp, reverse('performance-data-list', kwargs={'project': test_repository.name}),
+         {'signature_id': [signature.id for signature in performance_data]}, 3)
+
+
+def test_performance_signatures_query_budget(webapp, test_repository, performance_data):
+    _get(webapp, reverse('performance-signatures-list', kwargs={'project': test_repository.name}),
+         {}, 4)
@@ -0,0 +1,57 @@
+import pytest
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from rest_framework.test import APIClient
+
+from treeherder.middleware import get_request_metrics
+
+
+def test_request_metrics(webapp, eleven_jobs_stored, test_repository, test_sheriff):
+    webapp.get(reverse('jobs-list', kwargs={'project': test_repository.name}))
+
+    client = APIClient()
+    client.force_authenticate(user=test_sheriff)
+    resp = client.get(reverse('request-metrics-list'))
+    assert resp.status_code == 200
+
+    metrics = resp.json()['views']['JobsViewSet.list']
+    for name in ['db_queries', 'db_time', 'serialize_time', 'total_time',
+                 'response_bytes']:
+        assert metrics[name]['count'] >= 1
+    assert metrics['db_queries']['sum'] >= 1
+    assert metrics['response_bytes']['sum'] > 0
+    assert metrics['cache_hits'] + metrics['cache_misses'] >= 1
+
+
+def test_request_metrics_not_staff(test_user):
+    client = APIClient()
+    client.force_authenticate(user=test_user)
+    resp = client.get(reverse('request-metrics-list'))
+    assert resp.status_code == 403
+
+
+@pytest.mark.parametrize('chunks_read', [0, 1])
+def test_request_metrics_stream_closed(test_repository, updates_hub, settings,
+                                       chunks_read):
+    # a streamed response closed before it has all been sent (as when the
+    # client disconnects) still has its metrics recorded, and its queries
+    # stop being recorded
+    settings.UPDATES_STREAM_SERVER = True
+    settings.UPDATES_KEEPALIVE_INTERVAL = 0.1
+    count = get_request_metrics().get('UpdatesViewSet.list', {}).get(
+        'response_bytes', {}).get('count', 0)
+
+    resp = Client().get(reverse('updates-list',
+                                kwargs={'project': test_repository.name}))
+    assert resp.streaming
+    assert connection.force_debug_cursor
+    content = iter(resp.streaming_content)
+    size = sum(len(next(content)) for _ in range(chunks_read))
+    resp.close()
+
+    assert not connection.force_debug_cursor
+    metrics = get_request_metrics()['UpdatesViewSet.list']['response_bytes']
+    assert metrics['count'] == count + 1
+    if chunks_read:
+        assert size > 0
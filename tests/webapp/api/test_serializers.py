@@ -0,0 +1,148 @@
+"""
+Tests that the values based serialization of failure lines and text log
+errors gives the same JSON as their serializers. The benchmark comparing
+the two is slow, so only runs with --runslow:
+
+    pytest tests/webapp/api/test_serializers.py --runslow -s
+"""
+import datetime
+import time
+from decimal import Decimal
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from treeherder.model.models import (Bugscache,
+                                     ClassifiedFailure,
+                                     FailureLine,
+                                     FailureMatch,
+                                     Job,
+                                     Matcher,
+                                     TextLogError,
+                                     TextLogErrorMatch,
+                                     TextLogErrorMetadata,
+                                     TextLogStep)
+from treeherder.webapp.api import serializers
+
+
+@pytest.fixture
+def job(eleven_jobs_stored):
+    return Job.objects.first()
+
+
+@pytest.fixture
+def mock_bug_search(monkeypatch):
+    def search_many(search_terms):
+        return {search_term: {'open_recent': [{'id': 1, 'summary': search_term}],
+                              'all_others': []}
+                for search_term in search_terms}
+
+    monkeypatch.setattr(Bugscache, 'search_many', staticmethod(search_many))
+
+
+def create_error_lines(job, num_lines):
+    """
+    Creates text log errors and failure lines for a job, with a mix of
+    metadata, matches and classified failures (with and without bugs)
+    """
+    Bugscache.objects.create(id=1234, status='NEW', summary='intermittent test_0.html',
+                             modified=datetime.datetime(2017, 1, 1, 12, 30))
+    classified_failures = [
+        ClassifiedFailure.objects.create(bug_number=1234),
+        ClassifiedFailure.objects.create(bug_number=5678),
+        ClassifiedFailure.objects.create(),
+    ]
+    matchers = [Matcher.objects.create(name='TestMatcher1'),
+                Matcher.objects.create(name='TestMatcher2')]
+    step = TextLogStep.objects.create(
+        job=job, name='step', started_line_number=1,
+        finished_line_number=num_lines + 1, result=TextLogStep.TEST_FAILED)
+
+    for i in range(num_lines):
+        test = 'test_{}.html'.format(i % 20)
+        error = TextLogError.objects.create(
+            step=step, line_number=i,
+            line='TEST-UNEXPECTED-FAIL | {} | message {}'.format(test, i))
+        failure_line = FailureLine.objects.create(
+            job_guid=job.guid, repository=job.repository, line=i,
+            action='test_result' if i % 5 else 'log', test=test,
+            subtest='subtest', status='FAIL', expected='PASS', level='ERROR',
+            message='message {}\nmore'.format(i),
+            best_classification=classified_failures[i % 3] if i % 4 else None,
+            best_is_verified=bool(i % 2))
+        if i % 7:
+            TextLogErrorMetadata.objects.create(
+                text_log_error=error,
+                failure_line=failure_line if i % 3 else None,
+                best_classification=failure_line.best_classification,
+                best_is_verified=failure_line.best_is_verified)
+        for (j, matcher) in enumerate(matchers[:i % 3]):
+            classified_failure = classified_failures[(i + j) % 3]
+            score = Decimal('0.5') if j else None
+            FailureMatch.objects.create(failure_line=failure_line,
+                                        classified_failure=classified_failure,
+                                        matcher=matcher, score=score)
+            TextLogErrorMatch.objects.create(text_log_error=error,
+                                             classified_failure=classified_failure,
+                                             matcher=matcher, score=score)
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+def get_failure_lines(job):
+    return FailureLine.objects.filter(job_guid=job.guid).order_by('id')
+
+
+def get_text_log_errors(job):
+    return TextLogError.objects.filter(step__job=job).order_by('id')
+
+
+def test_serialize_failure_lines(job, mock_bug_search):
+    create_error_lines(job, 20)
+
+    expected = serializers.FailureLineNoStackSerializer(
+        get_failure_lines(job), many=True).data
+    assert render(serializers.serialize_failure_lines(
+        get_failure_lines(job))) == render(expected)
+
+
+def test_serialize_text_log_errors(job, mock_bug_search):
+    create_error_lines(job, 20)
+
+    expected = serializers.TextLogErrorSerializer(
+        get_text_log_errors(job), many=True).data
+    assert render(serializers.serialize_text_log_errors(
+        get_text_log_errors(job))) == render(expected)
+
+
+def _benchmark(capsys, description, serialize, expected_serialize, repeat=3):
+    timings = []
+    for func in [expected_serialize, serialize]:
+        start = time.time()
+        for _ in range(repeat):
+            data = render(func())
+        timings.append((time.time() - start) / repeat)
+    assert data == render(expected_serialize())
+    with capsys.disabled():
+        print("\n{:<40} {:>8.1f} ms serializer {:>8.1f} ms values {:>6.1f}x".format(
+            description, timings[0] * 1000, timings[1] * 1000, timings[0] / timings[1]))
+
+
+@pytest.mark.slow
+def test_benchmark_serializers(capsys, job, mock_bug_search):
+    create_error_lines(job, 500)
+
+    _benchmark(
+        capsys, "500 failure lines",
+        lambda: serializers.serialize_failure_lines(get_failure_lines(job)),
+        lambda: serializers.FailureLineNoStackSerializer(
+            get_failure_lines(job).prefetch_related('matches'), many=True).data)
+    _benchmark(
+        capsys, "500 text log errors",
+        lambda: serializers.serialize_text_log_errors(get_text_log_errors(job)),
+        lambda: serializers.TextLogErrorSerializer(
+            get_text_log_errors(job).select_related(
+                '_metadata', '_metadata__failure_line').prefetch_related(
+                    'classified_failures', 'matches'), many=True).data)
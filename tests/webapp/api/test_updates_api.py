@@ -0,0 +1,76 @@
+import json
+
+from django.core.urlresolvers import reverse
+from django.test import Client
+
+
+def _parse_events(body):
+    events = []
+    for message in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.split('\n'))
+        if 'data' in fields:
+            fields['data'] = json.loads(fields['data'])
+        events.append(fields)
+    return events
+
+
+def test_updates_stream(webapp, test_repository, updates_hub, settings):
+    settings.UPDATES_STREAM_SERVER = True
+    settings.UPDATES_STREAM_DURATION = 0.2
+    settings.UPDATES_KEEPALIVE_INTERVAL = 0.1
+    subscription = updates_hub.subscribe(test_repository.name)
+    for (event_id, event_type) in [('1', 'push'), ('2', 'job'), ('3', 'job')]:
+        updates_hub.bus.publish(test_repository.name, {
+            'id': event_id, 'type': event_type, 'data': {'id': int(event_id)}})
+
+    url = reverse('updates-list', kwargs={'project': test_repository.name})
+    resp = webapp.get(url, headers={'Last-Event-ID': '1'})
+    assert resp.content_type == 'text/event-stream'
+    events = _parse_events(resp.body)
+    assert events[:2] == [
+        {'id': '2', 'event': 'job', 'data': {'id': 2}},
+        {'id': '3', 'event': 'job', 'data': {'id': 3}},
+    ]
+    # then only keepalives until the stream ends
+    assert events[2:] and all(event == {'': 'keepalive'} for event in events[2:])
+
+    # clients which have missed updates are told to start again
+    resp = webapp.get(url, headers={'Last-Event-ID': 'unknown'})
+    assert _parse_events(resp.body)[0] == {'id': '', 'event': 'reset', 'data': {}}
+
+    # the streams' subscriptions are closed when they end
+    assert updates_hub.subscriptions[test_repository.name] == {subscription}
+
+
+def test_updates_stream_bad_project(webapp, transactional_db, updates_hub,
+                                    settings):
+    settings.UPDATES_STREAM_SERVER = True
+    url = reverse('updates-list', kwargs={'project': 'badproject'})
+    resp = webapp.get(url, headers={'Accept': 'text/event-stream'}, status=404)
+    assert _parse_events(resp.body)[0]['event'] == 'error'
+
+
+def test_updates_stream_disabled(webapp, test_repository, settings):
+    settings.UPDATES_BUS_URL = None
+    url = reverse('updates-list', kwargs={'project': test_repository.name})
+    resp = webapp.get(url, headers={'Accept': 'text/event-stream'}, status=404)
+    assert _parse_events(resp.body)[0]['event'] == 'error'
+
+
+def test_updates_stream_sync_server(webapp, test_repository, updates_hub,
+                                    settings):
+    # the stream isn't served by the sync workers of the web process
+    settings.UPDATES_STREAM_SERVER = False
+    url = reverse('updates-list', kwargs={'project': test_repository.name})
+    resp = webapp.get(url, headers={'Accept': 'text/event-stream'}, status=404)
+    assert _parse_events(resp.body)[0]['event'] == 'error'
+    assert not updates_hub.subscriptions[test_repository.name]
+
+
+def test_updates_stream_closed_unstarted(test_repository, updates_hub, settings):
+    # a stream closed before it starts (as when the client disconnects) leaves
+    # no subscription behind
+    settings.UPDATES_STREAM_SERVER = True
+    url = reverse('updates-list', kwargs={'project': test_repository.name})
+    Client().get(url).close()
+    assert not updates_hub.subscriptions[test_repository.name]
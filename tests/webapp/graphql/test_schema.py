@@ -1,4 +1,12 @@
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.model.models import (Bugscache,
+                                     Job,
+                                     JobDetail,
+                                     TextLogError,
+                                     TextLogStep)
 
 
 def test_graphql_options(webapp, eleven_jobs_stored, test_repository):
@@ -101,3 +109,96 @@ def test_graphql_push_with_jobs(webapp, sample_push, eleven_jobs_stored, test_re
         'repository': {'name': 'test_treeherder_jobs'},
         'revision': '45f8637cb9f78f19cb8463ff174e81756805d8cf'}}]}}}
     assert expected == response_dict
+
+
+def test_graphql_jobs_batched(webapp, eleven_jobs_stored, test_repository):
+    """
+    Retrieve a GraphQL set of jobs with their related objects, which are
+    loaded in a query per relation, not per job.
+    """
+    for job in Job.objects.all():
+        JobDetail.objects.create(job=job, title='title',
+                                 value='value {}'.format(job.id),
+                                 url='https://example.com/{}.log'.format(job.id))
+    query = """
+      query jobsQuery {
+        allJobs {
+          edges {
+            node {
+              guid
+              jobType { symbol }
+              buildPlatform { platform }
+              machine { name }
+              jobDetails (url_Iendswith: ".log") {
+                edges { node { value } }
+              }
+            }
+          }
+        }
+      }
+    """
+    url = "{}?{}".format(reverse("graphql"), 'query={}'.format(query))
+    with CaptureQueriesContext(connection) as captured:
+        resp = webapp.post(url)
+    assert resp.status_int == 200
+
+    jobs = {job.guid: job for job in Job.objects.select_related(
+        'job_type', 'build_platform', 'machine')}
+    nodes = [edge['node'] for edge in resp.json['data']['allJobs']['edges']]
+    assert len(nodes) == 11
+    for node in nodes:
+        job = jobs[node['guid']]
+        assert node['jobType'] == {'symbol': job.job_type.symbol}
+        assert node['buildPlatform'] == {'platform': job.build_platform.platform}
+        assert node['machine'] == {'name': job.machine.name}
+        assert node['jobDetails']['edges'] == [
+            {'node': {'value': 'value {}'.format(job.id)}}]
+
+    for table in ['job_type', 'build_platform', 'machine', 'job_detail']:
+        table_sql = 'FROM {}'.format(connection.ops.quote_name(table))
+        assert len([captured_query for captured_query in captured.captured_queries
+                    if table_sql in captured_query['sql']]) == 1
+
+
+def test_graphql_bug_suggestions_batched(webapp, eleven_jobs_stored, test_repository,
+                                         monkeypatch):
+    """
+    Retrieve a GraphQL set of text log errors' bug suggestions, whose bugs
+    are searched for in a single lookup.
+    """
+    lines = ['TEST-UNEXPECTED-FAIL | test_{}.html | failed'.format(i)
+             for i in range(3)]
+    for job in Job.objects.all()[:3]:
+        step = TextLogStep.objects.create(
+            job=job, name='step', started_line_number=1, finished_line_number=10,
+            result=TextLogStep.TEST_FAILED)
+        for (i, line) in enumerate(lines):
+            TextLogError.objects.create(step=step, line=line, line_number=i)
+
+    searches = []
+
+    def search_many(search_terms):
+        search_terms = list(search_terms)
+        searches.append(sorted(search_terms))
+        return {search_term: {'open_recent': [], 'all_others': [{'id': 1}]}
+                for search_term in search_terms}
+
+    monkeypatch.setattr(Bugscache, 'search_many', staticmethod(search_many))
+    query = """
+      query stepsQuery {
+        allTextLogSteps {
+          errors { bugSuggestions }
+        }
+      }
+    """
+    url = "{}?{}".format(reverse("graphql"), 'query={}'.format(query))
+    resp = webapp.post(url)
+    assert resp.status_int == 200
+
+    errors = [error for step_node in resp.json['data']['allTextLogSteps']
+              for error in step_node['errors']]
+    assert len(errors) == 9
+    for error in errors:
+        assert error['bugSuggestions']['bugs'] == {'open_recent': [],
+                                                   'all_others': [{'id': 1}]}
+    assert searches == [['test_0.html', 'test_1.html', 'test_2.html']]
@@ -45,5 +45,6 @@ setup(name='treeherder-client',
       license='MPL',
       packages=['thclient'],
       zip_safe=False,
-      install_requires=['requests>=2.4.3', 'requests-hawk>=1.0.0']
+      install_requires=['requests>=2.4.3', 'requests-hawk>=1.0.0'],
+      extras_require={'msgpack': ['msgpack-python>=0.4.0']}
       )
@@ -489,7 +489,7 @@ class TreeherderClient(object):
         else:
             return self._get_json(endpoint, project=project, **params)["results"]
 
-    def _get_json(self, endpoint, project=None, **params):
+    def _get(self, endpoint, project=None, **params):
         url = self._get_endpoint_url(endpoint, project=project)
 
         resp = self.session.get(url, params=params, timeout=self.timeout)
@@ -502,7 +502,10 @@ class TreeherderClient(object):
             logger.debug("Response headers: %s", resp.headers)
             raise
 
-        return resp.json()
+        return resp
+
+    def _get_json(self, endpoint, project=None, **params):
+        return self._get(endpoint, project=project, **params).json()
 
     def _post_json(self, project, endpoint, data):
         url = self._get_endpoint_url(endpoint, project=project)
@@ -1,6 +1,13 @@
 from .client import TreeherderClient
 
 
+def _accumulate(values):
+    total = 0
+    for value in values:
+        total += value
+        yield total
+
+
 class PerformanceTimeInterval(object):
     '''
     Valid time intervals for Perfherder series
@@ -102,6 +109,19 @@ class PerformanceSeries(list):
     def __getitem__(self, key):
         return map(lambda el: el[key], self)
 
+    @classmethod
+    def from_columnar(cls, series):
+        '''
+        Creates a series from its columnar representation in the API (a dict
+        of parallel arrays, some of them possibly delta encoded)
+        '''
+        series = dict(series)
+        signature_id = series.pop('signature_id')
+        for key in series.pop('delta_encoded', []):
+            series[key] = list(_accumulate(series[key]))
+        return cls(dict(zip(series.keys(), values), signature_id=signature_id)
+                   for values in zip(*series.values()))
+
 
 class PerfherderClient(TreeherderClient):
 
@@ -120,7 +140,20 @@ class PerfherderClient(TreeherderClient):
         Gets a dictionary of PerformanceSeries objects
 
         You can specify which signatures to get by passing signature to this function
-        '''
-        results = self._get_json(self.PERFORMANCE_DATA_ENDPOINT, project, **params)
 
+        If the data is requested with ``layout='columnar'`` (optionally with
+        ``delta_encode='true'`` and ``format='msgpack'``, which needs the
+        msgpack-python package installed), it is transferred in that more
+        compact form and converted back into PerformanceSeries objects
+        '''
+        if params.get('format') == 'msgpack':
+            import msgpack
+            results = msgpack.unpackb(
+                self._get(self.PERFORMANCE_DATA_ENDPOINT, project, **params).content,
+                encoding='utf-8')
+        else:
+            results = self._get_json(self.PERFORMANCE_DATA_ENDPOINT, project, **params)
+
+        if params.get('layout') == 'columnar':
+            return {k: PerformanceSeries.from_columnar(v) for k, v in results.items()}
         return {k: PerformanceSeries(v) for k, v in results.items()}
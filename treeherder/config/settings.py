@@ -33,6 +33,9 @@ DATA_CYCLE_DAYS = env.int("DATA_CYCLE_DAYS", default=120)
 # cycling data
 DATA_CYCLE_CHUNK_SIZE = env.int("DATA_CYCLE_CHUNK_SIZE", default=100)
 DATA_CYCLE_SLEEP_TIME = env.int("DATA_CYCLE_SLEEP_TIME", default=0)
+# When a replica database is configured, how far it can fall behind (in
+# seconds) before cycling data waits for it, instead of sleeping
+DATA_CYCLE_MAX_REPLICATION_LAG = env.int("DATA_CYCLE_MAX_REPLICATION_LAG", default=10)
 
 # Make this unique, and don't share it with anybody.
 SECRET_KEY = env("TREEHERDER_DJANGO_SECRET_KEY")
@@ -65,6 +68,15 @@ PERFHERDER_ALERTS_FORE_WINDOW = 12
 # Only generate alerts for data newer than this time in seconds in perfherder
 PERFHERDER_ALERTS_MAX_AGE = timedelta(weeks=2)
 
+# How long to wait for more data before generating alerts for a signature
+# with new data, so that retriggers and other data arriving together are
+# analyzed in one go
+PERFHERDER_ALERTS_SCHEDULING_DELAY = timedelta(seconds=60)
+
+# How far back the daily performance rollups are recalculated from when there
+# is no record of the last update (e.g. after the cache was flushed)
+PERFHERDER_DAILY_ROLLUPS_LOOKBACK = timedelta(days=2)
+
 # Create hashed+gzipped versions of assets during collectstatic,
 # which will then be served by WhiteNoise with a suitable max-age.
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -88,6 +100,9 @@ TEMPLATES = [
 MIDDLEWARE_CLASSES = [middleware for middleware in [
     # Adds custom New Relic annotations. Must be first so all transactions are annotated.
     'treeherder.middleware.NewRelicMiddleware',
+    # Records the query counts, times and response sizes of each view. Comes
+    # next so that it covers the work of all the other middleware.
+    'treeherder.middleware.RequestMetricsMiddleware',
     # Redirect to HTTPS/set HSTS and other security headers.
     'django.middleware.security.SecurityMiddleware',
     # Allows both Django static files and those specified via `WHITENOISE_ROOT`
@@ -258,6 +273,7 @@ CELERY_QUEUES = [
     Queue('cycle_data', Exchange('default'), routing_key='cycle_data'),
     Queue('fetch_bugs', Exchange('default'), routing_key='fetch_bugs'),
     Queue('generate_perf_alerts', Exchange('default'), routing_key='generate_perf_alerts'),
+    Queue('perf_rollups', Exchange('default'), routing_key='perf_rollups'),
     Queue('store_pulse_jobs', Exchange('default'), routing_key='store_pulse_jobs'),
     Queue('store_pulse_resultsets', Exchange('default'), routing_key='store_pulse_resultsets'),
     Queue('seta_analyze_failures', Exchange('default'), routing_key='seta_analyze_failures'),
@@ -363,6 +379,14 @@ CELERYBEAT_SCHEDULE = {
             'queue': "seta_analyze_failures"
         }
     },
+    'update-perf-daily-rollups-every-hour': {
+        'task': 'update-perf-daily-rollups',
+        'schedule': timedelta(hours=1),
+        'relative': True,
+        'options': {
+            'queue': 'perf_rollups'
+        }
+    },
 }
 
 # rest-framework settings
@@ -423,6 +447,45 @@ TASKCLUSTER_RUNNABLE_JOBS_URL = 'https://public-artifacts.taskcluster.net/{task_
 # suggestions or autoclassify panels for recently finished jobs)
 BUG_SUGGESTION_CACHE_TIMEOUT = 86400
 
+# the job change feed only returns jobs last modified at least this many
+# seconds ago, so that it doesn't skip past jobs saved by transactions which
+# have yet to commit
+JOB_CHANGES_DELAY = 2
+# the longest (in seconds) a request to the job change feed can wait for
+# changes (long polling), which is well within gunicorn's request timeout, and
+# how often it checks for them meanwhile: at first, then backing off to
+JOB_CHANGES_MAX_TIMEOUT = 10
+JOB_CHANGES_POLL_INTERVAL = 0.5
+JOB_CHANGES_MAX_POLL_INTERVAL = 4
+# how many seconds clients of the job change feed which have caught up without
+# waiting for changes are asked to wait before polling it again
+JOB_CHANGES_RETRY_AFTER = 5
+
+# The message bus job and push updates are published to for the updates event
+# stream, which is disabled without one: the URL of a Redis server, since jobs
+# and pushes are stored by the Celery workers rather than the web processes
+# serving the stream (memory:// only delivers updates within a process, so is
+# only of use for tests)
+UPDATES_BUS_URL = env("UPDATES_BUS_URL", default=None)
+# how many updates can be buffered for a slow updates stream client before it
+# has to start again, and how many are kept to replay to reconnecting clients
+UPDATES_CLIENT_BUFFER_SIZE = 1000
+UPDATES_REPLAY_BUFFER_SIZE = 1000
+# how long (in seconds) an updates stream connection is kept open for before
+# the client is asked to reconnect (which must be less than the web server's
+# request timeout), and how often a keepalive is sent when there are no updates
+UPDATES_STREAM_DURATION = 15
+UPDATES_KEEPALIVE_INTERVAL = 5
+# Whether this process serves the updates stream, which is only set for the
+# web_updates process: each connection occupies a worker for the whole
+# UPDATES_STREAM_DURATION, so it is only served by async (gevent) workers, not
+# the sync workers of the web process
+UPDATES_STREAM_SERVER = env.bool("UPDATES_STREAM_SERVER", default=False)
+
+# how long (in seconds) the rendered responses of conditional API endpoints
+# are cached for, keyed by their validator (so they are never served stale)
+CONDITIONAL_RESPONSE_CACHE_TIMEOUT = 60 * 60
+
 # the max size of a posted request to treeherder client during Buildbot
 # data job ingestion.
 # If TreeherderCollections are larger, they will be chunked
@@ -584,6 +647,10 @@ DATABASES = {
     'default': env.db_url('DATABASE_URL'),
 }
 
+# A read replica of the default database, only used to monitor replication lag
+if env('DATABASE_REPLICA_URL', default=None):
+    DATABASES['replica'] = env.db_url('DATABASE_REPLICA_URL')
+
 # We're intentionally not using django-environ's query string options feature,
 # since it hides configuration outside of the repository, plus could lead to
 # drift between environments.
@@ -26,10 +26,10 @@ if settings.DEBUG:
     ]
 
 if settings.GRAPHQL:
-    from graphene_django.views import GraphQLView
     from treeherder.webapp.graphql.schema import schema
+    from treeherder.webapp.graphql.views import BatchingGraphQLView
     urlpatterns += [
         url(r'^graphql$',
-            csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema)),
+            csrf_exempt(BatchingGraphQLView.as_view(graphiql=True, schema=schema)),
             name='graphql'),
     ]
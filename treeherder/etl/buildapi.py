@@ -1,24 +1,27 @@
 import logging
 import traceback
 from collections import defaultdict
+from hashlib import sha1
 
 import newrelic.agent
 import simplejson as json
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 
 from treeherder.client.thclient import TreeherderJobCollection
 from treeherder.etl import (buildbot,
                             common)
 from treeherder.etl.jobs import store_job_data
-from treeherder.model.models import (Push,
+from treeherder.model.models import (BuildapiBuild,
+                                     Push,
                                      Repository)
 
 logger = logging.getLogger(__name__)
 CACHE_KEYS = {
     'pending': 'processed_buildapi_pending',
     'running': 'processed_buildapi_running',
-    'complete': 'processed_buildapi_complete',
+    'complete_validators': 'buildapi_complete_validators',
 }
 
 # Signature sets are for
@@ -115,6 +118,7 @@ class Builds4hTransformerMixin(object):
         our restful api
         """
         valid_projects = set(Repository.objects.values_list('name', flat=True))
+        revisions_for_project = defaultdict(set)
 
         for build in data['builds']:
             try:
@@ -131,9 +135,18 @@ class Builds4hTransformerMixin(object):
                 logger.warning("skipping builds-4hr job %s since missing property: %s", build['id'], str(e))
                 continue
 
-        job_ids_seen_last_time = cache.get(CACHE_KEYS['complete'], set())
-        job_ids_seen_now = set()
-        revisions_seen_for_project = defaultdict(set)
+            revisions_for_project[project].add(prop['revision'])
+
+        pushed_revisions_for_project = {
+            project: Push.objects.get_pushed_revisions(project, revisions)
+            for project, revisions in revisions_for_project.items()
+        }
+
+        known_hashes = dict(BuildapiBuild.objects.filter(
+            id__in=[build['id'] for build in data['builds']]).values_list('id', 'content_hash'))
+        build_hashes = {}
+        num_unchanged = 0
+        missing_pushes = False
 
         # Holds one collection per unique branch/project
         th_collections = {}
@@ -153,23 +166,19 @@ class Builds4hTransformerMixin(object):
             # it should be quite rare for a job to be ingested before a
             # revision, but it could happen
             revision = prop['revision']
-            if (revision not in revisions_seen_for_project[project] and
-                not Push.objects.filter(
-                    repository__name=project,
-                    revision__startswith=revision).exists()):
+            if revision not in pushed_revisions_for_project[project]:
                 logger.warning("skipping jobs since %s revision %s "
                                "not yet ingested", project, revision)
+                missing_pushes = True
                 continue
-            revisions_seen_for_project[project].add(revision)
-
-            # We record the id here rather than at the start of the loop, since we
-            # must not count jobs whose revisions were not yet imported as processed,
-            # or we'll never process them once we've ingested their associated revision.
-            job_ids_seen_now.add(build['id'])
 
-            # Don't process jobs that were already present in builds-4hr
-            # the last time this task completed successfully.
-            if build['id'] in job_ids_seen_last_time:
+            # Don't process builds that haven't changed since they were last
+            # ingested. We must not record the hashes of builds whose revisions
+            # were not yet imported, or they'll never be processed once we've
+            # ingested their associated revision.
+            content_hash = build_content_hash(build)
+            if known_hashes.get(build['id']) == content_hash:
+                num_unchanged += 1
                 continue
 
             platform_info = buildbot.extract_platform_info(buildername)
@@ -179,6 +188,8 @@ class Builds4hTransformerMixin(object):
                     job_group_filter.lower()):
                 continue
 
+            build_hashes[build['id']] = content_hash
+
             treeherder_data = {
                 'revision': prop['revision'],
                 'project': project,
@@ -275,11 +286,10 @@ class Builds4hTransformerMixin(object):
             th_job = th_collections[project].get_job(treeherder_data)
             th_collections[project].add(th_job)
 
-        num_new_jobs = len(job_ids_seen_now.difference(job_ids_seen_last_time))
-        logger.info("Imported %d completed jobs, skipped %d previously seen",
-                    num_new_jobs, len(job_ids_seen_now) - num_new_jobs)
+        logger.info("Imported %d new or changed completed jobs, skipped %d unchanged",
+                    len(build_hashes), num_unchanged)
 
-        return th_collections, job_ids_seen_now
+        return th_collections, build_hashes, missing_pushes
 
 
 class PendingRunningTransformerMixin(object):
@@ -303,6 +313,11 @@ class PendingRunningTransformerMixin(object):
                     continue
                 revision_dict[project].append(rev)
 
+        pushed_revisions_for_project = {
+            project: Push.objects.get_pushed_revisions(project, revisions)
+            for project, revisions in revision_dict.items()
+        }
+
         job_ids_seen_last_time = cache.get(CACHE_KEYS[source], set())
         job_ids_seen_now = set()
 
@@ -312,21 +327,16 @@ class PendingRunningTransformerMixin(object):
             if common.should_skip_project(project, valid_projects, project_filter):
                 continue
 
-            revisions_seen_now_for_project = set()
-
             for revision, jobs in revisions.items():
                 if common.should_skip_revision(revision, revision_filter):
                     continue
 
                 # it should be quite rare for a job to be ingested before a
                 # revision, but it could happen
-                if revision not in revisions_seen_now_for_project and \
-                   not Push.objects.filter(repository__name=project,
-                                           revision__startswith=revision).exists():
+                if revision not in pushed_revisions_for_project[project]:
                     logger.warning("skipping jobs since %s revision %s "
                                    "not yet ingested", project, revision)
                     continue
-                revisions_seen_now_for_project.add(revision)
 
                 # using project and revision form the revision lookups
                 # to filter those jobs with unmatched revision
@@ -424,15 +434,32 @@ class Builds4hJobsProcess(Builds4hTransformerMixin):
 
     def run(self, revision_filter=None, project_filter=None, job_group_filter=None):
         """ Returns True if new completed jobs were loaded, False otherwise. """
-        builds_4hr = common.fetch_json(settings.BUILDAPI_BUILDS4H_URL)
-        job_collections, job_ids_seen = self.transform(builds_4hr,
-                                                       revision_filter=revision_filter,
-                                                       project_filter=project_filter,
-                                                       job_group_filter=job_group_filter)
+        # A filtered run only ingests some of the builds, so must neither skip
+        # fetching an unchanged builds-4hr, nor stop the next run from doing so.
+        filtered = revision_filter or project_filter or job_group_filter
+        validators = {}
+        if not filtered:
+            validators = cache.get(CACHE_KEYS['complete_validators'], {})
+
+        builds_4hr, new_validators = common.fetch_json_if_modified(settings.BUILDAPI_BUILDS4H_URL,
+                                                                   validators)
+        if builds_4hr is None:
+            logger.info("Skipped builds-4hr since it is unchanged since the last run")
+            return False
+
+        job_collections, build_hashes, missing_pushes = self.transform(builds_4hr,
+                                                                       revision_filter=revision_filter,
+                                                                       project_filter=project_filter,
+                                                                       job_group_filter=job_group_filter)
         if job_collections:
             store_jobs(job_collections,
                        chunk_size=settings.BUILDAPI_BUILDS4H_CHUNK_SIZE)
-        cache.set(CACHE_KEYS['complete'], job_ids_seen)
+        store_build_hashes(build_hashes,
+                           [build['id'] for build in builds_4hr['builds']])
+        # If some builds were skipped since their pushes were not yet ingested,
+        # builds-4hr must be processed again even if it doesn't change.
+        if not filtered and not missing_pushes:
+            cache.set(CACHE_KEYS['complete_validators'], new_validators)
         return bool(job_collections)
 
 
@@ -470,6 +497,29 @@ class RunningJobsProcess(PendingRunningTransformerMixin):
         return bool(job_collections)
 
 
+def build_content_hash(build):
+    """Return a hash of the content of a builds-4hr build."""
+    return sha1(json.dumps(build, sort_keys=True)).hexdigest()
+
+
+def store_build_hashes(build_hashes, build_ids):
+    """
+    Record the content hashes of the builds-4hr builds that were ingested,
+    and remove those of builds that have since dropped out of builds-4hr.
+    """
+    with transaction.atomic():
+        if build_hashes:
+            BuildapiBuild.objects.filter(id__in=build_hashes.keys()).delete()
+            BuildapiBuild.objects.bulk_create(
+                [BuildapiBuild(id=build_id, content_hash=content_hash)
+                 for build_id, content_hash in build_hashes.items()],
+                batch_size=1000)
+        # Build ids are sequential, so builds older than the oldest in
+        # builds-4hr will not be seen again.
+        if build_ids:
+            BuildapiBuild.objects.filter(id__lt=min(build_ids)).delete()
+
+
 def store_jobs(job_collections, chunk_size):
     errors = []
     for repository_name, jobs in job_collections.iteritems():
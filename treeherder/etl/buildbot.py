@@ -1,4 +1,6 @@
+import copy
 import re
+from functools import wraps
 
 RESULT_DICT = {
     0: "success",
@@ -1255,7 +1257,38 @@ SYMBOLS = {
 # Match the job part number from buildernames such as "... mochitest-5"
 NUMBER_RE = re.compile(r".*-(\d+)$")
 
+# The maximum number of buildernames whose results are kept by each of the
+# memoized lookups below. The same few thousand buildernames are seen over
+# and over again in builds-4hr, pending, running and allthethings.json.
+BUILDERNAME_CACHE_SIZE = 10000
 
+
+def memoize_buildername(f):
+    """
+    Decorator that caches the result of a lookup by buildername.
+
+    Once the cache reaches ``BUILDERNAME_CACHE_SIZE`` entries it is emptied.
+    Callers receive a copy of the cached result, so are free to modify it.
+    The cache can be emptied with the ``cache_clear`` attribute of the
+    decorated function.
+    """
+    cache = {}
+
+    @wraps(f)
+    def inner(source_string):
+        try:
+            result = cache[source_string]
+        except KeyError:
+            if len(cache) >= BUILDERNAME_CACHE_SIZE:
+                cache.clear()
+            result = cache[source_string] = f(source_string)
+        return copy.copy(result)
+
+    inner.cache_clear = cache.clear
+    return inner
+
+
+@memoize_buildername
 def extract_platform_info(source_string):
     output = {
         'os': 'unknown',
@@ -1269,6 +1302,7 @@ def extract_platform_info(source_string):
     return output
 
 
+@memoize_buildername
 def extract_build_type(source_string):
     output = 'opt'
     for build_type in BUILD_TYPE_BUILDERNAME:
@@ -1278,6 +1312,7 @@ def extract_build_type(source_string):
     return output
 
 
+@memoize_buildername
 def extract_name_info(source_string):
     """Extract all the pieces that comprise a name, including symbols"""
     output = {
@@ -1326,7 +1361,12 @@ def get_symbol(name, bn):
 
 
 def get_symbols_and_platforms(buildername):
-    """Return a dict with all the information we extract from the buildername."""
+    """
+    Return a dict with all the information we extract from the buildername.
+
+    This is built from the memoized lookups above, so is cheap to call for
+    buildernames that have been seen before.
+    """
     platform_info = extract_platform_info(buildername)
     job_name_info = extract_name_info(buildername)
 
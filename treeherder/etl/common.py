@@ -72,6 +72,32 @@ def fetch_json(url, params=None, force_gzip_decompression=False):
     return response.json()
 
 
+def fetch_json_if_modified(url, validators):
+    """
+    Fetch JSON from a url, unless it is unchanged since a previous fetch.
+
+    ``validators`` holds the ``ETag`` and ``Last-Modified`` headers of the
+    previous response (as returned by this function), which are used to make
+    a conditional request. Returns a tuple of the decoded JSON (or None if the
+    resource has not been modified) and the validators of the new response.
+    """
+    headers = {'Accept': 'application/json'}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    response = make_request(url, headers=headers)
+    if response.status_code == 304:
+        return None, validators
+
+    new_validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    return response.json(), new_validators
+
+
 def fetch_text(url):
     response = make_request(url)
     return response.text
@@ -55,11 +55,16 @@ class JobLoader:
             try:
                 repository = Repository.objects.get(name=project)
 
+                pushed_revisions = Push.objects.get_pushed_revisions(
+                    repository,
+                    [pulse_job["origin"].get("revision") for pulse_job in job_list])
+
                 storeable_job_list = []
                 for pulse_job in job_list:
                     if pulse_job["state"] != "unscheduled":
                         try:
-                            self.validate_revision(repository, pulse_job)
+                            self.validate_revision(repository, pulse_job,
+                                                   pushed_revisions=pushed_revisions)
                             storeable_job_list.append(
                                 self.transform(pulse_job)
                             )
@@ -72,16 +77,19 @@ class JobLoader:
             except Repository.DoesNotExist:
                 logger.info("Job with unsupported project: {}".format(project))
 
-    def validate_revision(self, repository, pulse_job):
+    def validate_revision(self, repository, pulse_job, pushed_revisions=None):
         revision = pulse_job["origin"].get("revision")
         # will raise an exception if repository with name does not
         # exist (which we want, I think, to draw attention to the problem)
         # check the revision for this job has an existing push
         # If it doesn't, then except out so that the celery task will
         # retry till it DOES exist.
-        # TODO: Stop using startswith for improved performance as part of bug 1306707.
-        if not Push.objects.filter(repository=repository,
-                                   revision__startswith=revision).exists():
+        # ``pushed_revisions`` can be used to pass in the result of
+        # ``Push.objects.get_pushed_revisions`` for a batch of jobs, to save
+        # querying for each job in turn.
+        if pushed_revisions is None:
+            pushed_revisions = Push.objects.get_pushed_revisions(repository, [revision])
+        if revision not in pushed_revisions:
             raise MissingPushException(
                 "No push found in {} for revision {}".format(
                     pulse_job["origin"]["project"],
@@ -6,6 +6,7 @@ from hashlib import sha1
 import newrelic.agent
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.utils import IntegrityError
 
 from treeherder.etl.artifact import (serialize_artifact_json_blobs,
@@ -23,8 +24,10 @@ from treeherder.model.models import (BuildPlatform,
                                      OptionCollection,
                                      Product,
                                      Push,
+                                     PushJobCount,
                                      ReferenceDataSignatures,
                                      TaskclusterMetadata)
+from treeherder.model.updates import publish_job_updates
 
 logger = logging.getLogger(__name__)
 
@@ -207,38 +210,71 @@ def _load_job(repository, job_datum, push_id, lower_tier_signatures):
         # it, but allow it to skip if it's the same guid.  The odds are
         # extremely high that this is a pending and running job that came in
         # quick succession and are being processed by two different workers.
-        Job.objects.get_or_create(
+        try:
+            with transaction.atomic():
+                Job.objects.create(
+                    guid=job_guid,
+                    repository=repository,
+                    signature=signature,
+                    build_platform=build_platform,
+                    machine_platform=machine_platform,
+                    machine=machine,
+                    option_collection_hash=option_collection_hash,
+                    job_type=job_type,
+                    job_group=job_group,
+                    product=product,
+                    failure_classification=default_failure_classification,
+                    who=who,
+                    reason=reason,
+                    result=result,
+                    state=state,
+                    tier=tier,
+                    submit_time=submit_time,
+                    start_time=start_time,
+                    end_time=end_time,
+                    last_modified=datetime.now(),
+                    push_id=push_id)
+                PushJobCount.objects.apply_job_changes(added=[
+                    (push_id, state, result, tier, default_failure_classification.id)])
+        except IntegrityError:
+            pass
+
+    with transaction.atomic():
+        # Can't just use the ``job`` we would have created above because we
+        # need to try the job_guid_root instance first for update, rather
+        # than a possible retry job instance. The job is locked so that the
+        # changes to it by concurrent stores are counted one after the other.
+        try:
+            job = Job.objects.select_for_update().get(guid=job_guid_root)
+        except ObjectDoesNotExist:
+            job = Job.objects.select_for_update().get(guid=job_guid)
+
+        # Update job with any data that would have changed
+        Job.objects.filter(id=job.id).update(
             guid=job_guid,
-            defaults={
-                "repository": repository,
-                "signature": signature,
-                "build_platform": build_platform,
-                "machine_platform": machine_platform,
-                "machine": machine,
-                "option_collection_hash": option_collection_hash,
-                "job_type": job_type,
-                "job_group": job_group,
-                "product": product,
-                "failure_classification": default_failure_classification,
-                "who": who,
-                "reason": reason,
-                "result": result,
-                "state": state,
-                "tier": tier,
-                "submit_time": submit_time,
-                "start_time": start_time,
-                "end_time": end_time,
-                "last_modified": datetime.now(),
-                "push_id": push_id
-            }
-        )
-    # Can't just use the ``job`` we would get from the ``get_or_create``
-    # because we need to try the job_guid_root instance first for update,
-    # rather than a possible retry job instance.
-    try:
-        job = Job.objects.get(guid=job_guid_root)
-    except ObjectDoesNotExist:
-        job = Job.objects.get(guid=job_guid)
+            signature=signature,
+            build_platform=build_platform,
+            machine_platform=machine_platform,
+            machine=machine,
+            option_collection_hash=option_collection_hash,
+            job_type=job_type,
+            job_group=job_group,
+            product=product,
+            failure_classification=default_failure_classification,
+            who=who,
+            reason=reason,
+            result=result,
+            state=state,
+            tier=tier,
+            submit_time=submit_time,
+            start_time=start_time,
+            end_time=end_time,
+            last_modified=datetime.now(),
+            push_id=push_id)
+        PushJobCount.objects.apply_job_changes(
+            removed=[(job.push_id, job.state, job.result, job.tier,
+                      job.failure_classification_id)],
+            added=[(push_id, state, result, tier, default_failure_classification.id)])
 
     # add taskcluster metadata if applicable
     if all([k in job_datum for k in ['taskcluster_task_id', 'taskcluster_retry_id']]):
@@ -250,29 +286,6 @@ def _load_job(repository, job_datum, push_id, lower_tier_signatures):
         except IntegrityError:
             pass
 
-    # Update job with any data that would have changed
-    Job.objects.filter(id=job.id).update(
-        guid=job_guid,
-        signature=signature,
-        build_platform=build_platform,
-        machine_platform=machine_platform,
-        machine=machine,
-        option_collection_hash=option_collection_hash,
-        job_type=job_type,
-        job_group=job_group,
-        product=product,
-        failure_classification=default_failure_classification,
-        who=who,
-        reason=reason,
-        result=result,
-        state=state,
-        tier=tier,
-        submit_time=submit_time,
-        start_time=start_time,
-        end_time=end_time,
-        last_modified=datetime.now(),
-        push_id=push_id)
-
     artifacts = job_datum.get('artifacts', [])
 
     has_text_log_summary = any(x for x in artifacts
@@ -439,6 +452,7 @@ def store_job_data(repository, data, lower_tier_signatures=None):
         return
 
     superseded_job_guid_placeholders = []
+    stored_job_guids = []
 
     for datum in data:
         try:
@@ -459,6 +473,7 @@ def store_job_data(repository, data, lower_tier_signatures=None):
             # load job
             (job_guid, reference_data_signature) = _load_job(
                 repository, job, push_id, lower_tier_signatures)
+            stored_job_guids.append(job_guid)
 
             for superseded_guid in superseded:
                 superseded_job_guid_placeholders.append(
@@ -484,8 +499,20 @@ def store_job_data(repository, data, lower_tier_signatures=None):
     # Also update state and result.
     # TODO: Consider removing this in Bug 1402992.
     if superseded_job_guid_placeholders:
-        for (job_guid, superseded_by_guid) in superseded_job_guid_placeholders:
-            Job.objects.filter(guid=superseded_by_guid).update(
-                result='superseded',
-                state='completed',
-                coalesced_to_guid=job_guid)
+        with transaction.atomic():
+            superseded_jobs = list(Job.objects.select_for_update().filter(
+                guid__in=[guid for (_, guid) in superseded_job_guid_placeholders]).values_list(
+                    *PushJobCount.COUNTED_JOB_FIELDS))
+            for (job_guid, superseded_by_guid) in superseded_job_guid_placeholders:
+                Job.objects.filter(guid=superseded_by_guid).update(
+                    result='superseded',
+                    state='completed',
+                    coalesced_to_guid=job_guid,
+                    last_modified=datetime.now())
+                stored_job_guids.append(superseded_by_guid)
+            PushJobCount.objects.apply_job_changes(
+                removed=superseded_jobs,
+                added=[superseded_job[:1] + ('completed', 'superseded') + superseded_job[3:]
+                       for superseded_job in superseded_jobs])
+
+    publish_job_updates(repository, stored_job_guids)
@@ -0,0 +1,399 @@
+import datetime
+import json
+import random
+import subprocess
+import time
+import uuid
+from collections import (OrderedDict,
+                         defaultdict)
+from contextlib import contextmanager
+from functools import wraps
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.management.base import (BaseCommand,
+                                         CommandError)
+from django.db import connection
+from django.utils.six.moves import input
+
+from tests.sample_data_generator import pulse_job_data
+from treeherder.celery import app
+from treeherder.etl import (job_loader,
+                            jobs)
+from treeherder.etl.job_loader import JobLoader
+from treeherder.model.models import (Push,
+                                     Repository,
+                                     RepositoryGroup)
+
+# The functions whose time and query count is reported, in pipeline order.
+STAGES = [
+    (JobLoader, 'process_job_list'),
+    (JobLoader, '_get_validated_jobs_by_project'),
+    (JobLoader, 'transform'),
+    (job_loader, 'store_job_data'),
+    (jobs, '_load_job'),
+    (jobs, 'store_job_artifacts'),
+    (jobs, '_schedule_log_parsing'),
+]
+
+REPOSITORY_NAME_PREFIX = 'benchmark-ingestion-'
+
+
+class QueryCounter(object):
+    """
+    Stand-in for a connection's ``queries_log`` that only counts queries,
+    so that long benchmark runs don't hold on to every query made.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def append(self, query):
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter([])
+
+
+class Command(BaseCommand):
+    help = """Measure the throughput of pulse job ingestion
+
+Synthetic pulse jobs are generated across one or more new repositories,
+loaded through JobLoader.process_job_list, and the time and number of
+queries spent in each stage of ingestion are reported. The repositories
+(and so all data created) are deleted afterwards unless --keep-data is
+given. Only use this against a local development database."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1000,
+            help='Number of jobs to ingest'
+        )
+        parser.add_argument(
+            '--repositories',
+            type=int,
+            default=1,
+            help='Number of repositories to spread the jobs across'
+        )
+        parser.add_argument(
+            '--pushes',
+            type=int,
+            default=10,
+            help='Number of pushes per repository to spread the jobs across'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1,
+            help='Number of jobs passed to each process_job_list call'
+        )
+        parser.add_argument(
+            '--job-info-links',
+            type=int,
+            default=2,
+            help='Number of job info links (job details) per job'
+        )
+        parser.add_argument(
+            '--log-steps',
+            type=int,
+            default=0,
+            help=('Number of steps in the log of each job. If non-zero, the log '
+                  'is submitted already parsed, creating a text_log_summary '
+                  'artifact, otherwise log parsing is scheduled')
+        )
+        parser.add_argument(
+            '--errorsummary-fraction',
+            type=float,
+            default=0.5,
+            help='Fraction of jobs that also have an errorsummary log'
+        )
+        parser.add_argument(
+            '--failure-fraction',
+            type=float,
+            default=0.1,
+            help='Fraction of jobs that fail'
+        )
+        parser.add_argument(
+            '--celery',
+            choices=['stub', 'eager'],
+            default='stub',
+            help=('Whether tasks scheduled during ingestion (eg log parsing) '
+                  'are counted but not run, or run immediately')
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the random choices made when generating jobs'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Compare the results with those previously written to this file'
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            default=False,
+            help="Don't delete the repositories and jobs created"
+        )
+        parser.add_argument(
+            '--noinput',
+            action='store_false',
+            dest='interactive',
+            default=True,
+            help="Don't ask for confirmation before writing to the database"
+        )
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1 or options['repositories'] < 1 or options['pushes'] < 1:
+            raise CommandError('--jobs, --repositories and --pushes must be at least 1')
+
+        if options['interactive']:
+            confirm = input("""
+This will create and then delete repositories, pushes and jobs in the
+database %r, which should only be done on a development instance.
+
+Type 'yes' to continue, or 'no' to cancel: """ % connection.settings_dict['NAME'])
+            if confirm != 'yes':
+                return
+
+        repositories = self.create_repositories(options['repositories'], options['pushes'])
+        try:
+            pulse_jobs = self.generate_jobs(repositories, options)
+            results = self.run_benchmark(pulse_jobs, options)
+        finally:
+            if not options['keep_data']:
+                for repository in repositories:
+                    repository.delete()
+
+        self.report(results)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def create_repositories(self, num_repositories, num_pushes):
+        repository_group, _ = RepositoryGroup.objects.get_or_create(
+            name='development', defaults={'description': ''})
+        Repository.objects.filter(name__startswith=REPOSITORY_NAME_PREFIX).delete()
+
+        repositories = []
+        now = datetime.datetime.now()
+        for i in range(num_repositories):
+            repository = Repository.objects.create(
+                repository_group=repository_group,
+                name='%s%d' % (REPOSITORY_NAME_PREFIX, i),
+                dvcs_type='hg',
+                url='https://hg.mozilla.org/%s%d' % (REPOSITORY_NAME_PREFIX, i),
+                codebase='gecko',
+                description='')
+            for j in range(num_pushes):
+                Push.objects.create(repository=repository,
+                                    revision=sha1('%s %d' % (repository.name, j)).hexdigest(),
+                                    author='benchmark@example.com',
+                                    time=now)
+            repositories.append(repository)
+        return repositories
+
+    def generate_jobs(self, repositories, options):
+        rng = random.Random(options['seed'])
+        revisions = {repository.name: list(Push.objects.filter(
+            repository=repository).values_list('revision', flat=True))
+            for repository in repositories}
+
+        pulse_jobs = []
+        for i in range(options['jobs']):
+            project = rng.choice(revisions.keys())
+            task_id = '%s/0' % uuid.UUID(int=rng.getrandbits(128))
+            failed = rng.random() < options['failure_fraction']
+
+            log = {
+                'name': 'buildbot_text',
+                'url': 'https://example.com/logs/%s/live_backing.log' % task_id,
+            }
+            if options['log_steps']:
+                log['steps'] = [{
+                    'name': 'step %d' % step,
+                    'result': 'fail' if failed and step == 0 else 'success',
+                    'timeStarted': '2014-12-19T17:39:57-08:00',
+                    'timeFinished': '2014-12-19T17:49:57-08:00',
+                    'lineStarted': step * 100,
+                    'lineFinished': step * 100 + 99,
+                    'errors': [{'line': 'TEST-UNEXPECTED-FAIL | test_%d.js | failed' % i,
+                                'linenumber': step * 100 + 50}] if failed and step == 0 else [],
+                } for step in range(options['log_steps'])]
+
+            links = [{
+                'url': 'https://example.com/artifacts/%s/file_%d.log' % (task_id, link),
+                'linkText': 'file_%d.log' % link,
+                'label': 'artifact uploaded',
+            } for link in range(options['job_info_links'])]
+            if rng.random() < options['errorsummary_fraction']:
+                links.append({
+                    'url': 'https://example.com/artifacts/%s/mochitest_errorsummary.log' % task_id,
+                    'linkText': 'mochitest_errorsummary.log',
+                    'label': 'artifact uploaded',
+                })
+
+            chunk = rng.randint(1, 20)
+            pulse_jobs.append(pulse_job_data(
+                task_id=task_id,
+                project=project,
+                revision=rng.choice(revisions[project]),
+                job_name='test-linux64/opt-mochitest-%d' % chunk,
+                job_symbol='M%d' % chunk,
+                group_symbol='M',
+                result='fail' if failed else 'success',
+                logs=[log],
+                job_info_links=links))
+        return pulse_jobs
+
+    def run_benchmark(self, pulse_jobs, options):
+        stage_stats = OrderedDict(
+            (name, {'calls': 0, 'seconds': 0.0, 'queries': 0})
+            for _, name in STAGES)
+        scheduled_tasks = defaultdict(int)
+        queries = QueryCounter()
+
+        with instrument_stages(stage_stats, queries), \
+                celery_mode(options['celery'], scheduled_tasks), \
+                count_queries(queries):
+            loader = JobLoader()
+            batch_size = options['batch_size']
+            start = time.time()
+            for i in range(0, len(pulse_jobs), batch_size):
+                loader.process_job_list(pulse_jobs[i:i + batch_size])
+            total_seconds = time.time() - start
+
+        return OrderedDict([
+            ('revision', get_revision()),
+            ('date', datetime.datetime.utcnow().isoformat()),
+            ('options', {key: options[key] for key in (
+                'jobs', 'repositories', 'pushes', 'batch_size', 'job_info_links',
+                'log_steps', 'errorsummary_fraction', 'failure_fraction', 'celery', 'seed')}),
+            ('seconds', total_seconds),
+            ('jobs_per_second', len(pulse_jobs) / total_seconds),
+            ('queries', len(queries)),
+            ('queries_per_job', float(len(queries)) / len(pulse_jobs)),
+            ('stages', stage_stats),
+            ('scheduled_tasks', dict(scheduled_tasks)),
+        ])
+
+    def report(self, results):
+        self.stdout.write('Ingested %d jobs in %.2fs: %.1f jobs/sec, %.1f queries/job' % (
+            results['options']['jobs'], results['seconds'],
+            results['jobs_per_second'], results['queries_per_job']))
+        self.stdout.write('%-32s %8s %10s %10s' % ('stage', 'calls', 'seconds', 'queries'))
+        for name, stats in results['stages'].items():
+            self.stdout.write('%-32s %8d %10.3f %10d' % (
+                name, stats['calls'], stats['seconds'], stats['queries']))
+        for name, count in sorted(results['scheduled_tasks'].items()):
+            self.stdout.write('Scheduled %d %s tasks' % (count, name))
+
+    def compare(self, previous, results):
+        self.stdout.write('Compared with %s (%s):' % (previous['revision'], previous['date']))
+        if previous['options'] != results['options']:
+            self.stdout.write('Warning: the benchmark options differ')
+        for key in ('seconds', 'jobs_per_second', 'queries_per_job'):
+            self.stdout.write('%-32s %10.3f -> %10.3f (%+.1f%%)' % (
+                key, previous[key], results[key], percent_change(previous[key], results[key])))
+        for name, stats in results['stages'].items():
+            previous_stats = previous['stages'].get(name)
+            if previous_stats:
+                self.stdout.write('%-32s %10.3f -> %10.3f (%+.1f%%)' % (
+                    name, previous_stats['seconds'], stats['seconds'],
+                    percent_change(previous_stats['seconds'], stats['seconds'])))
+
+
+def percent_change(old, new):
+    if not old:
+        return 0.0
+    return 100.0 * (new - old) / old
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def instrument_stages(stage_stats, queries):
+    """Record the calls, time and queries of each stage of ingestion."""
+    def timed(f, stats):
+        @wraps(f)
+        def inner(*args, **kwargs):
+            start_time = time.time()
+            start_queries = len(queries)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                stats['calls'] += 1
+                stats['seconds'] += time.time() - start_time
+                stats['queries'] += len(queries) - start_queries
+        return inner
+
+    originals = []
+    for owner, name in STAGES:
+        # Use __dict__ to avoid getting unbound methods from classes.
+        original = owner.__dict__[name]
+        originals.append((owner, name, original))
+        setattr(owner, name, timed(original, stage_stats[name]))
+    try:
+        yield
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+
+@contextmanager
+def celery_mode(mode, scheduled_tasks):
+    """Either count tasks without running them, or run them immediately."""
+    def send_task(name, *args, **kwargs):
+        scheduled_tasks[name] += 1
+
+    always_eager = settings.CELERY_ALWAYS_EAGER
+    settings.CELERY_ALWAYS_EAGER = (mode == 'eager')
+    if mode == 'stub':
+        app.send_task = send_task
+    try:
+        yield
+    finally:
+        settings.CELERY_ALWAYS_EAGER = always_eager
+        if mode == 'stub':
+            del app.send_task
+
+
+@contextmanager
+def count_queries(queries):
+    """
+    Count the queries made on the current thread's connection.
+
+    Queries made by other threads, such as those of the log parser, are not
+    included.
+    """
+    force_debug_cursor = connection.force_debug_cursor
+    queries_log = connection.queries_log
+    connection.force_debug_cursor = True
+    connection.queries_log = queries
+    try:
+        yield
+    finally:
+        connection.force_debug_cursor = force_debug_cursor
+        connection.queries_log = queries_log
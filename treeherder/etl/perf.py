@@ -1,19 +1,34 @@
 import copy
 import logging
 import os
+from collections import (OrderedDict,
+                         defaultdict)
 from hashlib import sha1
 
 import simplejson as json
+from django.db import (IntegrityError,
+                       models,
+                       transaction)
+from django.db.models import Value
+from django.db.models.functions import Greatest
 from jsonschema import validate
 
-from treeherder.model.models import OptionCollection
+from treeherder.model.models import (OptionCollection,
+                                     invalidate_table_version)
 from treeherder.perf.models import (PerformanceDatum,
                                     PerformanceFramework,
                                     PerformanceSignature)
-from treeherder.perf.tasks import generate_alerts
+from treeherder.perf.rollups import update_push_rollups
+from treeherder.perf.tasks import schedule_alert_generation
 
 logger = logging.getLogger(__name__)
 
+# Signatures already seen by this process, keyed by repository id, framework
+# id and signature hash, so that storing data for them doesn't need to look
+# them up or write them again unless their properties change.
+SIGNATURE_CACHE_SIZE = 10000
+_signature_cache = {}
+
 
 PERFHERDER_SCHEMA = json.load(open(os.path.join('schemas',
                                                 'performance-artifact.json')))
@@ -35,7 +50,11 @@ def _get_signature_hash(signature_properties):
     return sha.hexdigest()
 
 
-def _load_perf_datum(job, perf_datum):
+def _load_perf_datum(job, perf_datum, retry=True):
+    """
+    Store the performance data of a job, returning the ids of the signatures
+    which should have alerts generated for their new data
+    """
     validate(perf_datum, PERFHERDER_SCHEMA)
 
     extra_properties = {}
@@ -55,11 +74,16 @@ def _load_perf_datum(job, perf_datum):
         logger.warning("Performance framework {} does not exist, skipping "
                        "load of performance artifacts".format(
                            perf_datum['framework']['name']))
-        return
+        return []
     if not framework.enabled:
         logger.info("Performance framework {} is not enabled, skipping"
                     .format(perf_datum['framework']['name']))
-        return
+        return []
+
+    # work out the properties of every signature and datum first, so that
+    # they can be looked up and stored together
+    signatures = OrderedDict()
+    datums = []
     for suite in perf_datum['suites']:
         suite_extra_properties = copy.copy(extra_properties)
         suite_extra_options = copy.copy(extra_options)
@@ -84,40 +108,27 @@ def _load_perf_datum(job, perf_datum):
             summary_signature_hash = _get_signature_hash(
                 summary_properties)
 
-            signature, _ = PerformanceSignature.objects.update_or_create(
-                repository=job.repository,
-                signature_hash=summary_signature_hash,
-                framework=framework,
-                defaults={
-                    'test': '',
-                    'suite': suite['name'],
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'extra_options': suite_extra_options,
-                    'lower_is_better': suite.get('lowerIsBetter', True),
-                    'has_subtests': True,
-                    # these properties below can be either True, False, or null
-                    # (None). Null indicates no preference has been set.
-                    'should_alert': suite.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        suite.get('alertChangeType')),
-                    'alert_threshold': suite.get('alertThreshold'),
-                    'min_back_window': suite.get('minBackWindow'),
-                    'max_back_window': suite.get('maxBackWindow'),
-                    'fore_window': suite.get('foreWindow'),
-                    'last_updated': job.push.time
-                })
-            (_, datum_created) = PerformanceDatum.objects.get_or_create(
-                repository=job.repository,
-                job=job,
-                push=job.push,
-                signature=signature,
-                push_timestamp=job.push.time,
-                defaults={'value': suite['value']})
-            if signature.should_alert is not False and datum_created and \
-               job.repository.performance_alerts_enabled:
-                generate_alerts.apply_async(args=[signature.id],
-                                            routing_key='generate_perf_alerts')
+            signatures[summary_signature_hash] = {
+                'test': '',
+                'suite': suite['name'],
+                'option_collection': option_collection,
+                'platform': job.machine_platform,
+                'extra_options': suite_extra_options,
+                'lower_is_better': suite.get('lowerIsBetter', True),
+                'has_subtests': True,
+                # these properties below can be either True, False, or null
+                # (None). Null indicates no preference has been set.
+                'should_alert': suite.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    suite.get('alertChangeType')),
+                'alert_threshold': suite.get('alertThreshold'),
+                'min_back_window': suite.get('minBackWindow'),
+                'max_back_window': suite.get('maxBackWindow'),
+                'fore_window': suite.get('foreWindow'),
+                'parent_signature': None
+            }
+            datums.append((summary_signature_hash, suite['value'],
+                           suite.get('shouldAlert') is not False))
 
         for subtest in suite['subtests']:
             subtest_properties = {
@@ -127,66 +138,182 @@ def _load_perf_datum(job, perf_datum):
             subtest_properties.update(reference_data)
             subtest_properties.update(suite_extra_properties)
 
-            summary_signature = None
             if summary_signature_hash is not None:
                 subtest_properties.update({'parent_signature': summary_signature_hash})
-                summary_signature = PerformanceSignature.objects.get(
-                    repository=job.repository,
-                    framework=framework,
-                    signature_hash=summary_signature_hash)
             subtest_signature_hash = _get_signature_hash(subtest_properties)
             value = list(subtest['value'] for subtest in suite['subtests'] if
                          subtest['name'] == subtest_properties['test'])
-            signature, _ = PerformanceSignature.objects.update_or_create(
+            signatures[subtest_signature_hash] = {
+                'test': subtest_properties['test'],
+                'suite': suite['name'],
+                'option_collection': option_collection,
+                'platform': job.machine_platform,
+                'extra_options': suite_extra_options,
+                'lower_is_better': subtest.get('lowerIsBetter', True),
+                'has_subtests': False,
+                # these properties below can be either True, False, or
+                # null (None). Null indicates no preference has been
+                # set.
+                'should_alert': subtest.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    subtest.get('alertChangeType')),
+                'alert_threshold': subtest.get('alertThreshold'),
+                'min_back_window': subtest.get('minBackWindow'),
+                'max_back_window': subtest.get('maxBackWindow'),
+                'fore_window': subtest.get('foreWindow'),
+                'parent_signature': summary_signature_hash
+            }
+
+            # by default if there is no summary, we should schedule a
+            # generate alerts task for the subtest, since we have new data
+            # (this can be over-ridden by the optional "should alert"
+            # property)
+            should_alert = subtest.get('shouldAlert')
+            datums.append((subtest_signature_hash, value[0],
+                           should_alert or (should_alert is None and
+                                            suite.get('value') is None)))
+
+    try:
+        # in a single transaction, so that the datums and their rollups are
+        # written together
+        with transaction.atomic():
+            signature_ids = _store_signatures(job, framework, signatures)
+            created_signature_ids = _store_datums(job, signature_ids, datums)
+    except IntegrityError:
+        # a signature may have been deleted since it was cached, or another
+        # process may have stored the same data: try again from scratch
+        _signature_cache.clear()
+        if retry:
+            return _load_perf_datum(job, perf_datum, retry=False)
+        raise
+
+    if not job.repository.performance_alerts_enabled:
+        return []
+    return [signature_ids[signature_hash] for (signature_hash, _, alert) in datums
+            if alert and signature_ids[signature_hash] in created_signature_ids]
+
+
+def _store_signatures(job, framework, signatures):
+    """
+    Create or update the given signatures (an ordered dict of signature hash
+    to properties, with summary signatures before their subtests), returning
+    a dict of signature hash to id
+    """
+    cache_keys = {signature_hash: (job.repository.id, framework.id, signature_hash)
+                  for signature_hash in signatures}
+    uncached_hashes = [signature_hash for (signature_hash, cache_key) in cache_keys.items()
+                       if cache_key not in _signature_cache]
+    if uncached_hashes:
+        if len(_signature_cache) + len(uncached_hashes) > SIGNATURE_CACHE_SIZE:
+            _signature_cache.clear()
+        for signature in PerformanceSignature.objects.filter(
+                repository=job.repository, framework=framework,
+                signature_hash__in=uncached_hashes):
+            _signature_cache[cache_keys[signature.signature_hash]] = signature
+
+    signature_ids = {}
+    for (signature_hash, properties) in signatures.items():
+        parent_hash = properties['parent_signature']
+        properties = dict(properties, parent_signature=(
+            _signature_cache[cache_keys[parent_hash]] if parent_hash else None))
+
+        signature = _signature_cache.get(cache_keys[signature_hash])
+        if signature is None:
+            signature, _ = PerformanceSignature.objects.get_or_create(
                 repository=job.repository,
-                signature_hash=subtest_signature_hash,
+                signature_hash=signature_hash,
                 framework=framework,
-                defaults={
-                    'test': subtest_properties['test'],
-                    'suite': suite['name'],
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'extra_options': suite_extra_options,
-                    'lower_is_better': subtest.get('lowerIsBetter', True),
-                    'has_subtests': False,
-                    # these properties below can be either True, False, or
-                    # null (None). Null indicates no preference has been
-                    # set.
-                    'should_alert': subtest.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        subtest.get('alertChangeType')),
-                    'alert_threshold': subtest.get('alertThreshold'),
-                    'min_back_window': subtest.get('minBackWindow'),
-                    'max_back_window': subtest.get('maxBackWindow'),
-                    'fore_window': subtest.get('foreWindow'),
-                    'parent_signature': summary_signature,
-                    'last_updated': job.push.time
-                })
-            (_, datum_created) = PerformanceDatum.objects.get_or_create(
+                defaults=dict(properties, last_updated=job.push.time))
+            _signature_cache[cache_keys[signature_hash]] = signature
+
+        # only write properties which have changed
+        changed_properties = {}
+        for (name, value) in properties.items():
+            field = PerformanceSignature._meta.get_field(name)
+            if field.is_relation:
+                changed = getattr(signature, field.attname) != (value.id if value else None)
+            else:
+                changed = getattr(signature, name) != value
+            if changed:
+                changed_properties[name] = value
+        if changed_properties:
+            PerformanceSignature.objects.filter(id=signature.id).update(
+                **changed_properties)
+            invalidate_table_version(PerformanceSignature)
+            for (name, value) in changed_properties.items():
+                setattr(signature, name, value)
+
+        signature_ids[signature_hash] = signature.id
+
+    # update last_updated once for all the signatures. This is done even if
+    # none need it, since it also locks the signatures until the transaction
+    # storing their data ends, so that concurrent stores of retriggers read
+    # each other's datums for the push's rollups (see _store_datums)
+    PerformanceSignature.objects.filter(id__in=signature_ids.values()).update(
+        last_updated=Greatest('last_updated', Value(
+            job.push.time, output_field=models.DateTimeField())))
+    for signature_hash in signatures:
+        signature = _signature_cache[cache_keys[signature_hash]]
+        signature.last_updated = max(signature.last_updated, job.push.time)
+
+    return signature_ids
+
+
+def _store_datums(job, signature_ids, datums):
+    """
+    Create the datums (a list of signature hash, value and whether to alert)
+    which don't exist yet and update their push's rollups, returning the ids
+    of their signatures
+    """
+    # the push's datums of the signatures, to skip the ones already stored for
+    # this job and to include retriggers in the rollups. This is a locking
+    # read, so unlike a plain read from the transaction's snapshot it sees the
+    # datums committed by the store which held the signatures' locks before.
+    push_values = defaultdict(list)
+    existing_signature_ids = set()
+    for (job_id, signature_id, value) in PerformanceDatum.objects.filter(
+            repository=job.repository,
+            push=job.push,
+            signature_id__in=signature_ids.values()).select_for_update().values_list(
+                'job_id', 'signature_id', 'value'):
+        push_values[signature_id].append(value)
+        if job_id == job.id:
+            existing_signature_ids.add(signature_id)
+
+    new_datums = OrderedDict()
+    for (signature_hash, value, _) in datums:
+        signature_id = signature_ids[signature_hash]
+        if signature_id not in existing_signature_ids and signature_id not in new_datums:
+            new_datums[signature_id] = PerformanceDatum(
                 repository=job.repository,
                 job=job,
                 push=job.push,
-                signature=signature,
+                signature_id=signature_id,
                 push_timestamp=job.push.time,
-                defaults={'value': value[0]})
+                value=value)
 
-            # by default if there is no summary, we should schedule a
-            # generate alerts task for the subtest, since we have new data
-            # (this can be over-ridden by the optional "should alert"
-            # property)
-            if ((signature.should_alert or (signature.should_alert is None and
-                                            suite.get('value') is None)) and
-                datum_created and job.repository.performance_alerts_enabled):
-                generate_alerts.apply_async(args=[signature.id],
-                                            routing_key='generate_perf_alerts')
+    PerformanceDatum.objects.bulk_create(new_datums.values())
+    if new_datums:
+        update_push_rollups(
+            job.repository, job.push,
+            {signature_id: push_values.get(signature_id, []) + [datum.value]
+             for (signature_id, datum) in new_datums.items()},
+            set(push_values) & set(new_datums))
+
+    return set(new_datums.keys())
 
 
 def store_performance_artifact(job, artifact):
     blob = json.loads(artifact['blob'])
     performance_data = blob['performance_data']
 
-    if type(performance_data) == list:
-        for perfdatum in performance_data:
-            _load_perf_datum(job, perfdatum)
-    else:
-        _load_perf_datum(job, performance_data)
+    if type(performance_data) != list:
+        performance_data = [performance_data]
+
+    # schedule alert generation once for all the new data, rather than for
+    # each datum
+    alert_signature_ids = []
+    for perfdatum in performance_data:
+        alert_signature_ids.extend(_load_perf_datum(job, perfdatum))
+    if alert_signature_ids:
+        schedule_alert_generation(alert_signature_ids)
@@ -5,6 +5,7 @@ from django.db import transaction
 
 from treeherder.model.models import (Commit,
                                      Push)
+from treeherder.model.updates import publish_push_update
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,7 @@ def store_push(repository, push_dict):
         raise ValueError("Push must have a revision "
                          "associated with it!")
     with transaction.atomic():
-        push, _ = Push.objects.update_or_create(
+        push, created = Push.objects.update_or_create(
             repository=repository,
             revision=push_revision,
             defaults={
@@ -31,6 +32,8 @@ def store_push(repository, push_dict):
                     'author': revision['author'],
                     'comments': revision['comment']
                 })
+        if created:
+            publish_push_update(repository, push)
 
 
 def store_push_data(repository, pushes):
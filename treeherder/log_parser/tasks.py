@@ -1,7 +1,9 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import newrelic.agent
 from django.conf import settings
+from django.db import connection
 
 from treeherder.autoclassify.tasks import autoclassify
 from treeherder.log_parser.crossreference import crossreference_job
@@ -19,8 +21,6 @@ def if_not_parsed(f):
     """Decorator that ensures that log parsing task has not already run
     """
     def inner(job_log):
-        newrelic.agent.add_custom_parameter("job_log_%s_url" % job_log.name, job_log.url)
-
         logger.debug("parser_task for %s" % job_log.id)
         if job_log.status == JobLog.PARSED:
             logger.info("%s log already parsed" % job_log.id)
@@ -51,15 +51,25 @@ def parse_logs(job_id, job_log_ids, priority):
         "builds-4h": parse_unstructured_log
     }
 
+    parsers = [(job_log, parser_tasks[job_log.name]) for job_log in job_logs
+               if job_log.name in parser_tasks]
+
     completed_names = set()
     exceptions = []
-    for job_log in job_logs:
-        parser = parser_tasks.get(job_log.name)
-        if parser:
-            try:
-                parser(job_log)
-            except Exception as e:
-                exceptions.append(e)
+    if parsers:
+        # Each log is downloaded and parsed in its own thread, so that the
+        # network I/O for one log overlaps with the parsing of the others.
+        with ThreadPoolExecutor(max_workers=len(parsers)) as executor:
+            futures = []
+            for job_log, parser in parsers:
+                # New Relic parameters are per-thread, so must be added here.
+                newrelic.agent.add_custom_parameter("job_log_%s_url" % job_log.name, job_log.url)
+                futures.append((job_log, executor.submit(_run_parser, parser, job_log)))
+
+        for job_log, future in futures:
+            exception = future.exception()
+            if exception is not None:
+                exceptions.append(exception)
             else:
                 completed_names.add(job_log.name)
 
@@ -84,6 +94,16 @@ def parse_logs(job_id, job_log_ids, priority):
     job.save()
 
 
+def _run_parser(parser, job_log):
+    """Run a log parser from a worker thread of parse_logs."""
+    try:
+        return parser(job_log)
+    finally:
+        # Django only closes connections at the end of a request, so the
+        # connection opened by this thread must be closed explicitly.
+        connection.close()
+
+
 @if_not_parsed
 def parse_unstructured_log(job_log):
     """
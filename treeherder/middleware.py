@@ -1,6 +1,14 @@
+import bisect
+import itertools
 import re
+import threading
+import time
+from collections import defaultdict
 
 import newrelic.agent
+import six
+from django.core.cache import caches
+from django.db import connections
 from whitenoise.middleware import WhiteNoiseMiddleware
 
 
@@ -59,3 +67,258 @@ class NewRelicMiddleware(object):
         # slow transactions), so for use in Insights we have to add it as a customer parameter.
         if 'HTTP_USER_AGENT' in request.META:
             newrelic.agent.add_custom_parameter('user_agent', request.META['HTTP_USER_AGENT'])
+
+
+class Histogram(object):
+    """
+    Counts of the values observed in each of a fixed set of buckets, each
+    bucket counting the values up to its bound (and greater than the bound
+    of the bucket before)
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        return {
+            'buckets': [[bound, count] for (bound, count) in
+                        zip(self.bounds + ['+Inf'], self.counts)],
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+        }
+
+
+class RequestMetrics(object):
+    """
+    The metrics of the requests of a view and action: histograms of their
+    query counts, times (in milliseconds) and response sizes (in bytes),
+    and their total cache hits and misses
+    """
+    COUNT_BOUNDS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+    TIME_BOUNDS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+    SIZE_BOUNDS = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+    def __init__(self):
+        self.histograms = {
+            'db_queries': Histogram(self.COUNT_BOUNDS),
+            'db_time': Histogram(self.TIME_BOUNDS),
+            'serialize_time': Histogram(self.TIME_BOUNDS),
+            'total_time': Histogram(self.TIME_BOUNDS),
+            'response_bytes': Histogram(self.SIZE_BOUNDS),
+        }
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record(self, params):
+        for (name, histogram) in self.histograms.items():
+            histogram.observe(params[name])
+        self.cache_hits += params['cache_hits']
+        self.cache_misses += params['cache_misses']
+
+    def as_dict(self):
+        return dict({name: histogram.as_dict() for (name, histogram)
+                     in self.histograms.items()},
+                    cache_hits=self.cache_hits, cache_misses=self.cache_misses)
+
+
+_request_metrics = defaultdict(RequestMetrics)
+_request_metrics_lock = threading.Lock()
+# the cache hits and misses of the request being handled by each thread
+_cache_counts = threading.local()
+
+
+def get_request_metrics():
+    """
+    Returns the metrics of the requests this process has handled, by view
+    and action
+    """
+    with _request_metrics_lock:
+        return {view: metrics.as_dict() for (view, metrics) in _request_metrics.items()}
+
+
+def _count_cache_lookups(hits, misses):
+    counts = getattr(_cache_counts, 'counts', None)
+    if counts is not None:
+        counts[0] += hits
+        counts[1] += misses
+
+
+def _instrument_cache(backend):
+    """
+    Wraps the lookups of a cache backend (each of which is only used by a
+    single thread) to count the hits and misses of the current request
+    """
+    if getattr(backend, '_request_metrics_instrumented', False):
+        return
+    missing = object()
+    get = backend.get
+    get_many = backend.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, missing, version=version)
+        if value is missing:
+            _count_cache_lookups(0, 1)
+            return default
+        _count_cache_lookups(1, 0)
+        return value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        _count_cache_lookups(len(values), len(keys) - len(values))
+        return values
+
+    backend.get = counted_get
+    backend.get_many = counted_get_many
+    backend._request_metrics_instrumented = True
+
+
+class _CountedContent(six.Iterator):
+    """
+    The content of a streaming response, which counts its size as it is sent
+    and records the request's metrics when it has all been sent, generating
+    it fails, or the response is closed first (e.g. as the client has
+    disconnected), so that the request's queries are never left recording
+    """
+
+    def __init__(self, streaming_content, record):
+        self._content = iter(streaming_content)
+        self._record = record
+        self._size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._content)
+        except Exception:
+            # StopIteration, or an error generating the content
+            self.close()
+            raise
+        self._size += len(chunk)
+        return chunk
+
+    def close(self):
+        if self._record is None:
+            return
+        (record, self._record) = (self._record, None)
+        try:
+            if hasattr(self._content, 'close'):
+                self._content.close()
+        finally:
+            record(self._size)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Records the number of database queries and the time spent on them, the
+    time spent serializing (rendering) the response, the response size and
+    the cache hits and misses of each request, by view and action, both as
+    New Relic custom parameters and in the histograms of this process (see
+    ``get_request_metrics``)
+    """
+
+    def process_request(self, request):
+        request._metrics = {
+            'start': time.time(),
+            'view': None,
+            'render_start': None,
+            'render_end': None,
+            'connections': [(connection, connection.force_debug_cursor,
+                             len(connection.queries_log))
+                            for connection in connections.all()],
+        }
+        # record the queries made (and their times), as the test runner's
+        # CaptureQueriesContext does
+        for connection in connections.all():
+            connection.force_debug_cursor = True
+        _instrument_cache(caches['default'])
+        _cache_counts.counts = [0, 0]
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, '_metrics'):
+            return
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is not None:
+            # a django rest framework view(set), whose action (e.g. `list`)
+            # depends on the request method
+            actions = getattr(view_func, 'actions', None) or {}
+            request._metrics['view'] = '{}.{}'.format(
+                view_class.__name__,
+                actions.get(request.method.lower(), request.method.lower()))
+        else:
+            request._metrics['view'] = '{}.{}'.format(view_func.__module__,
+                                                      view_func.__name__)
+
+    def process_template_response(self, request, response):
+        # template (and django rest framework) responses are rendered right
+        # after this
+        if hasattr(request, '_metrics'):
+            request._metrics['render_start'] = time.time()
+
+            def render_end(response):
+                request._metrics['render_end'] = time.time()
+            response.add_post_render_callback(render_end)
+        return response
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_metrics'):
+            return response
+        if request._metrics['view'] is None:
+            # not a request for a view (e.g. a static file or a 404)
+            self._finish(request)
+            return response
+
+        if response.streaming:
+            # the response is generated as it is sent, so is only recorded
+            # once it has been (or the response is closed before then)
+            response.streaming_content = _CountedContent(
+                response.streaming_content,
+                lambda size: self._record(request, size))
+        else:
+            self._record(request, len(response.content))
+        return response
+
+    def _finish(self, request):
+        """
+        Stops recording the queries and cache lookups of a request, returning
+        its metrics, queries and cache hits and misses
+        """
+        metrics = request._metrics
+        del request._metrics
+        queries = []
+        for (connection, force_debug_cursor, num_queries) in metrics['connections']:
+            connection.force_debug_cursor = force_debug_cursor
+            queries.extend(itertools.islice(connection.queries_log, num_queries, None))
+        (cache_hits, cache_misses) = _cache_counts.counts
+        _cache_counts.counts = None
+        return (metrics, queries, cache_hits, cache_misses)
+
+    def _record(self, request, response_bytes):
+        (metrics, queries, cache_hits, cache_misses) = self._finish(request)
+        params = {
+            'db_queries': len(queries),
+            'db_time': sum(float(query['time']) for query in queries) * 1000,
+            'serialize_time': ((metrics['render_end'] - metrics['render_start']) * 1000
+                               if metrics['render_end'] else 0),
+            'total_time': (time.time() - metrics['start']) * 1000,
+            'response_bytes': response_bytes,
+            'cache_hits': cache_hits,
+            'cache_misses': cache_misses,
+        }
+        for (name, value) in params.items():
+            newrelic.agent.add_custom_parameter(name, value)
+        with _request_metrics_lock:
+            _request_metrics[metrics['view']].record(params)
@@ -34,13 +34,35 @@ def get_error_summary(job):
     if not errors:
         return []
 
-    term_cache = {}
-    error_summary = [bug_suggestions_line(err, term_cache) for err in errors]
+    error_summary = bug_suggestions_lines(errors)
     cache.set(cache_key, error_summary, BUG_SUGGESTION_CACHE_TIMEOUT)
 
     return error_summary
 
 
+def bug_suggestions_lines(errors):
+    """
+    Create the bug suggestions of several text log errors, searching for the
+    bugs of all their search terms at once (and then of the crash signatures
+    of those with no suggestions)
+    """
+    clean_lines = [get_mozharness_substring(err.line) for err in errors]
+    term_cache = Bugscache.search_many(
+        set(filter(None, map(get_error_search_term, clean_lines))))
+
+    crash_signatures = set()
+    for clean_line in clean_lines:
+        bugs = term_cache.get(get_error_search_term(clean_line))
+        if not bugs or not (bugs['open_recent'] or bugs['all_others']):
+            crash_signature = get_crash_signature(clean_line)
+            if crash_signature and crash_signature not in term_cache:
+                crash_signatures.add(crash_signature)
+    if crash_signatures:
+        term_cache.update(Bugscache.search_many(crash_signatures))
+
+    return [bug_suggestions_line(err, term_cache) for err in errors]
+
+
 def bug_suggestions_line(err, term_cache=None):
     if term_cache is None:
         term_cache = {}
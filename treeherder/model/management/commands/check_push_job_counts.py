@@ -0,0 +1,64 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from treeherder.model.models import (Push,
+                                     PushJobCount,
+                                     Repository)
+
+
+class Command(BaseCommand):
+    help = """
+    Check the stored job counts of pushes against their jobs, recalculating
+    those which are out of date
+
+    This is also how the counts of pushes stored before they were introduced
+    are filled in
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            action='append',
+            help='Project to check (specify multiple times to check multiple projects, default: all)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.DATA_CYCLE_DAYS,
+            help='Number of days of pushes to check (default: {})'.format(
+                settings.DATA_CYCLE_DAYS)
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Number of pushes to check at a time (default: 100)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report the pushes with out of date counts, don't fix them"
+        )
+
+    def handle(self, *args, **options):
+        repositories = Repository.objects.filter(active_status='active')
+        if options['project']:
+            repositories = repositories.filter(name__in=options['project'])
+        start = datetime.datetime.now() - datetime.timedelta(days=options['days'])
+
+        for repository in repositories:
+            push_ids = list(Push.objects.filter(
+                repository=repository, time__gte=start).order_by(
+                    'id').values_list('id', flat=True))
+            inconsistent_push_ids = set()
+            for i in range(0, len(push_ids), options['chunk_size']):
+                chunk = PushJobCount.objects.get_inconsistent_push_ids(
+                    push_ids[i:i + options['chunk_size']])
+                if chunk and not options['dry_run']:
+                    PushJobCount.objects.update_counts(chunk)
+                inconsistent_push_ids.update(chunk)
+            self.stdout.write("{} {} of {} pushes with out of date job counts for {}".format(
+                "Found" if options['dry_run'] else "Fixed",
+                len(inconsistent_push_ids), len(push_ids), repository.name))
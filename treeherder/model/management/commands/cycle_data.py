@@ -47,6 +47,15 @@ class Command(BaseCommand):
             type=int,
             help='How many seconds to pause between each query'
         )
+        parser.add_argument(
+            '--max-replication-lag',
+            action='store',
+            dest='max_replication_lag',
+            default=settings.DATA_CYCLE_MAX_REPLICATION_LAG,
+            type=int,
+            help=('How many seconds the replica database (if configured) can '
+                  'fall behind before pausing, used instead of the sleep time')
+        )
 
     def handle(self, *args, **options):
         self.is_debug = options['debug']
@@ -64,13 +73,15 @@ class Command(BaseCommand):
             self.debug("Deleted {} jobs from {}".format(rs_deleted,
                                                         repository.name))
 
-            # TODO: Fix the performance issues and re-enable:
-            # https://bugzilla.mozilla.org/show_bug.cgi?id=1346567#c10
-            if False and repository.expire_performance_data:
-                PerformanceDatum.objects.cycle_data(repository,
-                                                    cycle_interval,
-                                                    options['chunk_size'],
-                                                    options['sleep_time'])
+            if repository.expire_performance_data:
+                perf_datums_deleted = PerformanceDatum.objects.cycle_data(
+                    repository,
+                    cycle_interval,
+                    options['chunk_size'],
+                    options['sleep_time'],
+                    options['max_replication_lag'])
+                self.debug("Deleted {} performance datums from {}".format(
+                    perf_datums_deleted, repository.name))
 
         self.cycle_non_job_data(options['chunk_size'], options['sleep_time'])
 
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 08:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0019_remove_job_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildapiBuild',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('content_hash', models.CharField(max_length=40)),
+            ],
+            options={
+                'db_table': 'buildapi_build',
+            },
+        ),
+    ]
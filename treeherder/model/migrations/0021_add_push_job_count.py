@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 09:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0020_add_buildapi_build'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushJobCount',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('state', models.CharField(max_length=25)),
+                ('result', models.CharField(max_length=25)),
+                ('tier', models.PositiveIntegerField()),
+                ('total', models.PositiveIntegerField()),
+                ('unclassified', models.PositiveIntegerField()),
+                ('push', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='job_counts', to='model.Push')),
+            ],
+            options={
+                'db_table': 'push_job_count',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='pushjobcount',
+            unique_together=set([('push', 'state', 'result', 'tier')]),
+        ),
+    ]
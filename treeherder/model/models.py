@@ -4,17 +4,27 @@ import datetime
 import itertools
 import logging
 import time
+import uuid
 from collections import (OrderedDict,
                          defaultdict)
 from hashlib import sha1
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.validators import MinLengthValidator
-from django.db import (models,
+from django.db import (IntegrityError,
+                       models,
                        transaction)
-from django.db.models import (Count,
-                              Q)
+from django.db.models import (Case,
+                              Count,
+                              F,
+                              Q,
+                              Sum,
+                              Value,
+                              When)
+from django.db.models.signals import (post_delete,
+                                      post_save)
 from django.forms import model_to_dict
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
@@ -24,6 +34,46 @@ from .search import (TestFailureLine,
 
 logger = logging.getLogger(__name__)
 
+TABLE_VERSION_CACHE_KEY = 'table-version-{}'
+
+
+def get_table_version(model):
+    """
+    Returns the current version of a model's table, which changes whenever
+    its rows change (see ``invalidate_table_version``), or None if there is
+    no telling (e.g. without a shared cache)
+    """
+    cache_key = TABLE_VERSION_CACHE_KEY.format(model._meta.db_table)
+    version = cache.get(cache_key)
+    if version is None:
+        # the cache has been flushed, so there's no telling what version
+        # anything cached from the table was
+        cache.add(cache_key, uuid.uuid4().hex, None)
+        version = cache.get(cache_key)
+    return version
+
+
+def invalidate_table_version(model):
+    """
+    Changes the version of a model's table, once the current transaction (if
+    any) has been committed
+    """
+    cache_key = TABLE_VERSION_CACHE_KEY.format(model._meta.db_table)
+    transaction.on_commit(lambda: cache.set(cache_key, uuid.uuid4().hex, None))
+
+
+def _invalidate_table_version(sender, **kwargs):
+    invalidate_table_version(sender)
+
+
+def track_table_version(model):
+    """
+    Invalidates the version of a model's table whenever a row is saved or
+    deleted with the ORM (so not by ``QuerySet.update()``)
+    """
+    post_save.connect(_invalidate_table_version, sender=model)
+    post_delete.connect(_invalidate_table_version, sender=model)
+
 
 @python_2_unicode_compatible
 class NamedModel(models.Model):
@@ -96,6 +146,42 @@ class Repository(models.Model):
             self.name, self.repository_group)
 
 
+class PushManager(models.Manager):
+    """
+    Convenience functions for operations on groups of pushes
+    """
+
+    def get_pushed_revisions(self, repository, revisions):
+        """
+        Return the subset of ``revisions`` that have a push in ``repository``,
+        which may be either a Repository or a repository name.
+
+        Revisions may be abbreviated, in which case they match any push whose
+        revision starts with them. Only one query is made for all revisions.
+        """
+        revisions = set(revision for revision in revisions if revision)
+        if not revisions:
+            return set()
+
+        if isinstance(repository, Repository):
+            pushes = self.filter(repository=repository)
+        else:
+            pushes = self.filter(repository__name=repository)
+
+        full_revisions = [revision for revision in revisions if len(revision) == 40]
+        revision_filter = Q(revision__in=full_revisions)
+        for revision in revisions.difference(full_revisions):
+            # TODO: Stop using startswith for improved performance as part of bug 1306707.
+            revision_filter |= Q(revision__startswith=revision)
+
+        lengths = set(len(revision) for revision in revisions)
+        pushed_prefixes = set(pushed_revision[:length]
+                              for pushed_revision in pushes.filter(revision_filter).values_list(
+                                  'revision', flat=True)
+                              for length in lengths)
+        return revisions & pushed_prefixes
+
+
 @python_2_unicode_compatible
 class Push(models.Model):
     '''
@@ -112,6 +198,8 @@ class Push(models.Model):
     author = models.CharField(max_length=150)
     time = models.DateTimeField()
 
+    objects = PushManager()
+
     class Meta:
         db_table = 'push'
         unique_together = [('repository', 'revision'),
@@ -123,25 +211,11 @@ class Push(models.Model):
 
     def get_status(self):
         '''
-        Gets a summary of what passed/failed for the push
+        Gets a summary of what passed/failed for the push: the number of its
+        unclassified jobs (excluding tier 3) with each result, or in each
+        state if incomplete
         '''
-        jobs = Job.objects.filter(push=self).filter(
-            Q(failure_classification__isnull=True) |
-            Q(failure_classification__name='not classified')).exclude(tier=3)
-
-        status_dict = {}
-        for (state, result, total) in jobs.values_list(
-                'state', 'result').annotate(
-                    total=Count('result')):
-            if state == 'completed':
-                status_dict[result] = total
-            else:
-                status_dict[state] = total
-        if 'superseded' in status_dict:
-            # backward compatability for API consumers
-            status_dict['coalesced'] = status_dict['superseded']
-
-        return status_dict
+        return PushJobCount.objects.get_statuses([self.id])[self.id]
 
 
 @python_2_unicode_compatible
@@ -200,43 +274,56 @@ class Bugscache(models.Model):
 
     @classmethod
     def search(cls, search_term):
+        return cls.search_many([search_term])[search_term]
+
+    @classmethod
+    def search_many(cls, search_terms):
+        """
+        Searches for the bugs matching each of several search terms in a
+        single query, returning a dict of the results of each term
+        """
         max_size = 50
         # 90 days ago
         time_limit = datetime.datetime.now() - datetime.timedelta(days=90)
-        # Wrap search term so it is used as a phrase in the full-text search.
-        search_term_fulltext = '"%s"' % search_term.replace("\"", "")
-        # Substitute escape and wildcard characters, so the search term is used
-        # literally in the LIKE statement.
-        search_term_like = search_term.replace('=', '==').replace(
-            '%', '=%').replace('_', '=_')
-        recent = cls.objects.raw(
-            '''
-            SELECT id, summary, crash_signature, keywords, os, resolution, status,
-            MATCH (`summary`) AGAINST (%s IN BOOLEAN MODE) AS relevance
-            FROM bugscache
-            WHERE 1
-              AND resolution = ''
-              AND `summary` LIKE CONCAT ('%%%%', %s, '%%%%') ESCAPE '='
-              AND modified >= %s
-            ORDER BY relevance DESC
-            LIMIT 0,%s
-            ''', [search_term_fulltext, search_term_like, time_limit,
-                  max_size])
-
-        all_others = cls.objects.raw(
-            '''
-            SELECT id, summary, crash_signature, keywords, os, resolution, status,
-            MATCH (`summary`) AGAINST (%s IN BOOLEAN MODE) AS relevance
-            FROM bugscache
-            WHERE 1
-            AND `summary` LIKE CONCAT ('%%%%', %s, '%%%%') ESCAPE '='
-            AND (modified < %s OR resolution <> '')
-            ORDER BY relevance DESC
-            LIMIT 0,%s''', [search_term_fulltext, search_term_like, time_limit,
-                            max_size])
-
-        return {"open_recent": [model_to_dict(item, exclude=["modified"]) for item in recent],
-                "all_others": [model_to_dict(item, exclude=["modified"]) for item in all_others]}
+        search_terms = list(set(search_terms))
+        results = {search_term: {"open_recent": [], "all_others": []}
+                   for search_term in search_terms}
+        if not search_terms:
+            return results
+
+        selects = []
+        params = []
+        for (i, search_term) in enumerate(search_terms):
+            # Wrap search term so it is used as a phrase in the full-text search.
+            search_term_fulltext = '"%s"' % search_term.replace("\"", "")
+            # Substitute escape and wildcard characters, so the search term is used
+            # literally in the LIKE statement.
+            search_term_like = search_term.replace('=', '==').replace(
+                '%', '=%').replace('_', '=_')
+            for (recent, condition) in [
+                    (1, "resolution = '' AND modified >= %s"),
+                    (0, "(modified < %s OR resolution <> '')")]:
+                selects.append(
+                    '''
+                    (SELECT id, summary, crash_signature, keywords, os, resolution, status,
+                    MATCH (`summary`) AGAINST (%s IN BOOLEAN MODE) AS relevance,
+                    {term} AS term, {recent} AS recent
+                    FROM bugscache
+                    WHERE 1
+                      AND `summary` LIKE CONCAT ('%%%%', %s, '%%%%') ESCAPE '='
+                      AND {condition}
+                    ORDER BY relevance DESC
+                    LIMIT 0,%s)
+                    '''.format(term=i, recent=recent, condition=condition))
+                params.extend([search_term_fulltext, search_term_like, time_limit,
+                               max_size])
+
+        for item in cls.objects.raw(' UNION ALL '.join(selects) +
+                                    ' ORDER BY relevance DESC', params):
+            results[search_terms[item.term]][
+                "open_recent" if item.recent else "all_others"].append(
+                    model_to_dict(item, exclude=["modified"]))
+        return results
 
 
 class Machine(NamedModel):
@@ -265,22 +352,46 @@ class OptionCollectionManager(models.Manager):
     '''
     Convenience function to determine the option collection map
     '''
-    def get_option_collection_map(self, options_as_list=False):
+    # The option collection maps are cached by each process, and only rebuilt
+    # when the version of the option collection table differs from the one
+    # they were built from, which changes whenever an option collection is
+    # created.
+    _cached_maps = None
+
+    def _build_option_collection_maps(self):
         option_collection_map = {}
+        option_collection_list_map = {}
         for (hash, option_name) in OptionCollection.objects.values_list(
                 'option_collection_hash', 'option__name'):
-            if options_as_list:
-                if not option_collection_map.get(hash):
-                    option_collection_map[hash] = [option_name]
-                else:
-                    option_collection_map[hash].append(option_name)
+            option_collection_list_map.setdefault(hash, []).append(option_name)
+            if not option_collection_map.get(hash):
+                option_collection_map[hash] = option_name
             else:
-                if not option_collection_map.get(hash):
-                    option_collection_map[hash] = option_name
-                else:
-                    option_collection_map[hash] += (' ' + option_name)
+                option_collection_map[hash] += (' ' + option_name)
 
-        return option_collection_map
+        return (option_collection_map, option_collection_list_map)
+
+    def get_option_collection_map(self, options_as_list=False):
+        '''
+        Returns a dict of option collection hash to its option names, either
+        space separated or as a list, which is shared so mustn't be modified
+        '''
+        version = get_table_version(OptionCollection)
+        cached_maps = OptionCollectionManager._cached_maps
+        if version is None or not cached_maps or cached_maps[0] != version:
+            cached_maps = (version, self._build_option_collection_maps())
+            OptionCollectionManager._cached_maps = cached_maps
+
+        return cached_maps[1][1 if options_as_list else 0]
+
+    def invalidate_option_collection_map(self):
+        '''
+        Makes every process rebuild its option collection maps, once the
+        current transaction (if any) has been committed
+        '''
+        # this process may be able to see the new option collections already
+        OptionCollectionManager._cached_maps = None
+        invalidate_table_version(OptionCollection)
 
 
 @python_2_unicode_compatible
@@ -300,6 +411,12 @@ class OptionCollection(models.Model):
         sha_hash.update(''.join(options))
         return sha_hash.hexdigest()
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super(OptionCollection, self).save(*args, **kwargs)
+        if created:
+            OptionCollection.objects.invalidate_option_collection_map()
+
     class Meta:
         db_table = 'option_collection'
         unique_together = ('option_collection_hash', 'option')
@@ -414,7 +531,12 @@ into chunks of chunk_size size. Returns the number of result sets deleted"""
 
             # cycle jobs *after* related data has been deleted, to be sure
             # we don't have any orphan data
-            self.filter(guid__in=jobs_chunk).delete()
+            with transaction.atomic():
+                removed_jobs = list(self.select_for_update().filter(
+                    guid__in=jobs_chunk).values_list(
+                        *PushJobCount.COUNTED_JOB_FIELDS))
+                self.filter(guid__in=jobs_chunk).delete()
+                PushJobCount.objects.apply_job_changes(removed=removed_jobs)
 
             jobs_cycled += len(jobs_chunk)
 
@@ -512,6 +634,11 @@ class Job(models.Model):
 
     def save(self, *args, **kwargs):
         self.last_modified = datetime.datetime.now()
+        # saving only some fields (e.g. autoclassify_status) still modifies
+        # the job, as far as the job change feed and conditional requests of
+        # its details are concerned
+        if kwargs.get('update_fields'):
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'last_modified'}
         super(Job, self).save(*args, **kwargs)
 
     def is_fully_autoclassified(self):
@@ -625,6 +752,181 @@ class TaskclusterMetadata(models.Model):
         db_table = "taskcluster_metadata"
 
 
+class PushJobCountManager(models.Manager):
+    """
+    Convenience functions for operations on groups of push job counts
+    """
+
+    @staticmethod
+    def _calculate_counts(push_ids):
+        """
+        Counts the jobs of the given pushes, returning a dict of push id to
+        a dict of (state, result, tier) to (total, unclassified)
+        """
+        counts = defaultdict(dict)
+        for job_count in Job.objects.filter(push_id__in=push_ids).values(
+                'push_id', 'state', 'result', 'tier').annotate(
+                    total=Count('id'),
+                    unclassified=Sum(Case(
+                        When(Q(failure_classification__isnull=True) |
+                             Q(failure_classification__name='not classified'),
+                             then=Value(1)),
+                        default=Value(0),
+                        output_field=models.IntegerField()))):
+            counts[job_count['push_id']][
+                (job_count['state'], job_count['result'], job_count['tier'])] = (
+                    job_count['total'], job_count['unclassified'])
+        return counts
+
+    def _get_stored_counts(self, push_ids):
+        counts = defaultdict(dict)
+        # (counts are left at 0 once all their jobs have changed, e.g. from
+        # pending to running)
+        for (push_id, state, result, tier, total, unclassified) in self.filter(
+                push_id__in=push_ids).exclude(total=0).values_list(
+                    'push_id', 'state', 'result', 'tier', 'total', 'unclassified'):
+            counts[push_id][(state, result, tier)] = (total, unclassified)
+        return counts
+
+    def apply_job_changes(self, removed=(), added=()):
+        """
+        Updates the job counts of pushes for the jobs removed from and added
+        to them, each given as its (push id, state, result, tier, failure
+        classification id). A job whose state, result, tier or classification
+        has changed is removed as it was and added as it is now.
+
+        This should be done in the transaction changing the jobs, having
+        locked them first, so that concurrent changes of a job are counted
+        one after the other. The counts of pushes which predate them are left
+        to be filled in by the check_push_job_counts command.
+        """
+        if sorted(removed) == sorted(added):
+            # e.g. a job stored again in the same state
+            return
+        not_classified_id = FailureClassification.objects.values_list(
+            'id', flat=True).get(name='not classified')
+        deltas = defaultdict(lambda: [0, 0])
+        for (sign, jobs) in [(-1, removed), (1, added)]:
+            for (push_id, state, result, tier, failure_classification_id) in jobs:
+                delta = deltas[(push_id, state, result, tier)]
+                delta[0] += sign
+                if failure_classification_id in (None, not_classified_id):
+                    delta[1] += sign
+
+        # (in a consistent order, to avoid deadlocks)
+        for ((push_id, state, result, tier), (total, unclassified)) in sorted(deltas.items()):
+            if not (total or unclassified):
+                continue
+            counts = self.filter(push_id=push_id, state=state, result=result,
+                                 tier=tier)
+            if counts.update(total=F('total') + total,
+                             unclassified=F('unclassified') + unclassified):
+                continue
+            if total <= 0 or unclassified < 0:
+                # the push predates its counts being stored
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(push_id=push_id, state=state, result=result,
+                                tier=tier, total=total, unclassified=unclassified)
+            except IntegrityError:
+                # created by a concurrent change since
+                counts.update(total=F('total') + total,
+                              unclassified=F('unclassified') + unclassified)
+
+    def update_counts(self, push_ids):
+        """
+        Recalculates the job counts of the given pushes from their jobs, for
+        those which are out of date (see ``get_inconsistent_push_ids``)
+        """
+        push_ids = sorted(set(push_ids))
+        if not push_ids:
+            return
+        with transaction.atomic():
+            # lock the pushes (in a consistent order, to avoid deadlocks) so
+            # that concurrent updates of a push's counts happen one by one
+            list(Push.objects.select_for_update().filter(
+                id__in=push_ids).values_list('id', flat=True))
+            counts = self._calculate_counts(push_ids)
+            self.filter(push_id__in=push_ids).delete()
+            self.bulk_create([
+                PushJobCount(push_id=push_id, state=state, result=result,
+                             tier=tier, total=total, unclassified=unclassified)
+                for (push_id, push_counts) in counts.items()
+                for ((state, result, tier), (total, unclassified)) in push_counts.items()])
+
+    def get_inconsistent_push_ids(self, push_ids):
+        """
+        Returns the ids of those of the given pushes whose stored job counts
+        differ from their jobs
+        """
+        counts = self._calculate_counts(push_ids)
+        stored_counts = self._get_stored_counts(push_ids)
+        return set(push_id for push_id in push_ids
+                   if counts.get(push_id, {}) != stored_counts.get(push_id, {}))
+
+    def get_statuses(self, push_ids):
+        """
+        Gets a summary of what passed/failed for each of the given pushes
+        (see Push.get_status), returning a dict of push id to summary
+        """
+        statuses = {push_id: {} for push_id in push_ids}
+        counted_push_ids = set()
+        for (push_id, state, result, unclassified) in self.filter(
+                push_id__in=push_ids).exclude(tier=3).values_list(
+                    'push_id', 'state', 'result', 'unclassified'):
+            counted_push_ids.add(push_id)
+            if unclassified:
+                key = result if state == 'completed' else state
+                statuses[push_id][key] = statuses[push_id].get(key, 0) + unclassified
+
+        # count the jobs of pushes which haven't had their counts stored
+        # yet (e.g. as they predate them) on the fly
+        uncounted_push_ids = set(push_ids) - counted_push_ids
+        if uncounted_push_ids:
+            for (push_id, state, result, total) in Job.objects.filter(
+                    push_id__in=uncounted_push_ids).filter(
+                        Q(failure_classification__isnull=True) |
+                        Q(failure_classification__name='not classified')).exclude(
+                            tier=3).values_list(
+                                'push_id', 'state', 'result').annotate(
+                                    total=Count('result')):
+                key = result if state == 'completed' else state
+                statuses[push_id][key] = statuses[push_id].get(key, 0) + total
+
+        for status in statuses.values():
+            if 'superseded' in status:
+                # backward compatability for API consumers
+                status['coalesced'] = status['superseded']
+        return statuses
+
+
+class PushJobCount(models.Model):
+    """
+    The number of jobs of a push in each state, with each result and tier,
+    so that push statuses don't have to be counted from its jobs each time
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    push = models.ForeignKey(Push, on_delete=models.CASCADE, related_name='job_counts')
+    state = models.CharField(max_length=25)
+    result = models.CharField(max_length=25)
+    tier = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    # jobs which have yet to be classified
+    unclassified = models.PositiveIntegerField()
+
+    # the fields of a job by which it is counted, as given to apply_job_changes
+    COUNTED_JOB_FIELDS = ('push_id', 'state', 'result', 'tier',
+                          'failure_classification_id')
+
+    objects = PushJobCountManager()
+
+    class Meta:
+        db_table = 'push_job_count'
+        unique_together = ('push', 'state', 'result', 'tier')
+
+
 @python_2_unicode_compatible
 class JobDetail(models.Model):
     '''
@@ -811,7 +1113,14 @@ class JobNote(models.Model):
         else:
             self.job.failure_classification_id = FailureClassification.objects.values_list(
                 'id', flat=True).get(name='not classified')
-        self.job.save()
+        with transaction.atomic():
+            old_job = Job.objects.select_for_update().values_list(
+                *PushJobCount.COUNTED_JOB_FIELDS).get(id=self.job.id)
+            self.job.save()
+            PushJobCount.objects.apply_job_changes(
+                removed=[old_job],
+                added=[(self.job.push_id, self.job.state, self.job.result,
+                        self.job.tier, self.job.failure_classification_id)])
 
         # if a manually filed job, update the autoclassification information
         if not self.user:
@@ -985,12 +1294,21 @@ class FailureLine(models.Model):
         self.elastic_search_insert()
 
     def _serialized_components(self):
-        if self.action == "test_result":
-            return ["TEST-UNEXPECTED-%s" % self.status.upper(),
-                    self.test]
-        if self.action == "log":
-            return [self.level.upper(),
-                    self.message.split("\n")[0]]
+        return self.serialized_components(self.action, self.status, self.test,
+                                          self.level, self.message)
+
+    @staticmethod
+    def serialized_components(action, status, test, level, message):
+        """
+        Get the components of the serialized form of a failure line with the
+        given properties, which identify it in the unstructured log.
+        """
+        if action == "test_result":
+            return ["TEST-UNEXPECTED-%s" % status.upper(),
+                    test]
+        if action == "log":
+            return [level.upper(),
+                    message.split("\n")[0]]
 
     def unstructured_bugs(self):
         """
@@ -1002,9 +1320,17 @@ class FailureLine(models.Model):
 
         from treeherder.model.error_summary import get_filtered_error_lines
         job = Job.objects.get(guid=self.job_guid)
+        return self.matching_bugs(components, get_filtered_error_lines(job))
+
+    @staticmethod
+    def matching_bugs(components, error_lines):
+        """
+        Get the bugs suggested for those of a job's (filtered) bug suggestion
+        error lines which contain all the serialized components of a line.
+        """
         rv = []
         ids_seen = set()
-        for item in get_filtered_error_lines(job):
+        for item in error_lines:
             if all(component in item["search"] for component in components):
                 for suggestion in itertools.chain(item["bugs"]["open_recent"],
                                                   item["bugs"]["all_others"]):
@@ -1267,6 +1593,24 @@ class RunnableJob(models.Model):
                                     self.build_system_type)
 
 
+@python_2_unicode_compatible
+class BuildapiBuild(models.Model):
+    """
+    A completed build from buildapi's builds-4hr, along with a hash of its
+    content at the time it was last ingested.
+
+    This allows builds that haven't changed since the last run to be skipped.
+    """
+    id = models.PositiveIntegerField(primary_key=True)
+    content_hash = models.CharField(max_length=40)
+
+    class Meta:
+        db_table = 'buildapi_build'
+
+    def __str__(self):
+        return "{0} {1}".format(self.id, self.content_hash)
+
+
 class TextLogStep(models.Model):
     """
     An individual step in the textual (unstructured) log
@@ -1504,3 +1848,11 @@ class TextLogErrorMatch(models.Model):
     def __str__(self):
         return "{0} {1}".format(
             self.text_log_error.id, self.classified_failure.id)
+
+
+# reference data, whose table versions are used to validate the API's
+# responses listing it
+for model in [BuildPlatform, FailureClassification, JobGroup, JobType,
+              Machine, MachinePlatform, Option, Product, Repository,
+              RepositoryGroup]:
+    track_table_version(model)
@@ -0,0 +1,270 @@
+"""
+Publishes updates to jobs and pushes as they are stored, for the updates
+event stream of each repository (see treeherder.webapp.api.updates).
+
+The processes storing jobs and pushes publish updates to a message bus,
+from which each web process' hub fans them out to the subscriptions of its
+event stream clients. Without a bus (UPDATES_BUS_URL) nothing is published
+and the event stream is disabled.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import (defaultdict,
+                         deque)
+
+import six
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from treeherder.model.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryBus(object):
+    """
+    A message bus which only delivers messages within the process, for
+    development and tests
+    """
+
+    def __init__(self):
+        self.listeners = []
+
+    @property
+    def active(self):
+        return bool(self.listeners)
+
+    def publish(self, repository, event):
+        for listener in list(self.listeners):
+            listener(repository, event)
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+
+class RedisBus(object):
+    """
+    A message bus delivering messages between processes with Redis pub/sub
+    """
+    CHANNEL_PREFIX = 'treeherder-updates:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("The redis package is needed for a "
+                                       "redis:// UPDATES_BUS_URL")
+        self.redis = redis.StrictRedis.from_url(url)
+
+    @property
+    def active(self):
+        # there is no telling if other processes are listening
+        return True
+
+    def publish(self, repository, event):
+        self.redis.publish(self.CHANNEL_PREFIX + repository, json.dumps(event))
+
+    def listen(self, callback):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.CHANNEL_PREFIX + '*')
+
+        def run():
+            for message in pubsub.listen():
+                callback(message['channel'][len(self.CHANNEL_PREFIX):],
+                         json.loads(message['data']))
+
+        thread = threading.Thread(target=run, name='updates-bus-listener')
+        thread.daemon = True
+        thread.start()
+
+
+class Subscription(object):
+    """
+    A client's subscription to the updates of a repository, which buffers up
+    to UPDATES_CLIENT_BUFFER_SIZE updates until the client is sent them.
+
+    A client falling further behind than that (or reconnecting after missing
+    more updates than can be replayed) has missed updates, so is marked as
+    overflowed and needs to fetch the current state of things again.
+    """
+
+    def __init__(self, hub, repository):
+        self.hub = hub
+        self.repository = repository
+        self.queue = six.moves.queue.Queue(settings.UPDATES_CLIENT_BUFFER_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except six.moves.queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """
+        Returns the next update, or None if there is none within the timeout
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except six.moves.queue.Empty:
+            return None
+
+    def reset(self):
+        """
+        Discards the buffered updates, once the client has been told to fetch
+        the current state of things again
+        """
+        while True:
+            try:
+                self.queue.get_nowait()
+            except six.moves.queue.Empty:
+                break
+        self.overflowed = False
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class UpdatesHub(object):
+    """
+    Fans out the updates received from a message bus to the subscriptions of
+    the process' clients, keeping the last UPDATES_REPLAY_BUFFER_SIZE updates
+    of each repository to replay to clients reconnecting after a dropped
+    connection
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.lock = threading.Lock()
+        self.listening = False
+        self.subscriptions = defaultdict(set)
+        self.recent_events = defaultdict(
+            lambda: deque(maxlen=settings.UPDATES_REPLAY_BUFFER_SIZE))
+
+    def subscribe(self, repository, last_event_id=None):
+        """
+        Subscribes to the updates of a repository, starting after the update
+        with the given id if there is one
+        """
+        subscription = Subscription(self, repository)
+        with self.lock:
+            if not self.listening:
+                self.bus.listen(self.dispatch)
+                self.listening = True
+            if last_event_id:
+                recent_ids = [event['id'] for event in self.recent_events[repository]]
+                if last_event_id in recent_ids:
+                    for event in list(self.recent_events[repository])[
+                            recent_ids.index(last_event_id) + 1:]:
+                        subscription.put(event)
+                else:
+                    subscription.overflowed = True
+            self.subscriptions[repository].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions[subscription.repository].discard(subscription)
+
+    def dispatch(self, repository, event):
+        with self.lock:
+            self.recent_events[repository].append(event)
+            for subscription in self.subscriptions[repository]:
+                subscription.put(event)
+
+
+_lock = threading.Lock()
+_bus = None
+_hub = None
+
+
+def updates_enabled():
+    return bool(settings.UPDATES_BUS_URL)
+
+
+def get_bus():
+    global _bus
+    with _lock:
+        if _bus is None:
+            url = settings.UPDATES_BUS_URL
+            if not url:
+                raise ImproperlyConfigured("The updates stream is disabled "
+                                           "without an UPDATES_BUS_URL")
+            if url.startswith('memory://'):
+                if not settings.DEBUG:
+                    logger.error("UPDATES_BUS_URL is memory://, so the updates "
+                                 "stream won't get the updates published by "
+                                 "other processes, such as the Celery workers "
+                                 "storing jobs: use a redis:// URL instead")
+                _bus = InMemoryBus()
+            elif url.startswith(('redis://', 'rediss://')):
+                _bus = RedisBus(url)
+            else:
+                raise ImproperlyConfigured(
+                    "Unsupported UPDATES_BUS_URL: {}".format(url))
+        return _bus
+
+
+def get_hub():
+    global _hub
+    bus = get_bus()
+    with _lock:
+        if _hub is None:
+            _hub = UpdatesHub(bus)
+        return _hub
+
+
+def _publish(repository, events):
+    bus = get_bus()
+    for (event_type, data) in events:
+        try:
+            bus.publish(repository.name, {
+                'id': uuid.uuid4().hex,
+                'type': event_type,
+                'data': data
+            })
+        except Exception:
+            # updates are a nicety, so shouldn't stop data being stored
+            logger.exception("Error publishing %s update", event_type)
+            return
+
+
+def publish_job_updates(repository, job_guids):
+    """
+    Publishes the state and result of the given jobs, once the current
+    transaction (if any) has been committed
+    """
+    def publish():
+        if not get_bus().active:
+            return
+        _publish(repository, [
+            ('job', dict(zip(['id', 'job_guid', 'push_id', 'state', 'result'], values)))
+            for values in Job.objects.filter(
+                repository=repository, guid__in=job_guids).values_list(
+                    'id', 'guid', 'push_id', 'state', 'result')])
+
+    if job_guids and updates_enabled():
+        transaction.on_commit(publish)
+
+
+def publish_push_update(repository, push):
+    """
+    Publishes a new push, once the current transaction (if any) has been
+    committed
+    """
+    def publish():
+        if not get_bus().active:
+            return
+        _publish(repository, [('push', {
+            'id': push.id,
+            'revision': push.revision,
+            'author': push.author,
+            'push_timestamp': int(time.mktime(push.time.timetuple()))
+        })])
+
+    if updates_enabled():
+        transaction.on_commit(publish)
@@ -3,15 +3,21 @@ import time
 from collections import namedtuple
 
 from django.conf import settings
-from django.db import transaction
 
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
+                                    PerformanceAnalysisState,
                                     PerformanceDatum,
-                                    PerformanceSignature)
+                                    PerformanceSignature,
+                                    batched_status_updates)
 from treeherder.perfalert.perfalert import (RevisionDatum,
                                             detect_changes)
 
+# a change detected in a series which should be alerted on
+DetectedAlert = namedtuple('DetectedAlert',
+                           'prev_push_id push_id push_timestamp prev_value '
+                           'new_value t_value')
+
 
 def get_alert_properties(prev_value, new_value, lower_is_better):
     AlertProperties = namedtuple('AlertProperties',
@@ -31,32 +37,26 @@ def get_alert_properties(prev_value, new_value, lower_is_better):
     return AlertProperties(pct_change, delta, is_regression)
 
 
-def generate_new_alerts_in_series(signature):
-    # get series data starting from either:
-    # (1) the last alert, if there is one
-    # (2) the alerts max age
-    # (use whichever is newer)
-    max_alert_age = (datetime.datetime.now() -
-                     settings.PERFHERDER_ALERTS_MAX_AGE)
-    series = PerformanceDatum.objects.filter(signature=signature).filter(
-        push_timestamp__gte=max_alert_age).order_by('push_timestamp')
-    latest_alert_timestamp = PerformanceAlert.objects.filter(
-        series_signature=signature).select_related(
-            'summary__push__time').order_by(
-                '-summary__push__time').values_list(
-                    'summary__push__time', flat=True)[:1]
-    if latest_alert_timestamp:
-        series = series.filter(
-            push_timestamp__gt=latest_alert_timestamp[0])
-
+def _get_revision_data(series):
     revision_data = {}
-    for d in series:
-        if not revision_data.get(d.push_id):
-            revision_data[d.push_id] = RevisionDatum(
-                int(time.mktime(d.push_timestamp.timetuple())),
-                d.push_id, [])
-        revision_data[d.push_id].values.append(d.value)
+    push_timestamps = {}
+    for (push_id, push_timestamp, value) in series.values_list(
+            'push_id', 'push_timestamp', 'value').iterator():
+        if not revision_data.get(push_id):
+            revision_data[push_id] = RevisionDatum(
+                int(time.mktime(push_timestamp.timetuple())),
+                push_id, [])
+            push_timestamps[push_id] = push_timestamp
+        revision_data[push_id].values.append(value)
+
+    return (sorted(revision_data.values()), push_timestamps)
+
 
+def _get_alert_settings(signature):
+    """
+    Returns the analysis windows (minimum and maximum back window, and fore
+    window) and alert threshold of a signature
+    """
     min_back_window = signature.min_back_window
     if min_back_window is None:
         min_back_window = settings.PERFHERDER_ALERTS_MIN_BACK_WINDOW
@@ -69,54 +69,257 @@ def generate_new_alerts_in_series(signature):
     alert_threshold = signature.alert_threshold
     if alert_threshold is None:
         alert_threshold = settings.PERFHERDER_REGRESSION_THRESHOLD
+    return ((min_back_window, max_back_window, fore_window), alert_threshold)
+
+
+def _get_detected_alerts(signature, analyzed_series, alert_threshold):
+    for (prev, cur) in zip(analyzed_series, analyzed_series[1:]):
+        if cur.change_detected:
+            prev_value = cur.historical_stats['avg']
+            new_value = cur.forward_stats['avg']
+            alert_properties = get_alert_properties(
+                prev_value, new_value, signature.lower_is_better)
+
+            # ignore regressions below the configured regression
+            # threshold
+            if ((signature.alert_change_type is None or
+                 signature.alert_change_type == PerformanceSignature.ALERT_PCT) and
+                alert_properties.pct_change < alert_threshold) or \
+                (signature.alert_change_type == PerformanceSignature.ALERT_ABS and
+                 alert_properties.delta < alert_threshold):
+                continue
+
+            # django/mysql doesn't understand "inf", so just use some
+            # arbitrarily high value for that case
+            t_value = cur.t
+            if t_value == float('inf'):
+                t_value = 1000
+
+            yield DetectedAlert(prev.push_id, cur.push_id, cur.push_timestamp,
+                                prev_value, new_value, t_value)
+
+
+def store_alert(signature, alert):
+    """
+    Creates (or updates) the alert for a detected change in a series, and
+    its summary
+    """
+    alert_properties = get_alert_properties(
+        alert.prev_value, alert.new_value, signature.lower_is_better)
+    summary, _ = PerformanceAlertSummary.objects.get_or_create(
+        repository=signature.repository,
+        framework=signature.framework,
+        push_id=alert.push_id,
+        prev_push_id=alert.prev_push_id,
+        defaults={
+            'manually_created': False,
+            'last_updated': datetime.datetime.utcfromtimestamp(
+                alert.push_timestamp)
+        })
+
+    PerformanceAlert.objects.update_or_create(
+        summary=summary,
+        series_signature=signature,
+        defaults={
+            'is_regression': alert_properties.is_regression,
+            'amount_pct': alert_properties.pct_change,
+            'amount_abs': alert_properties.delta,
+            'prev_value': alert.prev_value,
+            'new_value': alert.new_value,
+            't_value': alert.t_value
+        })
+
+
+def _get_resumable_state(signature, series_start, windows, max_alert_age):
+    """
+    Returns the stored analysis state of the signature, and the revisions
+    needed to carry on from it, if it's still valid
+    """
+    try:
+        state = PerformanceAnalysisState.objects.get(signature=signature)
+    except PerformanceAnalysisState.DoesNotExist:
+        return (None, None, None)
+
+    # the state is no longer valid if there's been a new alert (as analysis
+    # restarts after that), the windows have changed, or there's been no new
+    # data for so long that all of it is too old to alert on
+    if (state.series_start != series_start or
+            (state.min_back_window, state.max_back_window,
+             state.fore_window) != windows or
+            state.settled_timestamp < max_alert_age):
+        return (None, None, None)
+
+    series = PerformanceDatum.objects.filter(
+        signature=signature,
+        push_timestamp__gte=state.context_start)
+    (revisions, push_timestamps) = _get_revision_data(series)
+
+    # ... or if data has been added or removed since
+    context = [r for r in revisions if
+               push_timestamps[r.push_id] <= state.settled_timestamp]
+    if not context or sum(len(r.values) for r in context) != state.context_values:
+        return (None, None, None)
+
+    context[-1].t = float('inf') if state.settled_t is None else state.settled_t
+    context[-1].last_seen_regression = state.last_seen_regression
+    return (state, revisions, push_timestamps)
+
+
+def _update_state(signature, series_start, windows, analyzed_series,
+                  push_timestamps, first_index):
+    """
+    Records how far through the series analysis is settled, so that only
+    new revisions (and those before them within the fore window) need
+    analyzing next time
+    """
+    (min_back_window, max_back_window, fore_window) = windows
 
-    analyzed_series = detect_changes(revision_data.values(),
+    # revisions have a final t-test score once they have their whole fore
+    # window, and their change detection result is final once the next
+    # revision's score is too (keeping revisions pushed at the same time
+    # together)
+    settled_index = None
+    for i in range(len(analyzed_series) - 1, first_index - 1, -1):
+        if analyzed_series[i].amount_next_data >= fore_window:
+            settled_index = i - 1
+            break
+    while (settled_index is not None and settled_index >= first_index - 1 and
+           analyzed_series[settled_index].push_timestamp ==
+           analyzed_series[settled_index + 1].push_timestamp):
+        settled_index -= 1
+    if settled_index is None or settled_index < max(first_index - 1, 0):
+        return
+
+    settled = analyzed_series[settled_index]
+    context = analyzed_series[max(settled_index - max_back_window + 1, 0):
+                              settled_index + 1]
+    PerformanceAnalysisState.objects.update_or_create(
+        signature=signature,
+        defaults={
+            'series_start': series_start,
+            'context_start': push_timestamps[context[0].push_id],
+            'settled_timestamp': push_timestamps[settled.push_id],
+            'context_values': sum(len(r.values) for r in context),
+            'settled_t': None if settled.t == float('inf') else settled.t,
+            'last_seen_regression': getattr(settled, 'last_seen_regression', 0),
+            'min_back_window': min_back_window,
+            'max_back_window': max_back_window,
+            'fore_window': fore_window
+        })
+
+
+def generate_new_alerts_in_series(signature):
+    # get series data starting from either:
+    # (1) the last alert, if there is one
+    # (2) the alerts max age
+    # (use whichever is newer)
+    max_alert_age = (datetime.datetime.now() -
+                     settings.PERFHERDER_ALERTS_MAX_AGE)
+    latest_alert_timestamp = PerformanceAlert.objects.filter(
+        series_signature=signature).select_related(
+            'summary__push__time').order_by(
+                '-summary__push__time').values_list(
+                    'summary__push__time', flat=True)[:1]
+    series_start = latest_alert_timestamp[0] if latest_alert_timestamp else None
+
+    (windows, alert_threshold) = _get_alert_settings(signature)
+    (min_back_window, max_back_window, fore_window) = windows
+
+    # carry on from where the last analysis got to if possible, so that
+    # only the revisions after those already settled are analyzed
+    (state, revisions, push_timestamps) = _get_resumable_state(
+        signature, series_start, windows, max_alert_age)
+    if state:
+        first_index = len([r for r in revisions if push_timestamps[r.push_id] <=
+                           state.settled_timestamp])
+        last_seen_regression = state.last_seen_regression
+    else:
+        series = PerformanceDatum.objects.filter(signature=signature).filter(
+            push_timestamp__gte=max_alert_age).order_by('push_timestamp')
+        if series_start:
+            series = series.filter(push_timestamp__gt=series_start)
+        (revisions, push_timestamps) = _get_revision_data(series)
+        first_index = 1
+        last_seen_regression = 0
+
+    analyzed_series = detect_changes(revisions,
+                                     min_back_window=min_back_window,
+                                     max_back_window=max_back_window,
+                                     fore_window=fore_window,
+                                     first_index=first_index,
+                                     last_seen_regression=last_seen_regression)
+
+    with batched_status_updates():
+        for alert in _get_detected_alerts(signature, analyzed_series,
+                                          alert_threshold):
+            store_alert(signature, alert)
+
+        _update_state(signature, series_start, windows, analyzed_series,
+                      push_timestamps, first_index)
+
+
+def reanalyze_series(signature, start):
+    """
+    Returns the alerts which analyzing all of a series' data since a time in
+    one go would generate, with the signature's current settings
+    """
+    (windows, alert_threshold) = _get_alert_settings(signature)
+    (min_back_window, max_back_window, fore_window) = windows
+    (revisions, _) = _get_revision_data(PerformanceDatum.objects.filter(
+        signature=signature,
+        push_timestamp__gte=start).order_by('push_timestamp'))
+    analyzed_series = detect_changes(revisions,
                                      min_back_window=min_back_window,
                                      max_back_window=max_back_window,
                                      fore_window=fore_window)
+    return list(_get_detected_alerts(signature, analyzed_series,
+                                     alert_threshold))
+
+
+def get_alert_changes(signature, start, detected_alerts):
+    """
+    Compares the alerts detected by reanalyzing a series since a time with
+    those it has already, returning the alerts to add and the existing ones
+    to remove (only generated alerts which haven't been triaged yet)
+    """
+    existing_alerts = {
+        (prev_push_id, push_id): (alert_id, status, manually_created)
+        for (alert_id, prev_push_id, push_id, status, manually_created) in
+        PerformanceAlert.objects.filter(
+            series_signature=signature,
+            summary__push__time__gte=start).values_list(
+                'id', 'summary__prev_push_id', 'summary__push_id', 'status',
+                'manually_created')}
+    detected_pushes = set((alert.prev_push_id, alert.push_id)
+                          for alert in detected_alerts)
+
+    added_alerts = [alert for alert in detected_alerts if
+                    (alert.prev_push_id, alert.push_id) not in existing_alerts]
+    removed_alert_ids = [
+        alert_id for (pushes, (alert_id, status, manually_created)) in
+        existing_alerts.items() if pushes not in detected_pushes and
+        status == PerformanceAlert.UNTRIAGED and not manually_created]
+    return (added_alerts, removed_alert_ids)
+
+
+def apply_alert_changes(signature, added_alerts, removed_alert_ids):
+    """
+    Adds and removes alerts of a series, deleting any generated summaries
+    left without alerts
+    """
+    with batched_status_updates():
+        for alert in added_alerts:
+            store_alert(signature, alert)
+
+        if removed_alert_ids:
+            removed_alerts = PerformanceAlert.objects.filter(id__in=removed_alert_ids)
+            summary_ids = set(removed_alerts.values_list('summary_id', flat=True))
+            removed_alerts.delete()
+            PerformanceAlertSummary.objects.filter(
+                id__in=summary_ids, manually_created=False,
+                alerts__isnull=True, related_alerts__isnull=True).delete()
+            for summary in PerformanceAlertSummary.objects.filter(id__in=summary_ids):
+                summary.update_status()
 
-    with transaction.atomic():
-        for (prev, cur) in zip(analyzed_series, analyzed_series[1:]):
-            if cur.change_detected:
-                prev_value = cur.historical_stats['avg']
-                new_value = cur.forward_stats['avg']
-                alert_properties = get_alert_properties(
-                    prev_value, new_value, signature.lower_is_better)
-
-                # ignore regressions below the configured regression
-                # threshold
-                if ((signature.alert_change_type is None or
-                     signature.alert_change_type == PerformanceSignature.ALERT_PCT) and
-                    alert_properties.pct_change < alert_threshold) or \
-                    (signature.alert_change_type == PerformanceSignature.ALERT_ABS and
-                     alert_properties.delta < alert_threshold):
-                    continue
-
-                summary, _ = PerformanceAlertSummary.objects.get_or_create(
-                    repository=signature.repository,
-                    framework=signature.framework,
-                    push_id=cur.push_id,
-                    prev_push_id=prev.push_id,
-                    defaults={
-                        'manually_created': False,
-                        'last_updated': datetime.datetime.utcfromtimestamp(
-                            cur.push_timestamp)
-                    })
-
-                # django/mysql doesn't understand "inf", so just use some
-                # arbitrarily high value for that case
-                t_value = cur.t
-                if t_value == float('inf'):
-                    t_value = 1000
-
-                PerformanceAlert.objects.update_or_create(
-                    summary=summary,
-                    series_signature=signature,
-                    defaults={
-                        'is_regression': alert_properties.is_regression,
-                        'amount_pct': alert_properties.pct_change,
-                        'amount_abs': alert_properties.delta,
-                        'prev_value': prev_value,
-                        'new_value': new_value,
-                        't_value': t_value
-                    })
+        # the series needs analyzing from scratch when new data arrives
+        PerformanceAnalysisState.objects.filter(signature=signature).delete()
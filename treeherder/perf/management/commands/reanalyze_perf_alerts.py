@@ -0,0 +1,163 @@
+import datetime
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import (BaseCommand,
+                                         CommandError)
+from django.db import connections
+from django.db.models import Q
+
+from treeherder.model.models import Push
+from treeherder.perf.alerts import (apply_alert_changes,
+                                    get_alert_changes,
+                                    reanalyze_series)
+from treeherder.perf.models import (PerformanceAlertSummary,
+                                    PerformanceSignature,
+                                    batched_status_updates)
+
+
+def _reanalyze(args):
+    (signature_id, start) = args
+    signature = PerformanceSignature.objects.get(id=signature_id)
+    return (signature_id, reanalyze_series(signature, start))
+
+
+class Command(BaseCommand):
+    help = """
+    Reanalyze performance series from scratch with their current alert
+    settings (e.g. after changing a framework's thresholds or windows),
+    adding the alerts now detected and removing the untriaged ones which no
+    longer are
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            action='append',
+            help='Project to reanalyze (specify multiple times to reanalyze multiple projects)'
+        )
+        parser.add_argument(
+            '--framework',
+            action='append',
+            help='Only reanalyze series of this framework (specify multiple times for multiple frameworks)'
+        )
+        parser.add_argument(
+            '--signature',
+            action='append',
+            help='Signature hashes to reanalyze, defaults to all which are alerted on'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PERFHERDER_ALERTS_MAX_AGE.days,
+            help='Number of days of data to reanalyze (default: {})'.format(
+                settings.PERFHERDER_ALERTS_MAX_AGE.days)
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of processes to analyze series with (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of series to write the alert changes of at a time (default: 100)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only show the alert changes, don't make them"
+        )
+
+    def handle(self, *args, **options):
+        if not options['project']:
+            raise CommandError("Must specify at least one project with "
+                               "--project")
+
+        signatures = PerformanceSignature.objects.filter(
+            repository__name__in=options['project'])
+        if options['framework']:
+            signatures = signatures.filter(framework__name__in=options['framework'])
+        if options['signature']:
+            signatures = signatures.filter(signature_hash__in=options['signature'])
+        else:
+            # the same series alerts are generated for on ingestion
+            signatures = signatures.filter(
+                Q(should_alert=True) |
+                Q(should_alert__isnull=True, parent_signature__isnull=True))
+        signatures = signatures.select_related('repository', 'framework', 'platform')
+        signatures = {signature.id: signature for signature in signatures}
+
+        start = datetime.datetime.now() - datetime.timedelta(days=options['days'])
+        work = [(signature_id, start) for signature_id in sorted(signatures)]
+        if options['processes'] > 1:
+            # each process needs its own database connection
+            connections.close_all()
+            pool = multiprocessing.Pool(options['processes'])
+            results = pool.imap_unordered(_reanalyze, work, chunksize=10)
+        else:
+            pool = None
+            results = (_reanalyze(args) for args in work)
+
+        self.totals = {'series': 0, 'added': 0, 'removed': 0}
+        self.start_time = time.time()
+        batch = []
+        try:
+            for (signature_id, detected_alerts) in results:
+                batch.append((signatures[signature_id], detected_alerts))
+                if len(batch) >= options['batch_size']:
+                    self._process_batch(batch, start, options['dry_run'], len(work))
+                    batch = []
+            self._process_batch(batch, start, options['dry_run'], len(work))
+        finally:
+            if pool:
+                pool.terminate()
+
+        self.stdout.write("{} {} alerts and {} {} alerts in {} series".format(
+            "Would add" if options['dry_run'] else "Added", self.totals['added'],
+            "would remove" if options['dry_run'] else "removed", self.totals['removed'],
+            self.totals['series']))
+
+    def _process_batch(self, batch, start, dry_run, num_series):
+        changes = [(signature,) + get_alert_changes(signature, start, detected_alerts)
+                   for (signature, detected_alerts) in batch]
+        self._write_diff(changes)
+        if not dry_run:
+            with batched_status_updates():
+                for (signature, added_alerts, removed_alert_ids) in changes:
+                    apply_alert_changes(signature, added_alerts, removed_alert_ids)
+
+        self.totals['series'] += len(batch)
+        self.totals['added'] += sum(len(added) for (_, added, _) in changes)
+        self.totals['removed'] += sum(len(removed) for (_, _, removed) in changes)
+        elapsed = time.time() - self.start_time
+        self.stderr.write("Reanalyzed {}/{} series ({:.1f} series/s)".format(
+            self.totals['series'], num_series,
+            self.totals['series'] / elapsed if elapsed else 0))
+
+    def _write_diff(self, changes):
+        removed_alert_ids = [alert_id for (_, _, removed) in changes
+                             for alert_id in removed]
+        removed_summaries = dict(PerformanceAlertSummary.objects.filter(
+            alerts__id__in=removed_alert_ids).values_list(
+                'alerts__id', 'push__revision'))
+        revisions = dict(Push.objects.filter(
+            id__in=[alert.push_id for (_, added, _) in changes
+                    for alert in added]).values_list('id', 'revision'))
+
+        for (signature, added_alerts, removed_alert_ids) in changes:
+            description = "{} {} {} {} {}".format(
+                signature.repository.name, signature.framework.name,
+                signature.platform.platform, signature.suite,
+                signature.test or 'summary')
+            for alert in added_alerts:
+                self.stdout.write("+ {} {} {} {:.2f} -> {:.2f}".format(
+                    description, signature.signature_hash,
+                    revisions[alert.push_id], alert.prev_value, alert.new_value))
+            for alert_id in removed_alert_ids:
+                self.stdout.write("- {} {} {} (alert {})".format(
+                    description, signature.signature_hash,
+                    removed_summaries[alert_id], alert_id))
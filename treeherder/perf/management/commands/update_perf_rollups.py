@@ -0,0 +1,53 @@
+import datetime
+
+from django.core.management.base import (BaseCommand,
+                                         CommandError)
+
+from treeherder.model import models
+from treeherder.perf.models import PerformanceSignature
+from treeherder.perf.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = """
+    Recalculate the per-push and daily performance datum rollups of a set of
+    projects
+
+    This is mostly useful to backfill rollups for data ingested before they
+    were introduced
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            action='append',
+            help='Project to rebuild rollups for (specify multiple times to rebuild multiple projects)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Number of days of data to rebuild rollups for (default: 365)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Number of signatures to rebuild rollups for at a time (default: 100)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['project']:
+            raise CommandError("Must specify at least one project with "
+                               "--project")
+        start_day = datetime.date.today() - datetime.timedelta(days=options['days'])
+        for project in options['project']:
+            repository = models.Repository.objects.get(name=project)
+
+            signature_ids = list(PerformanceSignature.objects.filter(
+                repository=repository).order_by('id').values_list('id', flat=True))
+            for i in range(0, len(signature_ids), options['chunk_size']):
+                rebuild_rollups(repository, signature_ids[i:i + options['chunk_size']],
+                                start_day)
+            self.stdout.write("Rebuilt rollups of {} signatures for {}".format(
+                len(signature_ids), project))
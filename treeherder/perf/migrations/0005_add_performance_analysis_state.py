@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 08:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('perf', '0004_add_per_push_performance_datum_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceAnalysisState',
+            fields=[
+                ('signature', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='perf.PerformanceSignature')),
+                ('series_start', models.DateTimeField(null=True)),
+                ('context_start', models.DateTimeField()),
+                ('settled_timestamp', models.DateTimeField()),
+                ('context_values', models.PositiveIntegerField()),
+                ('settled_t', models.FloatField(null=True)),
+                ('last_seen_regression', models.PositiveIntegerField()),
+                ('min_back_window', models.IntegerField()),
+                ('max_back_window', models.IntegerField()),
+                ('fore_window', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'performance_analysis_state',
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 09:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0020_add_buildapi_build'),
+        ('perf', '0005_add_performance_analysis_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceDatumDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('mean', models.FloatField()),
+                ('median', models.FloatField()),
+                ('last_updated', models.DateTimeField(auto_now=True, db_index=True)),
+                ('day', models.DateField()),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='model.Repository')),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='perf.PerformanceSignature')),
+            ],
+            options={
+                'db_table': 'performance_datum_daily_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='PerformanceDatumPushRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('mean', models.FloatField()),
+                ('median', models.FloatField()),
+                ('last_updated', models.DateTimeField(auto_now=True, db_index=True)),
+                ('push_timestamp', models.DateTimeField()),
+                ('push', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='model.Push')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='model.Repository')),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='perf.PerformanceSignature')),
+            ],
+            options={
+                'db_table': 'performance_datum_push_rollup',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='performancedatumpushrollup',
+            unique_together=set([('repository', 'signature', 'push')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='performancedatumpushrollup',
+            index_together=set([('repository', 'signature', 'push_timestamp')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='performancedatumdailyrollup',
+            unique_together=set([('repository', 'signature', 'day')]),
+        ),
+    ]
@@ -1,20 +1,61 @@
 import datetime
+import threading
 import time
+from collections import defaultdict
+from contextlib import contextmanager
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import (connections,
+                       models,
+                       transaction)
+from django.db.models import (Count,
+                              Q)
 from django.utils.encoding import python_2_unicode_compatible
 
 from treeherder.model.models import (Job,
                                      MachinePlatform,
                                      OptionCollection,
                                      Push,
-                                     Repository)
+                                     Repository,
+                                     track_table_version)
 
 SIGNATURE_HASH_LENGTH = 40
 
+# how long an interrupted cycle_data run is resumed from where it got to,
+# rather than starting over
+CYCLE_DATA_PROGRESS_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _replication_lag():
+    with connections['replica'].cursor() as cursor:
+        cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description],
+                        row))['Seconds_Behind_Master']
+
+
+def _throttle(sleep_time, max_replication_lag):
+    """
+    Pause between batches of deletes: until the replica (if there's one) is
+    no more than max_replication_lag seconds behind, otherwise for sleep_time
+    seconds
+    """
+    if max_replication_lag is not None and 'replica' in settings.DATABASES:
+        lag = _replication_lag()
+        while lag is not None and lag > max_replication_lag:
+            time.sleep(1)
+            lag = _replication_lag()
+        if lag is not None:
+            return
+    if sleep_time:
+        time.sleep(sleep_time)
+
 
 @python_2_unicode_compatible
 class PerformanceFramework(models.Model):
@@ -29,6 +70,9 @@ class PerformanceFramework(models.Model):
         return self.name
 
 
+track_table_version(PerformanceFramework)
+
+
 @python_2_unicode_compatible
 class PerformanceSignature(models.Model):
 
@@ -106,31 +150,57 @@ class PerformanceDatumManager(models.Manager):
     Convenience functions for operations on groups of performance datums
     """
 
-    def cycle_data(self, repository, cycle_interval, chunk_size, sleep_time):
-        """Delete data older than cycle_interval, splitting the target data
-into chunks of chunk_size size."""
+    def cycle_data(self, repository, cycle_interval, chunk_size, sleep_time,
+                   max_replication_lag=None):
+        """Delete data older than cycle_interval one signature at a time, in
+chunks of up to chunk_size consecutive ids, along with its rollups, then delete
+the signatures left without any data. Returns the number of datums deleted.
+
+The last signature finished is recorded, so that an interrupted run carries on
+after it the next time."""
 
         max_timestamp = datetime.datetime.now() - cycle_interval
+        progress_key = 'perf-cycle-data-progress:{}'.format(repository.id)
 
-        # seperate datums into chunks
-        while True:
-            perf_datums_to_cycle = list(self.filter(
+        datums_cycled = 0
+        for signature_id in PerformanceSignature.objects.filter(
                 repository=repository,
-                push_timestamp__lt=max_timestamp).values_list('id', flat=True)[:chunk_size])
-            if not perf_datums_to_cycle:
-                # we're done!
-                break
-            self.filter(id__in=perf_datums_to_cycle).delete()
-            if sleep_time:
-                # Allow some time for other queries to get through
-                time.sleep(sleep_time)
+                id__gt=cache.get(progress_key, 0)).order_by('id').values_list(
+                    'id', flat=True):
+            # served by the (repository, signature, push_timestamp) index
+            expired_datums = self.filter(repository=repository,
+                                         signature_id=signature_id,
+                                         push_timestamp__lt=max_timestamp)
+            while True:
+                ids = list(expired_datums.order_by('id').values_list(
+                    'id', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                # the range holds exactly the datums selected, but deleting it
+                # is cheaper than matching a list of ids
+                expired_datums.filter(id__gte=ids[0], id__lte=ids[-1]).delete()
+                datums_cycled += len(ids)
+                _throttle(sleep_time, max_replication_lag)
+            # the rollups of the expired pushes and days go with their datums
+            # (there are few enough to delete at once)
+            PerformanceDatumPushRollup.objects.filter(
+                repository=repository, signature_id=signature_id,
+                push_timestamp__lt=max_timestamp).delete()
+            PerformanceDatumDailyRollup.objects.filter(
+                repository=repository, signature_id=signature_id,
+                day__lt=max_timestamp.date()).delete()
+            cache.set(progress_key, signature_id, CYCLE_DATA_PROGRESS_TIMEOUT)
 
         # also remove any signatures which are (no longer) associated with
-        # a job
-        for signature in PerformanceSignature.objects.filter(
-                repository=repository):
-            if not self.filter(signature=signature).exists():
-                signature.delete()
+        # any data, but still with their subtests in the meantime
+        PerformanceSignature.objects.filter(
+            repository=repository,
+            last_updated__lt=max_timestamp,
+            performancedatum__isnull=True,
+            subtests__isnull=True).delete()
+        cache.delete(progress_key)
+
+        return datums_cycled
 
 
 @python_2_unicode_compatible
@@ -173,6 +243,148 @@ class PerformanceDatum(models.Model):
         return "{} {}".format(self.value, self.push_timestamp)
 
 
+@python_2_unicode_compatible
+class PerformanceAnalysisState(models.Model):
+    '''
+    Where alert generation got to in analyzing a performance series
+
+    Revisions up to `settled_timestamp` have been analyzed with their complete
+    fore window, so don't need analyzing again when new data arrives. Only
+    the revisions from `context_start` onwards are needed to carry on from
+    there.
+    '''
+    signature = models.OneToOneField(PerformanceSignature,
+                                     on_delete=models.CASCADE,
+                                     primary_key=True)
+
+    # the push time of the last alert when the analysis started (the series
+    # is analyzed from after that)
+    series_start = models.DateTimeField(null=True)
+    context_start = models.DateTimeField()
+    settled_timestamp = models.DateTimeField()
+
+    # the number of datums between context_start and settled_timestamp,
+    # used to detect data that has since been added or removed
+    context_values = models.PositiveIntegerField()
+
+    # the t-test score of the last settled revision (null when infinite,
+    # which mysql doesn't support) and the number of revisions since a
+    # likely regression, as used by detect_changes
+    settled_t = models.FloatField(null=True)
+    last_seen_regression = models.PositiveIntegerField()
+
+    # the windows used, since the state isn't valid for any others
+    min_back_window = models.IntegerField()
+    max_back_window = models.IntegerField()
+    fore_window = models.IntegerField()
+
+    class Meta:
+        db_table = 'performance_analysis_state'
+
+    def __str__(self):
+        return "{} {}".format(self.signature_id, self.settled_timestamp)
+
+
+class PerformanceDatumRollup(models.Model):
+    '''
+    Summary statistics of a series' performance datums over some period,
+    used to serve long ranges of data without every datum
+    '''
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
+    signature = models.ForeignKey(PerformanceSignature, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField()
+    min = models.FloatField()
+    max = models.FloatField()
+    mean = models.FloatField()
+    median = models.FloatField()
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def summarize(values):
+        '''
+        Returns the summary statistics of a list of values, as rollup
+        properties
+        '''
+        values = sorted(values)
+        middle = len(values) // 2
+        if len(values) % 2:
+            median = values[middle]
+        else:
+            median = (values[middle - 1] + values[middle]) / 2.0
+        return {
+            'count': len(values),
+            'min': values[0],
+            'max': values[-1],
+            'mean': sum(values) / float(len(values)),
+            'median': median
+        }
+
+
+@python_2_unicode_compatible
+class PerformanceDatumPushRollup(PerformanceDatumRollup):
+    '''
+    The datums of a series for a single push (more than one if the job was
+    retriggered)
+    '''
+    push = models.ForeignKey(Push, on_delete=models.CASCADE)
+    push_timestamp = models.DateTimeField()
+
+    class Meta:
+        db_table = 'performance_datum_push_rollup'
+        unique_together = ('repository', 'signature', 'push')
+        index_together = [('repository', 'signature', 'push_timestamp')]
+
+    def __str__(self):
+        return "{} {} {}".format(self.signature_id, self.push_id, self.mean)
+
+
+@python_2_unicode_compatible
+class PerformanceDatumDailyRollup(PerformanceDatumRollup):
+    '''
+    The datums of a series for pushes on a single day
+    '''
+    day = models.DateField()
+
+    class Meta:
+        db_table = 'performance_datum_daily_rollup'
+        unique_together = ('repository', 'signature', 'day')
+
+    def __str__(self):
+        return "{} {} {}".format(self.signature_id, self.day, self.mean)
+
+
+# summaries whose status needs updating at the end of a batch of alert changes
+_status_updates = threading.local()
+
+
+@contextmanager
+def batched_status_updates():
+    """
+    Update the statuses of the alert summaries affected by alert changes
+    within the block once each at its end, rather than on every alert save
+
+    The block runs in a transaction, and summary objects held by the alerts
+    changed aren't updated.
+    """
+    if getattr(_status_updates, 'summary_ids', None) is not None:
+        # already batching
+        yield
+        return
+
+    _status_updates.summary_ids = set()
+    try:
+        with transaction.atomic():
+            yield
+            for summary in PerformanceAlertSummary.objects.filter(
+                    id__in=_status_updates.summary_ids):
+                summary.update_status()
+    finally:
+        _status_updates.summary_ids = None
+
+
 @python_2_unicode_compatible
 class PerformanceAlertSummary(models.Model):
     '''
@@ -224,31 +436,35 @@ class PerformanceAlertSummary(models.Model):
             self.save()
 
     def autodetermine_status(self):
-        alerts = (PerformanceAlert.objects.filter(summary=self) |
-                  PerformanceAlert.objects.filter(related_summary=self))
+        # count this summary's alerts (and those reassigned or marked
+        # downstream to it) by status, and the acknowledged regressions
+        counts = defaultdict(int)
+        for (status, is_regression, count) in PerformanceAlert.objects.filter(
+                Q(summary=self) | Q(related_summary=self)).values_list(
+                    'status', 'is_regression').annotate(Count('id')):
+            counts[status] += count
+            if status == PerformanceAlert.ACKNOWLEDGED and is_regression:
+                counts['acknowledged_regressions'] += count
+        num_alerts = sum(count for (status, count) in counts.items()
+                         if status != 'acknowledged_regressions')
 
         # if no alerts yet, we'll say untriaged
-        if len(alerts) == 0:
+        if num_alerts == 0:
             return PerformanceAlertSummary.UNTRIAGED
 
         # if any untriaged, then set to untriaged
-        if len([a for a in alerts if a.status == PerformanceAlert.UNTRIAGED]):
+        if counts[PerformanceAlert.UNTRIAGED]:
             return PerformanceAlertSummary.UNTRIAGED
 
         # if all invalid, then set to invalid
-        if all([alert.status == PerformanceAlert.INVALID for alert in
-                alerts]):
+        if counts[PerformanceAlert.INVALID] == num_alerts:
             return PerformanceAlertSummary.INVALID
 
-        # otherwise filter out invalid alerts
-        alerts = [a for a in alerts if a.status != PerformanceAlert.INVALID]
-
         # if there are any "acknowledged" alerts, then set to investigating
         # if not one of the resolved statuses and there are regressions,
         # otherwise we'll say it's an improvement
-        if len([a for a in alerts if a.status == PerformanceAlert.ACKNOWLEDGED]):
-            if all([not alert.is_regression for alert in
-                    alerts if alert.status == PerformanceAlert.ACKNOWLEDGED]):
+        if counts[PerformanceAlert.ACKNOWLEDGED]:
+            if not counts['acknowledged_regressions']:
                 return PerformanceAlertSummary.IMPROVEMENT
             elif self.status not in (PerformanceAlertSummary.IMPROVEMENT,
                                      PerformanceAlertSummary.INVESTIGATING,
@@ -263,7 +479,7 @@ class PerformanceAlertSummary(models.Model):
         # alerts of its own: all alerts should be either reassigned,
         # downstream, or invalid (but not all invalid, that case is covered
         # above)
-        if len([a for a in alerts if a.status == PerformanceAlert.REASSIGNED]):
+        if counts[PerformanceAlert.REASSIGNED]:
             return PerformanceAlertSummary.REASSIGNED
 
         return PerformanceAlertSummary.DOWNSTREAM
@@ -354,9 +570,15 @@ class PerformanceAlert(models.Model):
         super(PerformanceAlert, self).save(*args, **kwargs)
 
         # check to see if we need to update the summary statuses
-        self.summary.update_status()
+        summaries = [self.summary]
         if self.related_summary:
-            self.related_summary.update_status()
+            summaries.append(self.related_summary)
+        pending_summary_ids = getattr(_status_updates, 'summary_ids', None)
+        if pending_summary_ids is not None:
+            pending_summary_ids.update(summary.id for summary in summaries)
+        else:
+            for summary in summaries:
+                summary.update_status()
 
     class Meta:
         db_table = "performance_alert"
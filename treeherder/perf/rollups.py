@@ -0,0 +1,124 @@
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+
+from treeherder.perf.models import (PerformanceDatum,
+                                    PerformanceDatumDailyRollup,
+                                    PerformanceDatumPushRollup)
+
+
+def _replace_rollups(model, existing, rollups):
+    with transaction.atomic():
+        existing.delete()
+        model.objects.bulk_create(rollups)
+
+
+def update_push_rollups(repository, push, values, existing_signature_ids):
+    """
+    Replace the per-push rollups of a push with ones summarizing the given
+    values (all of the push's, by signature id). Only the signatures in
+    existing_signature_ids had data for the push before, so can have rollups
+    to delete.
+
+    Meant to be called in the transaction storing the new datums, with the
+    values read while holding locks which keep other stores of the
+    signatures' data out until it ends (otherwise concurrent retriggers can
+    replace each other's rollups with ones missing their values).
+    """
+    if existing_signature_ids:
+        PerformanceDatumPushRollup.objects.filter(
+            repository=repository, push=push,
+            signature_id__in=existing_signature_ids).delete()
+    PerformanceDatumPushRollup.objects.bulk_create([
+        PerformanceDatumPushRollup(
+            repository=repository,
+            signature_id=signature_id,
+            push=push,
+            push_timestamp=push.time,
+            **PerformanceDatumPushRollup.summarize(signature_values))
+        for (signature_id, signature_values) in values.items()])
+
+
+def update_daily_rollups(repository_id, day, signature_ids):
+    """
+    Recalculate the daily rollups of a day for the given signatures
+    """
+    start = datetime.datetime.combine(day, datetime.time())
+    values = defaultdict(list)
+    for (signature_id, value) in PerformanceDatum.objects.filter(
+            repository_id=repository_id, signature_id__in=signature_ids,
+            push_timestamp__gte=start,
+            push_timestamp__lt=start + datetime.timedelta(days=1)).values_list(
+                'signature_id', 'value'):
+        values[signature_id].append(value)
+
+    _replace_rollups(
+        PerformanceDatumDailyRollup,
+        PerformanceDatumDailyRollup.objects.filter(
+            repository_id=repository_id, day=day, signature_id__in=signature_ids),
+        [PerformanceDatumDailyRollup(
+            repository_id=repository_id,
+            signature_id=signature_id,
+            day=day,
+            **PerformanceDatumDailyRollup.summarize(signature_values))
+         for (signature_id, signature_values) in values.items()])
+
+
+def update_changed_daily_rollups(since):
+    """
+    Recalculate the daily rollups of the days and signatures with per-push
+    rollups which have changed since the given time
+    """
+    signatures_by_day = defaultdict(set)
+    for (repository_id, signature_id, push_timestamp) in \
+            PerformanceDatumPushRollup.objects.filter(
+                last_updated__gte=since).values_list(
+                    'repository_id', 'signature_id', 'push_timestamp'):
+        signatures_by_day[(repository_id, push_timestamp.date())].add(signature_id)
+
+    for ((repository_id, day), signature_ids) in signatures_by_day.items():
+        update_daily_rollups(repository_id, day, signature_ids)
+
+
+def rebuild_rollups(repository, signature_ids, start_day):
+    """
+    Recalculate all per-push and daily rollups of the given signatures from
+    a day onwards
+    """
+    start = datetime.datetime.combine(start_day, datetime.time())
+    push_values = defaultdict(list)
+    daily_values = defaultdict(list)
+    push_timestamps = {}
+    for (signature_id, push_id, push_timestamp, value) in \
+            PerformanceDatum.objects.filter(
+                repository=repository, signature_id__in=signature_ids,
+                push_timestamp__gte=start).values_list(
+                    'signature_id', 'push_id', 'push_timestamp', 'value'):
+        push_values[(signature_id, push_id)].append(value)
+        daily_values[(signature_id, push_timestamp.date())].append(value)
+        push_timestamps[push_id] = push_timestamp
+
+    _replace_rollups(
+        PerformanceDatumPushRollup,
+        PerformanceDatumPushRollup.objects.filter(
+            repository=repository, signature_id__in=signature_ids,
+            push_timestamp__gte=start),
+        [PerformanceDatumPushRollup(
+            repository=repository,
+            signature_id=signature_id,
+            push_id=push_id,
+            push_timestamp=push_timestamps[push_id],
+            **PerformanceDatumPushRollup.summarize(values))
+         for ((signature_id, push_id), values) in push_values.items()])
+    _replace_rollups(
+        PerformanceDatumDailyRollup,
+        PerformanceDatumDailyRollup.objects.filter(
+            repository=repository, signature_id__in=signature_ids,
+            day__gte=start_day),
+        [PerformanceDatumDailyRollup(
+            repository=repository,
+            signature_id=signature_id,
+            day=day,
+            **PerformanceDatumDailyRollup.summarize(values))
+         for ((signature_id, day), values) in daily_values.items()])
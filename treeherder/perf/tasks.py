@@ -1,12 +1,85 @@
+import datetime
+import logging
+
 import newrelic.agent
 from celery import task
+from django.conf import settings
+from django.core.cache import cache
 
 from treeherder.perf.alerts import generate_new_alerts_in_series
 from treeherder.perf.models import PerformanceSignature
+from treeherder.perf.rollups import update_changed_daily_rollups
+
+logger = logging.getLogger(__name__)
+
+# how long a signature stays marked as having alerts generation scheduled, in
+# case its task is lost
+PENDING_ALERTS_TIMEOUT = 60 * 60
+
+DAILY_ROLLUPS_UPDATED_KEY = "perf-daily-rollups-updated"
+
+
+def _pending_alerts_key(signature_id):
+    return "perf-alerts-pending:{}".format(signature_id)
+
+
+def schedule_alert_generation(signature_ids):
+    """
+    Schedule alert generation for signatures with new data
+
+    Signatures which already have alert generation scheduled are skipped
+    (it will pick up the new data when it runs), and the rest are analyzed
+    together by a single task after a short delay.
+    """
+    keys = {_pending_alerts_key(signature_id): signature_id
+            for signature_id in signature_ids}
+    pending_keys = cache.get_many(keys.keys())
+    signature_ids = sorted(keys[key] for key in keys if key not in pending_keys and
+                           cache.add(key, True, PENDING_ALERTS_TIMEOUT))
+    if not signature_ids:
+        return
+
+    generate_alerts.apply_async(
+        args=[signature_ids],
+        countdown=settings.PERFHERDER_ALERTS_SCHEDULING_DELAY.total_seconds(),
+        routing_key='generate_perf_alerts')
 
 
 @task(name='generate-alerts')
-def generate_alerts(signature_id):
-    newrelic.agent.add_custom_parameter("signature_id", str(signature_id))
-    signature = PerformanceSignature.objects.get(id=signature_id)
-    generate_new_alerts_in_series(signature)
+def generate_alerts(signature_ids):
+    # tasks scheduled before signatures were batched have a single id
+    if not isinstance(signature_ids, list):
+        signature_ids = [signature_ids]
+    newrelic.agent.add_custom_parameter("signature_ids",
+                                        ','.join(str(i) for i in signature_ids))
+
+    for signature in PerformanceSignature.objects.filter(id__in=signature_ids):
+        # unmark each signature just before it's analyzed, so that any data
+        # arriving while it is schedules another run, but one which is never
+        # reached stays marked until the timeout
+        cache.delete(_pending_alerts_key(signature.id))
+        # an error in one series shouldn't lose the rest of the batch; the
+        # failed one is analyzed again when it next gets data
+        try:
+            generate_new_alerts_in_series(signature)
+        except Exception:
+            newrelic.agent.record_exception(params={'signature_id': signature.id})
+            logger.exception("Error generating alerts for signature %s", signature.id)
+
+
+@task(name='update-perf-daily-rollups')
+def update_daily_rollups():
+    """
+    Recalculate the daily rollups affected by data ingested since the last run
+    """
+    now = datetime.datetime.now()
+    last_run = cache.get(DAILY_ROLLUPS_UPDATED_KEY)
+    if last_run is None:
+        since = now - settings.PERFHERDER_DAILY_ROLLUPS_LOOKBACK
+    else:
+        # per-push rollups committed by ingestion in progress at the last run
+        # may predate it slightly
+        since = last_run - datetime.timedelta(minutes=5)
+
+    update_changed_daily_rollups(since)
+    cache.set(DAILY_ROLLUPS_UPDATED_KEY, now, None)
@@ -1,5 +1,7 @@
 import copy
 
+import numpy as np
+
 
 def analyze(revision_data, weight_fn=None):
     """Returns the average and sample variance (s**2) of a list of floats.
@@ -105,74 +107,231 @@ class RevisionDatum(object):
                                            self.t, self.change_detected)
 
 
+# the fraction of a series' (shifted) sum of squares below which the sum of
+# squared deviations of a window is considered lost to rounding errors
+IMPRECISE_VARIANCE = 1e-6
+
+
+class _Series(object):
+    """Prefix sums over the values of a sorted list of `RevisionDatum`.
+
+    These allow the (optionally linearly weighted) average and the variance
+    of any window of consecutive revisions to be calculated in constant time,
+    which `detect_changes` uses to analyze every window of a series at once.
+    """
+    def __init__(self, data):
+        counts = np.array([len(d.values) for d in data], dtype=np.int64)
+        values = np.array([v for d in data for v in d.values], dtype=np.float64)
+        revisions = np.repeat(np.arange(len(data), dtype=np.int64), counts)
+
+        # sums of squares lose precision when values are far from zero, so
+        # work relative to a value in the middle of the series (keeping
+        # integer values exact)
+        if len(values):
+            self.shift = np.partition(values, len(values) // 2)[len(values) // 2]
+        else:
+            self.shift = 0.0
+        shifted = values - self.shift
+
+        self.count_sums = _prefix_sums(counts)
+        self.value_sums = _prefix_sums(shifted)
+        self.square_sums = _prefix_sums(shifted ** 2)
+        self.revision_sums = _prefix_sums(revisions)
+        self.weighted_value_sums = _prefix_sums(shifted * revisions)
+
+    def analyze(self, start, end, weights=None):
+        """Vectorized version of `analyze` for the windows of revisions
+        data[start[i]:end[i]].
+
+        `weights` is None for uniform weights, or 'back' or 'fore' for
+        `linear_weights` decreasing away from the end or start of the window
+        respectively (matching the order in which `detect_changes` collects
+        them).  Returns arrays of the averages, numbers of values and
+        variances.
+        """
+        first = self.count_sums[start]
+        last = self.count_sums[end]
+        n = last - first
+        value_sum = self.value_sums[last] - self.value_sums[first]
+
+        if weights is None:
+            weighted_sum = value_sum
+            sum_of_weights = n.astype(np.float64)
+        else:
+            # the linear weight of revision j is proportional to
+            # (j - start + 1) for back windows, and (end - j) for fore windows
+            index_value_sum = self.weighted_value_sums[last] - self.weighted_value_sums[first]
+            index_count_sum = self.revision_sums[last] - self.revision_sums[first]
+            if weights == 'back':
+                weighted_sum = index_value_sum - (start - 1) * value_sum
+                sum_of_weights = (index_count_sum - (start - 1) * n).astype(np.float64)
+            else:
+                weighted_sum = end * value_sum - index_value_sum
+                sum_of_weights = (end * n - index_count_sum).astype(np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg = np.where(n > 0, weighted_sum / sum_of_weights, 0.0)
+            square_sum = self.square_sums[last] - self.square_sums[first]
+            variance = np.where(
+                n > 1,
+                (square_sum - 2 * avg * value_sum + n * avg ** 2) / (n - 1),
+                0.0)
+        variance = np.maximum(variance, 0.0)
+        avg = np.where(n > 0, avg + self.shift, 0.0)
+
+        return avg, n, variance
+
+    def imprecise(self, start, end, stats):
+        """Returns a mask of the windows of revisions data[start[i]:end[i]]
+        whose stats (as returned by `analyze`) may not match those `analyze`
+        gives.
+
+        The variance of a window whose values hardly differ (compared to
+        those of the series before it) is lost to the rounding errors of the
+        prefix sums, and where they don't differ at all `analyze` is left
+        with a variance (and `calc_t` with a t score) made of its own
+        rounding errors, so those windows need analyzing one at a time.
+        """
+        (_, n, variance) = stats
+        last = self.count_sums[end]
+        return (n > 0) & ((n - 1) * variance <=
+                          IMPRECISE_VARIANCE * self.square_sums[last])
+
+
+def _prefix_sums(a):
+    return np.concatenate(([0], np.cumsum(a)))
+
+
+def _calc_t(back, fore, back_size, fore_size):
+    """Vectorized version of `calc_t`, for the stats returned by
+    `_Series.analyze` with linear weights."""
+    (back_avg, back_n, back_variance) = back
+    (fore_avg, fore_n, fore_variance) = fore
+    delta_s = fore_avg - back_avg
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = delta_s / np.sqrt(back_variance / back_n + fore_variance / fore_n)
+    t = np.where((back_variance == 0) & (fore_variance == 0), np.inf, t)
+    t = np.where(delta_s == 0, 0.0, t)
+    t = np.where((back_size == 0) | (fore_size == 0), 0.0, t)
+    return np.abs(t)
+
+
+def _precise_stats(series, data, start, end, stats, backwards=False):
+    """Returns the stats of the windows of revisions data[start[i]:end[i]]
+    (as returned by `_Series.analyze`), with those of the imprecise windows
+    replaced by what `analyze` gives for them, going through the revisions
+    of each window backwards or forwards as `detect_changes` collects them.
+    """
+    (avg, n, variance) = stats
+    (avg, variance) = (avg.copy(), variance.copy())
+    for i in np.flatnonzero(series.imprecise(start, end, stats)):
+        window = data[start[i]:end[i]]
+        window_stats = analyze(window[::-1] if backwards else window)
+        avg[i] = window_stats['avg']
+        variance[i] = window_stats['variance']
+    return (avg, n, variance)
+
+
 def detect_changes(data, min_back_window=12, max_back_window=24,
-                   fore_window=12, t_threshold=7):
+                   fore_window=12, t_threshold=7, first_index=1,
+                   last_seen_regression=0):
+    """Find the revisions in `data` where the values most likely changed.
+
+    To carry on from a previous analysis of the start of a series, pass the
+    revisions already analyzed (at least `max_back_window` of them, if
+    available) along with the new ones, with `first_index` being the index of
+    the first revision to analyze, `last_seen_regression` its value after
+    the revision before it, and the `t` of that revision set.
+    """
     # Use T-Tests
     # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
-    data = sorted(data)
-
-    last_seen_regression = 0
-    for i in range(1, len(data)):
-        di = data[i]
-
-        # keep on getting previous data until we've either got at least 12
-        # data points *or* we've hit the maximum back window
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while di.amount_prev_data < max_back_window and prev_indice >= 0 and (
-                (i - prev_indice) <= min(max(last_seen_regression,
-                                             min_back_window),
-                                         max_back_window)):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
-
-        # accumulate present + future data until we've got at least 12 values
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
-
-        di.historical_stats = analyze(jw)
-        di.forward_stats = analyze(kw)
-
-        di.t = abs(calc_t(jw, kw, linear_weights))
+    data = sorted(data, key=lambda d: d.push_timestamp)
+    first_index = max(first_index, 1)
+    if len(data) <= first_index:
+        return data
+
+    series = _Series(data)
+    indices = np.arange(len(data), dtype=np.int64)
+    count_sums = series.count_sums
+
+    # accumulate present + future data until we've got at least 12 values
+    fore_end = np.clip(np.searchsorted(count_sums, count_sums[:-1] + fore_window),
+                       indices, len(data))
+    forward_stats = series.analyze(indices, fore_end)
+    forward_weighted = series.analyze(indices, fore_end, 'fore')
+    forward_imprecise = series.imprecise(indices, fore_end, forward_weighted)
+
+    # keep on getting previous data until we've either got at least 12
+    # data points *or* we've hit the maximum back window.  How many previous
+    # revisions we may look at depends on how long ago the last regression
+    # was, but can only be one of a handful of lengths, so calculate t for
+    # each of those for the whole series
+    max_back_revisions = indices - (np.searchsorted(
+        count_sums, count_sums[:-1] - max_back_window, side='right') - 1)
+    back_lengths = range(min(min_back_window, max_back_window),
+                         max_back_window + 1)
+    back_starts = []
+    t_by_length = []
+    for length in back_lengths:
+        back_size = np.maximum(np.minimum(np.minimum(length, indices),
+                                          max_back_revisions), 0)
+        back_start = indices - back_size
+        back_weighted = series.analyze(back_start, indices, 'back')
+        back_starts.append(back_start)
+        t = _calc_t(back_weighted, forward_weighted, back_size, fore_end - indices)
+        imprecise = ((series.imprecise(back_start, indices, back_weighted) |
+                      forward_imprecise) & (back_size > 0) & (fore_end > indices))
+        for i in np.flatnonzero(imprecise):
+            t[i] = abs(calc_t(data[back_start[i]:i][::-1], data[i:fore_end[i]],
+                              linear_weights))
+        t_by_length.append(t.tolist())
+
+    chosen_lengths = [0] * len(data)
+    for i in range(first_index, len(data)):
+        chosen = min(max(last_seen_regression, min_back_window),
+                     max_back_window) - back_lengths[0]
+        chosen_lengths[i] = chosen
         # add additional historical data points next time if we
         # haven't detected a likely regression
-        if di.t > t_threshold:
+        if t_by_length[chosen][i] > t_threshold:
             last_seen_regression = 0
         else:
             last_seen_regression += 1
-
-    # Now that the t-test scores are calculated, go back through the data to
-    # find where changes most likely happened.
-    for i in range(1, len(data)):
-        di = data[i]
-
-        # if we don't have enough data yet, skip for now (until more comes
-        # in)
-        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
-            continue
-
-        if di.t <= t_threshold:
-            continue
-
-        # Check the adjacent points
-        prev = data[i-1]
-        if prev.t > di.t:
-            continue
-        # next may or may not exist if it's the last in the series
-        if (i+1) < len(data):
-            next = data[i+1]
-            if next.t > di.t:
-                continue
-
-        # This datapoint has a t value higher than the threshold and higher
-        # than either neighbor.  Mark it as the cause of a regression.
-        di.change_detected = True
+        data[i].last_seen_regression = last_seen_regression
+
+    back_start = np.array(back_starts)[chosen_lengths, indices]
+    historical_stats = _precise_stats(series, data, back_start, indices,
+                                      series.analyze(back_start, indices),
+                                      backwards=True)
+    forward_stats = _precise_stats(series, data, indices, fore_end,
+                                   forward_stats)
+    t = np.array(t_by_length)[chosen_lengths, indices]
+    t[first_index - 1] = data[first_index - 1].t
+
+    stats = list(zip(*[a.tolist() for a in historical_stats + forward_stats + (t,)]))
+    for (di, (prev_avg, prev_n, prev_variance, next_avg, next_n, next_variance,
+              ti)) in zip(data[first_index:], stats[first_index:]):
+        di.amount_prev_data = prev_n
+        di.amount_next_data = next_n
+        di.historical_stats = {"avg": prev_avg, "n": prev_n,
+                               "variance": prev_variance}
+        di.forward_stats = {"avg": next_avg, "n": next_n,
+                            "variance": next_variance}
+        di.t = ti
+
+    # Now that the t-test scores are calculated, find where changes most
+    # likely happened: points with a t value higher than the threshold and
+    # at least as high as either neighbor (the next point may not exist if
+    # it's the last in the series), once we have enough data (until more
+    # comes in)
+    changes = ((historical_stats[1] >= min_back_window) &
+               (forward_stats[1] >= fore_window) &
+               (t > t_threshold) &
+               (t >= np.concatenate(([np.inf], t[:-1]))) &
+               (t >= np.concatenate((t[1:], [-np.inf]))))
+    changes[:first_index] = False
+    for i in np.flatnonzero(changes):
+        data[i].change_detected = True
 
     return data
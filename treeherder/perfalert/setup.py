@@ -21,5 +21,5 @@ setup(name='perfalert',
       license='MPL',
       packages=['perfalert'],
       zip_safe=False,
-      install_requires=[]
+      install_requires=['numpy']
       )
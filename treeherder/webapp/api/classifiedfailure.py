@@ -157,15 +157,13 @@ class ClassifiedFailureViewSet(viewsets.ModelViewSet):
 
     @detail_route(methods=['get'])
     def matches(self, request, pk=None):
-        serializer_class = serializers.FailureLineNoStackSerializer
-
-        queryset = FailureLine.objects.filter(
-            best_classification__id=pk).prefetch_related('matches').all()
-        page = self.paginate_queryset(queryset)
+        queryset = FailureLine.objects.filter(best_classification__id=pk)
+        # paginate the ids of the lines, and serialize the page of them from
+        # their values rather than with the serializer
+        page = self.paginate_queryset(queryset.values('id'))
 
         if page:
-            serializer = serializer_class(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializers.serialize_failure_lines(
+                queryset.filter(id__in=[line['id'] for line in page]).order_by('-id')))
 
-        serializer = serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        return Response(serializers.serialize_failure_lines(queryset))
@@ -0,0 +1,103 @@
+import datetime
+import functools
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import (http_date,
+                               quote_etag)
+from rest_framework.response import Response
+
+from treeherder.model.models import get_table_version
+
+
+def conditional_response(get_validator):
+    """
+    Decorator making the GET responses of a viewset method conditional on a
+    cheap validator of the resource, such as a table version or the last
+    modified time, returning 304 Not Modified for unchanged resources
+    without calling the method, and sharing the rendered responses between
+    clients in the django cache
+
+    ``get_validator`` is called with the same arguments as the method, and
+    returns a value whose repr changes whenever the response would (a
+    datetime also being given as the Last-Modified time), or None if there
+    is no telling, in which case the method is called as usual.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return func(self, request, *args, **kwargs)
+            validator = get_validator(self, request, *args, **kwargs)
+            if validator is None:
+                return func(self, request, *args, **kwargs)
+
+            # the representation depends on the url and the format accepted
+            etag = quote_etag(hashlib.sha1('\n'.join([
+                request.get_full_path(), request.META.get('HTTP_ACCEPT', ''),
+                repr(validator)]).encode('utf-8')).hexdigest())
+            last_modified = None
+            if isinstance(validator, datetime.datetime):
+                last_modified = timegm(validator.utctimetuple())
+
+            response = get_conditional_response(request, etag=etag,
+                                                last_modified=last_modified)
+            if response is None:
+                cache_key = 'conditional-response-{}'.format(etag.strip('"'))
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    (content_type, content) = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = func(self, request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    if isinstance(response, Response):
+                        response.add_post_render_callback(lambda r: cache.set(
+                            cache_key, (r['Content-Type'], r.content),
+                            settings.CONDITIONAL_RESPONSE_CACHE_TIMEOUT))
+
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def table_versions(view, *args, **kwargs):
+    """
+    Validator for the responses of a viewset which depend only on the rows of
+    the tables of its ``versioned_models`` (see ``get_table_version``)
+    """
+    versions = [get_table_version(model) for model in view.versioned_models]
+    if None in versions:
+        return None
+    return versions
+
+
+class TableVersionConditionalMixin(object):
+    """
+    Mixin for read only model viewsets whose responses depend only on the
+    rows of the tables of their ``versioned_models`` (by default just the
+    queryset's model), making them conditional on the versions of those
+    tables
+    """
+
+    @property
+    def versioned_models(self):
+        return [self.queryset.model]
+
+    @conditional_response(table_versions)
+    def list(self, request, *args, **kwargs):
+        return super(TableVersionConditionalMixin, self).list(request, *args, **kwargs)
+
+    @conditional_response(table_versions)
+    def retrieve(self, request, *args, **kwargs):
+        return super(TableVersionConditionalMixin, self).retrieve(request, *args, **kwargs)
@@ -1,9 +1,16 @@
+import base64
 import datetime
+import json
+import time
 
 import django_filters
-from dateutil import parser
+from dateutil import (parser,
+                      tz)
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models as django_models
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework.decorators import (detail_route,
                                        list_route)
@@ -21,6 +28,7 @@ from treeherder.model.models import (FailureLine,
                                      JobDetail,
                                      JobLog,
                                      OptionCollection,
+                                     PushJobCount,
                                      Repository,
                                      TextLogError,
                                      TextLogStep)
@@ -28,6 +36,8 @@ from treeherder.model.tasks import publish_job_action
 from treeherder.webapp.api import (pagination,
                                    permissions,
                                    serializers)
+from treeherder.webapp.api.conditional import conditional_response
+from treeherder.webapp.api.renderers import stream_json
 from treeherder.webapp.api.utils import (CharInFilter,
                                          NumberInFilter,
                                          to_timestamp)
@@ -168,47 +178,157 @@ class JobsViewSet(viewsets.ViewSet):
     _option_collection_hash_idx = [pq[0] for pq in _property_query_mapping].index(
         'option_collection_hash')
 
-    def _get_job_list_response(self, job_qs, offset, count, return_type):
+    # worked out once here, as they're needed for every job listed
+    _property_names = [pq[0] for pq in _property_query_mapping] + ['platform_option']
+    _property_fields = [pq[1] for pq in _property_query_mapping]
+    _property_transforms = [(i, pq[2]) for (i, pq) in enumerate(_property_query_mapping)
+                            if pq[2]]
+
+    # the properties whose values come from a small set of reference data,
+    # which compact responses give once in a dictionary per property, with
+    # each job's value being an index into it
+    _compact_property_names = [
+        'build_architecture', 'build_os', 'build_platform',
+        'build_system_type', 'job_group_description', 'job_group_name',
+        'job_group_symbol', 'job_type_description', 'job_type_name',
+        'job_type_symbol', 'machine_name', 'machine_platform_architecture',
+        'machine_platform_os', 'option_collection_hash', 'platform',
+        'platform_option', 'reason', 'ref_data_name', 'result', 'signature',
+        'state', 'who'
+    ]
+    _compact_property_idx = list(map(_property_names.index,
+                                     _compact_property_names))
+
+    # the orderings jobs can be paged through with a cursor, each of which
+    # (with the id as a tie breaker) is covered by an index
+    _cursor_orderings = ['push_id', 'last_modified']
+
+    def _get_job_rows(self, job_values, return_type, dictionaries=None):
         '''
         custom method to serialize + format jobs information
 
         It's worth doing this big ugly thing (as opposed to using
         the django rest framework serializer or whatever) as
         this function is often in the critical path
+
+        For the compact return type, the values of each dictionary-encoded
+        property are added to its list in ``dictionaries`` as they are first
+        seen, and replaced by their index in it.
         '''
         option_collection_map = OptionCollection.objects.get_option_collection_map()
-        results = []
-        for values in job_qs[offset:(offset+count)].values_list(
-                *[pq[1] for pq in self._property_query_mapping]):
-            platform_option = option_collection_map.get(
-                values[self._option_collection_hash_idx],
-                "")
-            # some values need to be transformed
+        if return_type == 'compact':
+            encodings = [(i, {}, dictionaries.setdefault(name, []))
+                         for (i, name) in zip(self._compact_property_idx,
+                                              self._compact_property_names)]
+        for values in job_values:
             values = list(values)
-            for (i, value) in enumerate(values):
-                func = self._property_query_mapping[i][2]
-                if func:
-                    values[i] = func(values[i])
-            # append results differently depending on if we are returning
+            values.append(option_collection_map.get(
+                values[self._option_collection_hash_idx], ""))
+            # some values need to be transformed
+            for (i, func) in self._property_transforms:
+                values[i] = func(values[i])
+            # return results differently depending on if we are returning
             # a dictionary or a list
             if return_type == 'dict':
-                results.append(dict(zip(
-                    [pq[0] for pq in self._property_query_mapping] +
-                    ['platform_option'],
-                    values + [platform_option])))
+                yield dict(zip(self._property_names, values))
             else:
-                results.append(values + [platform_option])
+                if return_type == 'compact':
+                    for (i, indices, dictionary) in encodings:
+                        index = indices.get(values[i])
+                        if index is None:
+                            index = indices[values[i]] = len(dictionary)
+                            dictionary.append(values[i])
+                        values[i] = index
+                yield values
 
+    def _get_job_list_response(self, job_qs, offset, count, return_type):
+        dictionaries = {}
         response_dict = {
-            'results': results
+            'results': list(self._get_job_rows(
+                job_qs[offset:(offset+count)].values_list(*self._property_fields),
+                return_type, dictionaries))
         }
-        if return_type == 'list':
+        if return_type in ('list', 'compact'):
             response_dict.update({
-                'job_property_names': [pq[0] for pq in self._property_query_mapping] + ['platform_option']
+                'job_property_names': self._property_names
             })
+        if return_type == 'compact':
+            response_dict['dictionaries'] = dictionaries
 
         return response_dict
 
+    @staticmethod
+    def _encode_cursor(order_by, key, job_id):
+        if isinstance(key, datetime.datetime):
+            key = key.isoformat()
+        return base64.urlsafe_b64encode(json.dumps([order_by, key, job_id]))
+
+    def _decode_cursor(self, cursor):
+        '''
+        Returns the ordering, ordering key and id of the last job of the
+        page before the one a cursor is for, raising ValueError if invalid
+        '''
+        try:
+            (order_by, key, job_id) = json.loads(base64.urlsafe_b64decode(
+                str(cursor)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if order_by not in self._cursor_orderings:
+            raise ValueError("Invalid cursor")
+        if order_by == 'last_modified':
+            key = parser.parse(key)
+        return (order_by, key, int(job_id))
+
+    @staticmethod
+    def _after_cursor(job_qs, order_by, key, job_id):
+        # rather than (key > k OR (key = k AND id > i)), which MySQL
+        # can't use an index range scan for
+        return job_qs.filter(**{order_by + '__gte': key}).exclude(
+            **{order_by: key, 'id__lte': job_id})
+
+    def _get_job_list_stream(self, job_qs, order_by, cursor, count, return_type,
+                             meta):
+        '''
+        Returns a response streaming a page of jobs from the database as they
+        are read, after the job a cursor points at (keyset pagination), so
+        that the cost of a page doesn't depend on how deep into the list of
+        jobs it is
+        '''
+        if cursor:
+            job_qs = self._after_cursor(job_qs, *cursor)
+        key_idx = self._property_fields.index(order_by)
+        id_idx = self._property_fields.index('id')
+        # fetch one more job than needed, to tell if there is a next page
+        page = {'last': None, 'more': False}
+
+        def get_job_values():
+            job_values = job_qs.order_by(order_by, 'id')[:count + 1].values_list(
+                *self._property_fields)
+            for (i, values) in enumerate(job_values.iterator()):
+                if i == count:
+                    page['more'] = True
+                    break
+                page['last'] = values
+                yield values
+
+        def get_data():
+            last = page['last']
+            data = {
+                'meta': dict(meta, next_cursor=self._encode_cursor(
+                    order_by, last[key_idx], last[id_idx]) if page['more'] else None)
+            }
+            if return_type in ('list', 'compact'):
+                data['job_property_names'] = self._property_names
+            if return_type == 'compact':
+                data['dictionaries'] = dictionaries
+            return data
+
+        dictionaries = {}
+        return StreamingHttpResponse(
+            stream_json(self._get_job_rows(get_job_values(), return_type,
+                                           dictionaries), get_data),
+            content_type='application/json')
+
     def _job_action_event(self, job, action, requester_email):
         """
         Helper for issuing an 'action' for a given job (such as
@@ -223,6 +343,12 @@ class JobsViewSet(viewsets.ViewSet):
             routing_key='publish_to_pulse'
         )
 
+    def _get_job_last_modified(self, request, project, pk=None):
+        # a job's details only change along with its last modified time
+        return Job.objects.filter(repository__name=project, id=pk).values_list(
+            'last_modified', flat=True).first()
+
+    @conditional_response(_get_job_last_modified)
     def retrieve(self, request, project, pk=None):
         """
         GET method implementation for detail view
@@ -269,7 +395,15 @@ class JobsViewSet(viewsets.ViewSet):
         Optional parameters (default):
         - offset (0)
         - count (10)
-        - return_type (dict)
+        - return_type (dict): `dict`, `list` (lists of values, in the order
+          of `job_property_names`) or `compact` (lists, with the values of
+          reference data properties given once in `dictionaries` and as
+          indices into them in each list)
+        - cursor: page through the jobs with the cursors given as the
+          `next_cursor` of each page (empty for the first page), rather than
+          with offsets, which get slower the deeper they go
+        - order_by (push_id): the order to page through jobs in with a
+          cursor, either `push_id` or `last_modified`
         """
         MAX_JOBS_COUNT = 2000
 
@@ -309,6 +443,27 @@ class JobsViewSet(viewsets.ViewSet):
                         status=HTTP_400_BAD_REQUEST)
         return_type = filter_params.get("return_type", "dict").lower()
 
+        cursor = filter_params.get("cursor")
+        order_by = filter_params.get("order_by", self._cursor_orderings[0])
+        if cursor is not None:
+            if "offset" in filter_params:
+                return Response("Can't specify both offset and cursor",
+                                status=HTTP_400_BAD_REQUEST)
+            if count < 1:
+                return Response("Invalid value for count",
+                                status=HTTP_400_BAD_REQUEST)
+            if order_by not in self._cursor_orderings:
+                return Response("Invalid value for order_by: {}".format(order_by),
+                                status=HTTP_400_BAD_REQUEST)
+            if cursor:
+                try:
+                    cursor = self._decode_cursor(cursor)
+                except ValueError as e:
+                    return Response(str(e), status=HTTP_400_BAD_REQUEST)
+                if cursor[0] != order_by:
+                    return Response("Cursor is for a different order_by",
+                                    status=HTTP_400_BAD_REQUEST)
+
         if count > MAX_JOBS_COUNT:
             msg = "Specified count exceeds API MAX_JOBS_COUNT value: {}".format(MAX_JOBS_COUNT)
             return Response({"error": msg}, status=HTTP_400_BAD_REQUEST)
@@ -324,6 +479,11 @@ class JobsViewSet(viewsets.ViewSet):
                              repository=repository).select_related(
                                  *self._default_select_related)).qs
 
+        if cursor is not None:
+            return self._get_job_list_stream(
+                jobs, order_by, cursor, count, return_type,
+                meta=dict(repository=project, count=count))
+
         response_body = self._get_job_list_response(jobs, offset, count,
                                                     return_type)
         response_body["meta"] = dict(repository=project, offset=offset,
@@ -331,6 +491,118 @@ class JobsViewSet(viewsets.ViewSet):
 
         return Response(response_body)
 
+    @list_route()
+    def changes(self, request, project):
+        """
+        GET method for a feed of the jobs changed since a cursor
+        Optional parameters:
+        - cursor: the `cursor` of the previous response's meta, to carry on
+          from where it left off
+        - since: the last modified time to start from without a cursor
+          (default: now, less the JOB_CHANGES_DELAY seconds of changes which
+          may not have been committed yet)
+        - push_id__in: comma separated push ids to only include jobs of
+        - count (2000)
+        - timeout (0): how many seconds (up to JOB_CHANGES_MAX_TIMEOUT) to
+          wait for changes to come in if there are none yet, rather than
+          returning none straight away
+
+        Each result only has the properties of a job which differ from
+        those of the result before it, which for the jobs of a push are
+        mostly the same. `meta.more` says whether there were more changes
+        than could be returned; if not (and the request didn't wait for
+        changes), the Retry-After header gives the number of seconds to wait
+        before asking for more.
+        """
+        MAX_JOBS_COUNT = 2000
+
+        try:
+            count = int(request.query_params.get("count", MAX_JOBS_COUNT))
+            timeout = min(float(request.query_params.get("timeout", 0)),
+                          settings.JOB_CHANGES_MAX_TIMEOUT)
+            push_ids = [int(push_id) for push_id in
+                        request.query_params.get("push_id__in", "").split(",")
+                        if push_id]
+        except ValueError:
+            return Response("Invalid value for count, timeout or push_id__in",
+                            status=HTTP_400_BAD_REQUEST)
+        if not 0 < count <= MAX_JOBS_COUNT:
+            return Response("Invalid value for count: {}".format(count),
+                            status=HTTP_400_BAD_REQUEST)
+
+        try:
+            if "cursor" in request.query_params:
+                (order_by, since, last_id) = self._decode_cursor(
+                    request.query_params["cursor"])
+                if order_by != 'last_modified':
+                    raise ValueError("Invalid cursor")
+            elif "since" in request.query_params:
+                since = parser.parse(request.query_params["since"])
+                if since.tzinfo:
+                    since = since.astimezone(tz.tzutc()).replace(tzinfo=None)
+                last_id = 0
+            else:
+                # include the changes which may not have been committed yet
+                (since, last_id) = (datetime.datetime.now() - datetime.timedelta(
+                    seconds=settings.JOB_CHANGES_DELAY), 0)
+        except ValueError as e:
+            return Response(str(e), status=HTTP_400_BAD_REQUEST)
+
+        try:
+            repository = Repository.objects.get(name=project)
+        except Repository.DoesNotExist:
+            return Response({
+                "detail": "No project with name {}".format(project)
+            }, status=HTTP_404_NOT_FOUND)
+
+        jobs = self._after_cursor(Job.objects.filter(repository=repository),
+                                  'last_modified', since, last_id)
+        if push_ids:
+            jobs = jobs.filter(push_id__in=push_ids)
+
+        deadline = time.time() + timeout
+        poll_interval = settings.JOB_CHANGES_POLL_INTERVAL
+        while True:
+            job_values = list(jobs.filter(
+                last_modified__lte=datetime.datetime.now() - datetime.timedelta(
+                    seconds=settings.JOB_CHANGES_DELAY)).order_by(
+                        'last_modified', 'id')[:count + 1].values_list(
+                            *self._property_fields))
+            remaining = deadline - time.time()
+            if job_values or remaining <= 0:
+                break
+            # back off, so that long waits query the database less often
+            time.sleep(min(poll_interval, remaining))
+            poll_interval = min(poll_interval * 2,
+                                settings.JOB_CHANGES_MAX_POLL_INTERVAL)
+
+        more = len(job_values) > count
+        job_values = job_values[:count]
+        if job_values:
+            cursor = self._encode_cursor(
+                'last_modified',
+                job_values[-1][self._property_fields.index('last_modified')],
+                job_values[-1][self._property_fields.index('id')])
+        else:
+            cursor = self._encode_cursor('last_modified', since, last_id)
+
+        results = []
+        previous = {}
+        for job in self._get_job_rows(job_values, 'dict'):
+            results.append({k: v for (k, v) in job.items()
+                            if k not in previous or previous[k] != v})
+            previous = job
+
+        # clients which have caught up without waiting for changes are told
+        # when to poll again
+        headers = {} if more or timeout > 0 else {
+            'Retry-After': str(settings.JOB_CHANGES_RETRY_AFTER)}
+        return Response({
+            'results': results,
+            'meta': dict(repository=project, count=count, cursor=cursor,
+                         more=more)
+        }, headers=headers)
+
     @detail_route(methods=['post'])
     def update_state(self, request, project, pk=None):
         """
@@ -355,8 +627,15 @@ class JobsViewSet(viewsets.ViewSet):
         try:
             job = Job.objects.get(repository__name=project,
                                   id=pk)
-            job.state = state
-            job.save()
+            with transaction.atomic():
+                old_job = Job.objects.select_for_update().values_list(
+                    *PushJobCount.COUNTED_JOB_FIELDS).get(id=job.id)
+                job.state = state
+                job.save()
+                PushJobCount.objects.apply_job_changes(
+                    removed=[old_job],
+                    added=[(job.push_id, job.state, job.result, job.tier,
+                            job.failure_classification_id)])
         except ObjectDoesNotExist:
             return Response("No job with id: {0}".format(pk), status=HTTP_404_NOT_FOUND)
         return Response({"message": "state updated to '{0}'".format(state)})
@@ -384,9 +663,16 @@ class JobsViewSet(viewsets.ViewSet):
             # cancelled jobs in builds-4hr if they never started running.
             # TODO: Remove when we stop using buildbot.
             if job.state == 'pending':
-                job.state = 'completed'
-                job.result = 'usercancel'
-                job.save()
+                with transaction.atomic():
+                    old_job = Job.objects.select_for_update().values_list(
+                        *PushJobCount.COUNTED_JOB_FIELDS).get(id=job.id)
+                    job.state = 'completed'
+                    job.result = 'usercancel'
+                    job.save()
+                    PushJobCount.objects.apply_job_changes(
+                        removed=[old_job],
+                        added=[(job.push_id, job.state, job.result, job.tier,
+                                job.failure_classification_id)])
 
         return Response({"message": "canceled jobs '{0}'".format(job_ids)})
 
@@ -419,13 +705,8 @@ class JobsViewSet(viewsets.ViewSet):
         try:
             job = Job.objects.get(repository__name=project,
                                   id=pk)
-            queryset = FailureLine.objects.filter(
-                job_guid=job.guid).prefetch_related(
-                    "matches", "matches__matcher"
-                )
-            failure_lines = [serializers.FailureLineNoStackSerializer(obj).data
-                             for obj in queryset]
-            return Response(failure_lines)
+            return Response(serializers.serialize_failure_lines(
+                FailureLine.objects.filter(job_guid=job.guid)))
         except ObjectDoesNotExist:
             return Response("No job with id: {0}".format(pk), status=HTTP_404_NOT_FOUND)
 
@@ -457,17 +738,8 @@ class JobsViewSet(viewsets.ViewSet):
         except Job.DoesNotExist:
             return Response("No job with id: {0}".format(pk),
                             status=HTTP_404_NOT_FOUND)
-        textlog_errors = (TextLogError.objects
-                          .filter(step__job=job)
-                          .select_related("_metadata",
-                                          "_metadata__failure_line")
-                          .prefetch_related("classified_failures",
-                                            "matches",
-                                            "matches__matcher")
-                          .order_by('id'))
-        return Response(serializers.TextLogErrorSerializer(textlog_errors,
-                                                           many=True,
-                                                           read_only=True).data)
+        return Response(serializers.serialize_text_log_errors(
+            TextLogError.objects.filter(step__job=job).order_by('id')))
 
     @detail_route(methods=['get'])
     def bug_suggestions(self, request, project, pk=None):
@@ -485,6 +757,10 @@ class JobsViewSet(viewsets.ViewSet):
     def similar_jobs(self, request, project, pk=None):
         """
         Get a list of jobs similar to the one selected.
+        Optional parameters (default):
+        - offset (0)
+        - count (50)
+        - return_type (dict): `dict`, `list` or `compact`, as for the list
         """
         try:
             repository = Repository.objects.get(name=project)
@@ -0,0 +1,21 @@
+import os
+
+from rest_framework import viewsets
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from treeherder.middleware import get_request_metrics
+
+
+class RequestMetricsViewSet(viewsets.ViewSet):
+    """
+    The metrics of the requests handled by the web process serving the
+    request (see ``RequestMetricsMiddleware``), by view and action
+    """
+    permission_classes = (IsAdminUser,)
+
+    def list(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'views': get_request_metrics()
+        })
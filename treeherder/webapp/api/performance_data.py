@@ -4,22 +4,33 @@ from collections import defaultdict
 
 import django_filters
 from django.conf import settings
+from django.db.models import (Count,
+                              Max,
+                              Sum)
 from rest_framework import (exceptions,
                             filters,
                             pagination,
                             viewsets)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import HTTP_400_BAD_REQUEST
 
 from treeherder.model import models
+from treeherder.model.models import get_table_version
 from treeherder.perf.alerts import get_alert_properties
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
                                     PerformanceBugTemplate,
                                     PerformanceDatum,
+                                    PerformanceDatumDailyRollup,
+                                    PerformanceDatumPushRollup,
                                     PerformanceFramework,
-                                    PerformanceSignature)
+                                    PerformanceSignature,
+                                    batched_status_updates)
+from treeherder.webapp.api.conditional import (TableVersionConditionalMixin,
+                                               conditional_response)
 from treeherder.webapp.api.permissions import IsStaffOrReadOnly
+from treeherder.webapp.api.renderers import MessagePackRenderer
 
 from .performance_serializers import (PerformanceAlertSerializer,
                                       PerformanceAlertSummarySerializer,
@@ -29,7 +40,7 @@ from .performance_serializers import (PerformanceAlertSerializer,
 
 class PerformanceSignatureViewSet(viewsets.ViewSet):
 
-    def list(self, request, project):
+    def _get_signatures(self, request, project):
         repository = models.Repository.objects.get(name=project)
 
         signature_data = PerformanceSignature.objects.filter(
@@ -66,10 +77,6 @@ class PerformanceSignatureViewSet(viewsets.ViewSet):
         interval = request.query_params.get('interval')
         start_date = request.query_params.get('start_date')  # 'YYYY-MM-DDTHH:MM:SS
         end_date = request.query_params.get('end_date')  # 'YYYY-MM-DDTHH:MM:SS'
-        if interval and (start_date or end_date):
-            return Response({"message": "Provide either interval only -or- start (and end) date"},
-                            status=HTTP_400_BAD_REQUEST)
-
         if interval:
             signature_data = signature_data.filter(
                 last_updated__gte=datetime.datetime.utcfromtimestamp(
@@ -87,6 +94,35 @@ class PerformanceSignatureViewSet(viewsets.ViewSet):
             signature_data = signature_data.filter(
                 platform__in=platforms)
 
+        return signature_data
+
+    def _get_signatures_validator(self, request, project):
+        if not self._valid_date_params(request):
+            return None
+        # changes whenever signatures are added, updated with new data or
+        # fall out of the interval, with the table version covering changes
+        # to their properties
+        aggregates = self._get_signatures(request, project).aggregate(
+            count=Count('id'), id_sum=Sum('id'), last_updated=Max('last_updated'))
+        version = get_table_version(PerformanceSignature)
+        if version is None:
+            return None
+        return [sorted(aggregates.items()), version]
+
+    @staticmethod
+    def _valid_date_params(request):
+        return not (request.query_params.get('interval') and (
+            request.query_params.get('start_date') or
+            request.query_params.get('end_date')))
+
+    @conditional_response(_get_signatures_validator)
+    def list(self, request, project):
+        if not self._valid_date_params(request):
+            return Response({"message": "Provide either interval only -or- start (and end) date"},
+                            status=HTTP_400_BAD_REQUEST)
+
+        signature_data = self._get_signatures(request, project)
+
         ret = {}
         for (id, signature_hash, option_collection_hash, platform, framework,
              suite, test, lower_is_better, extra_options,
@@ -149,7 +185,8 @@ class PerformancePlatformViewSet(viewsets.ViewSet):
             'platform__platform', flat=True).distinct())
 
 
-class PerformanceFrameworkViewSet(viewsets.ReadOnlyModelViewSet):
+class PerformanceFrameworkViewSet(TableVersionConditionalMixin,
+                                  viewsets.ReadOnlyModelViewSet):
     queryset = PerformanceFramework.objects.all()
     serializer_class = PerformanceFrameworkSerializer
     filter_backends = [filters.OrderingFilter]
@@ -160,6 +197,22 @@ class PerformanceDatumViewSet(viewsets.ViewSet):
     """
     This view serves performance test result data
     """
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (MessagePackRenderer,)
+
+    # the columns of a series in the columnar layout for each resolution, and
+    # the fields they come from
+    COLUMNS = {
+        None: [('id', 'id'), ('job_id', 'job_id'), ('push_id', 'push_id'),
+               ('push_timestamp', 'push_timestamp'), ('value', 'value')],
+        'push': [('push_id', 'push_id'), ('push_timestamp', 'push_timestamp'),
+                 ('value', 'mean'), ('count', 'count'), ('min', 'min'),
+                 ('max', 'max'), ('mean', 'mean'), ('median', 'median')],
+        'day': [('push_timestamp', 'day'), ('value', 'mean'), ('count', 'count'),
+                ('min', 'min'), ('max', 'max'), ('mean', 'mean'),
+                ('median', 'median')]
+    }
+    DELTA_ENCODED_COLUMNS = ('id', 'job_id', 'push_id', 'push_timestamp')
+
     def list(self, request, project):
         repository = models.Repository.objects.get(name=project)
 
@@ -181,9 +234,34 @@ class PerformanceDatumViewSet(viewsets.ViewSet):
             raise exceptions.ValidationError('Can\'t specify both signature_id '
                                              'and signatures in same query')
 
-        datums = PerformanceDatum.objects.filter(
+        resolution = request.query_params.get('resolution')
+        if resolution not in (None, 'push', 'day'):
+            return Response({"message": "Resolution must be either push or day"},
+                            status=HTTP_400_BAD_REQUEST)
+        if resolution and job_ids:
+            return Response({"message": "Can't specify job_id with a resolution"},
+                            status=HTTP_400_BAD_REQUEST)
+        if resolution == 'day' and push_ids:
+            return Response({"message": "Can't specify push_id with a daily resolution"},
+                            status=HTTP_400_BAD_REQUEST)
+
+        interval = request.query_params.get('interval')
+        start_date = request.query_params.get('start_date')  # 'YYYY-MM-DDTHH:MM:SS
+        end_date = request.query_params.get('end_date')  # 'YYYY-MM-DDTHH:MM:SS'
+        if interval and (start_date or end_date):
+            return Response({"message": "Provide either interval only -or- start (and end) date"},
+                            status=HTTP_400_BAD_REQUEST)
+
+        if resolution == 'push':
+            datums = PerformanceDatumPushRollup.objects
+        elif resolution == 'day':
+            datums = PerformanceDatumDailyRollup.objects
+        else:
+            datums = PerformanceDatum.objects
+        timestamp_field = 'day' if resolution == 'day' else 'push_timestamp'
+        datums = datums.filter(
             repository=repository).select_related(
-                'signature__signature_hash').order_by('push_timestamp')
+                'signature__signature_hash').order_by(timestamp_field)
 
         if signature_hashes:
             signature_ids = PerformanceSignature.objects.filter(
@@ -202,22 +280,36 @@ class PerformanceDatumViewSet(viewsets.ViewSet):
             datums = datums.filter(
                 signature__framework__in=frameworks)
 
-        interval = request.query_params.get('interval')
-        start_date = request.query_params.get('start_date')  # 'YYYY-MM-DDTHH:MM:SS
-        end_date = request.query_params.get('end_date')  # 'YYYY-MM-DDTHH:MM:SS'
-        if interval and (start_date or end_date):
-            return Response({"message": "Provide either interval only -or- start (and end) date"},
+        if resolution == 'day':
+            # include every day overlapping the requested range
+            if interval:
+                datums = datums.filter(day__gte=datetime.datetime.utcfromtimestamp(
+                    int(time.time() - int(interval))).date())
+            if start_date:
+                datums = datums.filter(day__gte=start_date[:10])
+            if end_date:
+                datums = datums.filter(day__lte=end_date[:10])
+        else:
+            if interval:
+                datums = datums.filter(
+                    push_timestamp__gt=datetime.datetime.utcfromtimestamp(
+                        int(time.time() - int(interval))))
+            if start_date:
+                datums = datums.filter(push_timestamp__gt=start_date)
+            if end_date:
+                datums = datums.filter(push_timestamp__lt=end_date)
+
+        layout = request.query_params.get('layout')
+        if layout not in (None, 'rows', 'columnar'):
+            return Response({"message": "Layout must be either rows or columnar"},
                             status=HTTP_400_BAD_REQUEST)
+        if layout == 'columnar':
+            return Response(self._get_columnar(
+                datums, self.COLUMNS[resolution],
+                request.query_params.get('delta_encode') == 'true'))
 
-        if interval:
-            datums = datums.filter(
-                push_timestamp__gt=datetime.datetime.utcfromtimestamp(
-                    int(time.time() - int(interval))))
-
-        if start_date:
-            datums = datums.filter(push_timestamp__gt=start_date)
-        if end_date:
-            datums = datums.filter(push_timestamp__lt=end_date)
+        if resolution:
+            return Response(self._get_rollups(datums, resolution))
 
         ret = defaultdict(list)
         values_list = datums.values_list(
@@ -236,6 +328,72 @@ class PerformanceDatumViewSet(viewsets.ViewSet):
 
         return Response(ret)
 
+    @staticmethod
+    def _get_rollups(rollups, resolution):
+        ret = defaultdict(list)
+        if resolution == 'push':
+            values_list = rollups.values_list(
+                'signature_id', 'signature__signature_hash', 'push_id',
+                'push_timestamp', 'count', 'min', 'max', 'mean', 'median')
+        else:
+            values_list = rollups.values_list(
+                'signature_id', 'signature__signature_hash', 'day', 'day',
+                'count', 'min', 'max', 'mean', 'median')
+        for (signature_id, signature_hash, push_id, timestamp, count,
+             min_value, max_value, mean, median) in values_list:
+            datum = {
+                'signature_id': signature_id,
+                'push_timestamp': int(time.mktime(timestamp.timetuple())),
+                'value': round(mean, 2),
+                'count': count,
+                'min': round(min_value, 2),
+                'max': round(max_value, 2),
+                'mean': round(mean, 2),
+                'median': round(median, 2)
+            }
+            if resolution == 'push':
+                datum['push_id'] = push_id
+            ret[signature_hash].append(datum)
+
+        return ret
+
+    @classmethod
+    def _get_columnar(cls, datums, columns, delta_encode):
+        """
+        Returns each series as parallel arrays of values, optionally storing
+        the differences between consecutive ids and timestamps rather than
+        the values themselves
+        """
+        column_names = [name for (name, _) in columns]
+        arrays = {}
+        ret = {}
+        for row in datums.values_list(
+                'signature_id', 'signature__signature_hash',
+                *[field for (_, field) in columns]):
+            series_arrays = arrays.get(row[1])
+            if series_arrays is None:
+                series_arrays = arrays[row[1]] = [[] for _ in columns]
+                ret[row[1]] = {'signature_id': row[0]}
+            for (i, value) in enumerate(row[2:]):
+                series_arrays[i].append(value)
+
+        for (signature_hash, series_arrays) in arrays.items():
+            series = ret[signature_hash]
+            series.update(zip(column_names, series_arrays))
+            series['push_timestamp'] = [int(time.mktime(timestamp.timetuple()))
+                                        for timestamp in series['push_timestamp']]
+            if delta_encode:
+                series['delta_encoded'] = []
+                for name in cls.DELTA_ENCODED_COLUMNS:
+                    # old datums may have no job
+                    if name in series and None not in series[name]:
+                        values = series[name]
+                        series[name] = values[:1] + [
+                            b - a for (a, b) in zip(values, values[1:])]
+                        series['delta_encoded'].append(name)
+
+        return ret
+
 
 class AlertSummaryPagination(pagination.PageNumberPagination):
     ordering = ('-last_updated', '-id')
@@ -293,7 +451,8 @@ class PerformanceAlertViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         request.data['classifier'] = request.user.email
-        return super(PerformanceAlertViewSet, self).update(request, *args, **kwargs)
+        with batched_status_updates():
+            return super(PerformanceAlertViewSet, self).update(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         data = request.data
@@ -1,7 +1,9 @@
 import datetime
 
+from django.db import transaction
 from rest_framework import viewsets
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import (detail_route,
+                                       list_route)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import (HTTP_400_BAD_REQUEST,
@@ -12,9 +14,11 @@ from serializers import (CommitSerializer,
 from treeherder.model.models import (Commit,
                                      Job,
                                      Push,
+                                     PushJobCount,
                                      Repository)
 from treeherder.model.tasks import publish_job_action
 from treeherder.webapp.api import permissions
+from treeherder.webapp.api.conditional import conditional_response
 from treeherder.webapp.api.utils import (to_datetime,
                                          to_timestamp)
 
@@ -160,6 +164,12 @@ class PushViewSet(viewsets.ViewSet):
 
         return Response(resp)
 
+    def _get_push_id(self, request, project, pk=None):
+        # pushes (and their commits) don't change once stored
+        return Push.objects.filter(repository__name=project, id=pk).values_list(
+            'id', flat=True).first()
+
+    @conditional_response(_get_push_id)
     def retrieve(self, request, project, pk=None):
         """
         GET method implementation for detail view of ``push``
@@ -204,10 +214,18 @@ class PushViewSet(viewsets.ViewSet):
         # Mark pending jobs as cancelled to work around buildbot not including
         # cancelled jobs in builds-4hr if they never started running.
         # TODO: Remove when we stop using buildbot.
-        Job.objects.filter(push_id=pk, state='pending').update(
-            state='completed',
-            result='usercancel',
-            last_modified=datetime.datetime.now())
+        with transaction.atomic():
+            pending_jobs = list(Job.objects.select_for_update().filter(
+                push_id=pk, state='pending').values_list(
+                    'id', *PushJobCount.COUNTED_JOB_FIELDS))
+            Job.objects.filter(id__in=[job[0] for job in pending_jobs]).update(
+                state='completed',
+                result='usercancel',
+                last_modified=datetime.datetime.now())
+            PushJobCount.objects.apply_job_changes(
+                removed=[job[1:] for job in pending_jobs],
+                added=[job[1:2] + ('completed', 'usercancel') + job[4:]
+                       for job in pending_jobs])
 
         return Response({"message": "pending and running jobs canceled for push '{0}'".format(pk)})
 
@@ -223,3 +241,25 @@ class PushViewSet(viewsets.ViewSet):
             return Response("No push with id: {0}".format(pk),
                             status=HTTP_404_NOT_FOUND)
         return Response(push.get_status())
+
+    @list_route()
+    def statuses(self, request, project):
+        """
+        Return the counts of the jobs belonging to each of a set of pushes
+        (given by `id__in`) grouped by job status, keyed by push id.
+        """
+        MAX_PUSH_COUNT = 1000
+
+        try:
+            push_ids = [int(push_id) for push_id in
+                        request.query_params.get("id__in", "").split(",") if push_id]
+        except ValueError:
+            return Response({"error": "Invalid id__in specification"},
+                            status=HTTP_400_BAD_REQUEST)
+        if len(push_ids) > MAX_PUSH_COUNT:
+            return Response({"error": "Too many push ids, the maximum is {}".format(
+                MAX_PUSH_COUNT)}, status=HTTP_400_BAD_REQUEST)
+
+        push_ids = Push.objects.filter(repository__name=project,
+                                       id__in=push_ids).values_list('id', flat=True)
+        return Response(PushJobCount.objects.get_statuses(list(push_ids)))
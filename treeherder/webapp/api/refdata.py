@@ -4,50 +4,54 @@ from rest_framework.response import Response
 
 from treeherder.model import models
 from treeherder.webapp.api import serializers as th_serializers
+from treeherder.webapp.api.conditional import (TableVersionConditionalMixin,
+                                               conditional_response,
+                                               table_versions)
 
 #####################
 # Refdata ViewSets
 #####################
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata Product model"""
     queryset = models.Product.objects.all()
     serializer_class = th_serializers.ProductSerializer
 
 
-class BuildPlatformViewSet(viewsets.ReadOnlyModelViewSet):
+class BuildPlatformViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata BuildPlatform model"""
     queryset = models.BuildPlatform.objects.all()
     serializer_class = th_serializers.BuildPlatformSerializer
 
 
-class JobGroupViewSet(viewsets.ReadOnlyModelViewSet):
+class JobGroupViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata JobGroup model"""
     queryset = models.JobGroup.objects.all()
     serializer_class = th_serializers.JobGroupSerializer
 
 
-class RepositoryViewSet(viewsets.ReadOnlyModelViewSet):
+class RepositoryViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata Repository model"""
     queryset = models.Repository.objects.filter(
         active_status='active').select_related(
             'repository_group')
     serializer_class = th_serializers.RepositorySerializer
+    versioned_models = [models.Repository, models.RepositoryGroup]
 
 
-class MachinePlatformViewSet(viewsets.ReadOnlyModelViewSet):
+class MachinePlatformViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata MachinePlatform model"""
     queryset = models.MachinePlatform.objects.all()
     serializer_class = th_serializers.MachinePlatformSerializer
 
 
-class MachineViewSet(viewsets.ReadOnlyModelViewSet):
+class MachineViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata Machine model"""
     queryset = models.Machine.objects.all()
@@ -57,7 +61,9 @@ class MachineViewSet(viewsets.ReadOnlyModelViewSet):
 class OptionCollectionHashViewSet(viewsets.ViewSet):
 
     """ViewSet for the virtual OptionCollectionHash model"""
+    versioned_models = [models.OptionCollection, models.Option]
 
+    @conditional_response(table_versions)
     def list(self, request):
         option_collection_map = models.OptionCollection.objects.get_option_collection_map(options_as_list=True)
 
@@ -69,14 +75,14 @@ class OptionCollectionHashViewSet(viewsets.ViewSet):
         return Response(ret)
 
 
-class JobTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class JobTypeViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata JobType model"""
     queryset = models.JobType.objects.all()
     serializer_class = th_serializers.JobTypeSerializer
 
 
-class FailureClassificationViewSet(viewsets.ReadOnlyModelViewSet):
+class FailureClassificationViewSet(TableVersionConditionalMixin, viewsets.ReadOnlyModelViewSet):
 
     """ViewSet for the refdata FailureClassification model"""
     queryset = models.FailureClassification.objects.all()
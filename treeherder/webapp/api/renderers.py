@@ -0,0 +1,73 @@
+import json
+
+import msgpack
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders data as MessagePack, a more compact binary equivalent of JSON
+    """
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # the data is JSON's, so all its strings are text: pack them (py2 str
+        # included) as msgpack strings, which clients decode as text rather
+        # than bytes
+        return msgpack.packb(data, use_bin_type=False)
+
+
+def format_event(data, event=None, event_id=None):
+    """
+    Formats data as a server-sent event, with an optional event type and id
+    (an empty id resets the client's last event id)
+    """
+    lines = []
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    if event:
+        lines.append('event: {}'.format(event))
+    lines.append('data: {}'.format(json.dumps(data, cls=encoders.JSONEncoder,
+                                              separators=(',', ':'))))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Renders data as a server-sent error event, for the responses of event
+    stream endpoints which aren't event streams
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_event(data, event='error').encode('utf-8')
+
+
+def stream_json(rows, get_data, rows_key='results'):
+    """
+    Generates the JSON encoding of an object in pieces, so that a long list of
+    rows (``rows_key``) can be written out as it is read, rather than built up
+    in memory first. The object's other keys are given by ``get_data``, which
+    is only called once the rows have been exhausted, so may depend on them.
+    """
+    def encode(data):
+        return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    yield b'{' + encode(rows_key) + b':['
+    for (i, row) in enumerate(rows):
+        yield (b',' if i else b'') + encode(row)
+    data = get_data()
+    if data:
+        yield b'],' + encode(data)[1:]
+    else:
+        yield b']}'
@@ -1,8 +1,14 @@
+from collections import (OrderedDict,
+                         defaultdict,
+                         namedtuple)
+
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
 from treeherder.model import models
+from treeherder.model.error_summary import (bug_suggestions_lines,
+                                            get_filtered_error_lines)
 from treeherder.webapp.api.utils import to_timestamp
 
 
@@ -197,6 +203,166 @@ class TextLogErrorSerializer(serializers.ModelSerializer):
         exclude = ['step']
 
 
+# Values based equivalents of FailureLineNoStackSerializer and
+# TextLogErrorSerializer (and the serializers nested in them), for the
+# endpoints listing hundreds of lines at a time, which build the same
+# representations (down to the order of their keys) from a few values()
+# queries rather than from model instances and nested serializers.
+
+_datetime_field = serializers.DateTimeField()
+_score_field = serializers.DecimalField(max_digits=3, decimal_places=2)
+
+
+def _get_score(score):
+    if score is None:
+        return None
+    return _score_field.to_representation(score)
+
+
+def _get_bugs(bug_numbers):
+    return {bug['id']: OrderedDict([
+        ('id', bug['id']),
+        ('status', bug['status']),
+        ('resolution', bug['resolution']),
+        ('summary', bug['summary']),
+        ('crash_signature', bug['crash_signature']),
+        ('keywords', bug['keywords']),
+        ('os', bug['os']),
+        ('modified', _datetime_field.to_representation(bug['modified'])),
+    ]) for bug in models.Bugscache.objects.filter(id__in=bug_numbers).values()}
+
+
+def _get_matches(match_model, key, ids):
+    """
+    Returns the matches (FailureMatch or TextLogErrorMatch, whose foreign
+    key to the lines is ``key``) and the classified failures of the lines
+    with the given ids, by line id
+    """
+    matches = defaultdict(list)
+    classified_failures = defaultdict(list)
+    rows = list(match_model.objects.filter(**{key + '__in': ids}).order_by('id').values_list(
+        key, 'id', 'score', 'classified_failure_id', 'matcher_id',
+        'classified_failure__bug_number'))
+    bugs = _get_bugs(set(row[5] for row in rows if row[5] is not None))
+    for (line_id, match_id, score, classified_failure_id, matcher_id, bug_number) in rows:
+        matches[line_id].append(OrderedDict([
+            ('id', match_id),
+            ('score', _get_score(score)),
+            ('classified_failure', classified_failure_id),
+            ('matcher', matcher_id),
+        ]))
+    # in the order the classified_failures relation (of the classified
+    # failures joined with their matches) is fetched in
+    for (line_id, match_id, _, classified_failure_id, _, bug_number) in sorted(
+            rows, key=lambda row: (row[3], row[1])):
+        classified_failures[line_id].append(OrderedDict([
+            ('id', classified_failure_id),
+            ('bug', bugs.get(bug_number)),
+            ('bug_number', bug_number),
+        ]))
+    return (matches, classified_failures)
+
+
+def serialize_failure_lines(queryset):
+    """
+    Returns the representations of the failure lines of a queryset, as
+    serialized by FailureLineNoStackSerializer
+    """
+    lines = list(queryset.values(
+        'id', 'job_guid', 'action', 'line', 'test', 'subtest', 'status',
+        'expected', 'message', 'signature', 'level', 'best_is_verified',
+        'created', 'modified', 'repository_id', 'job_log_id',
+        'best_classification_id'))
+    (matches, classified_failures) = _get_matches(
+        models.FailureMatch, 'failure_line_id', [line['id'] for line in lines])
+    # the filtered error lines of each job, to find the unstructured bugs of
+    # its failure lines in
+    error_lines = {}
+
+    rv = []
+    for line in lines:
+        components = models.FailureLine.serialized_components(
+            line['action'], line['status'], line['test'], line['level'],
+            line['message'])
+        if components:
+            if line['job_guid'] not in error_lines:
+                error_lines[line['job_guid']] = get_filtered_error_lines(
+                    models.Job.objects.get(guid=line['job_guid']))
+            unstructured_bugs = models.FailureLine.matching_bugs(
+                components, error_lines[line['job_guid']])
+        else:
+            unstructured_bugs = []
+
+        rv.append(OrderedDict([
+            ('id', line['id']),
+            ('matches', matches[line['id']]),
+            ('classified_failures', classified_failures[line['id']]),
+            ('unstructured_bugs', unstructured_bugs),
+            ('job_guid', line['job_guid']),
+            ('action', line['action']),
+            ('line', line['line']),
+            ('test', line['test']),
+            ('subtest', line['subtest']),
+            ('status', line['status']),
+            ('expected', line['expected']),
+            ('message', line['message']),
+            ('signature', line['signature']),
+            ('level', line['level']),
+            ('best_is_verified', line['best_is_verified']),
+            ('created', _datetime_field.to_representation(line['created'])),
+            ('modified', _datetime_field.to_representation(line['modified'])),
+            ('repository', line['repository_id']),
+            ('job_log', line['job_log_id']),
+            ('best_classification', line['best_classification_id']),
+        ]))
+    return rv
+
+
+_ErrorLine = namedtuple('_ErrorLine', ['line'])
+
+
+def serialize_text_log_errors(queryset):
+    """
+    Returns the representations of the text log errors of a queryset, as
+    serialized by TextLogErrorSerializer, looking up the bug suggestions of
+    all of them at once
+    """
+    errors = list(queryset.values(
+        'id', 'line', 'line_number', '_metadata', '_metadata__failure_line_id',
+        '_metadata__best_is_verified', '_metadata__best_classification_id'))
+    ids = [error['id'] for error in errors]
+    (matches, classified_failures) = _get_matches(
+        models.TextLogErrorMatch, 'text_log_error_id', ids)
+    failure_line_ids = [error['_metadata__failure_line_id'] for error in errors
+                        if error['_metadata__failure_line_id'] is not None]
+    failure_lines = {line['id']: line for line in serialize_failure_lines(
+        models.FailureLine.objects.filter(id__in=failure_line_ids))}
+    bug_suggestions = bug_suggestions_lines(
+        [_ErrorLine(error['line']) for error in errors])
+
+    rv = []
+    for (error, error_bug_suggestions) in zip(errors, bug_suggestions):
+        if error['_metadata'] is None:
+            metadata = None
+        else:
+            metadata = OrderedDict([
+                ('text_log_error', error['id']),
+                ('failure_line', failure_lines.get(error['_metadata__failure_line_id'])),
+                ('best_is_verified', error['_metadata__best_is_verified']),
+                ('best_classification', error['_metadata__best_classification_id']),
+            ])
+        rv.append(OrderedDict([
+            ('id', error['id']),
+            ('matches', matches[error['id']]),
+            ('classified_failures', classified_failures[error['id']]),
+            ('bug_suggestions', error_bug_suggestions),
+            ('metadata', metadata),
+            ('line', error['line']),
+            ('line_number', error['line_number']),
+        ]))
+    return rv
+
+
 class TextLogStepSerializer(serializers.ModelSerializer):
     errors = TextLogErrorSerializer(many=True, read_only=True)
     result = serializers.SerializerMethodField()
@@ -271,13 +437,16 @@ class PushSerializer(serializers.ModelSerializer):
                                "pk": obj.id})
 
     def get_revisions(self, push):
+        # sorted here rather than by the database, so that the commits
+        # prefetched along with a list of pushes are used
         serializer = CommitSerializer(
-            instance=push.commits.all().order_by('-id')[:20],
+            instance=sorted(push.commits.all(), key=lambda commit: commit.id,
+                            reverse=True)[:20],
             many=True)
         return serializer.data
 
     def get_revision_count(self, push):
-        return push.commits.count()
+        return len(push.commits.all())
 
     def get_push_timestamp(self, push):
         return to_timestamp(push.time)
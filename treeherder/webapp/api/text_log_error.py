@@ -25,6 +25,14 @@ class TextLogErrorViewSet(viewsets.ModelViewSet):
                                                      "_metadata__failure_line").all()
     pagination_class = pagination.IdPagination
 
+    def list(self, request):
+        # paginate the ids of the errors, and serialize the page of them from
+        # their values rather than with the serializer
+        page = self.paginate_queryset(TextLogError.objects.values('id'))
+        return self.get_paginated_response(serializers.serialize_text_log_errors(
+            TextLogError.objects.filter(
+                id__in=[error['id'] for error in page]).order_by('-id')))
+
     @transaction.atomic
     def _update(self, data, user, many=True):
         ids = []
@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.status import HTTP_404_NOT_FOUND
+
+from treeherder.model.models import Repository
+from treeherder.model.updates import (get_hub,
+                                      updates_enabled)
+from treeherder.webapp.api.renderers import (EventStreamRenderer,
+                                             format_event)
+
+
+class UpdatesViewSet(viewsets.ViewSet):
+    """
+    A server-sent events stream of the updates to a repository's jobs and
+    pushes, for clients to follow instead of polling the jobs and push
+    endpoints
+    """
+    renderer_classes = (EventStreamRenderer, JSONRenderer)
+
+    def list(self, request, project):
+        """
+        GET method implementation for the event stream, which sends `job`
+        events with the id, guid, push id, state and result of each job
+        stored, and `push` events with the id, revision, author and push
+        timestamp of each new push.
+
+        The connection is closed after UPDATES_STREAM_DURATION seconds, after
+        which clients reconnect, sending the id of the last event they got
+        (as browsers' EventSource does) to be sent the updates since then. A
+        `reset` event means updates have been missed, so the client should
+        fetch the current state of things again.
+
+        The stream is only available when an UPDATES_BUS_URL is configured,
+        and is only served by the web_updates process (which uses async
+        workers), since a connection would hold up a sync worker throughout.
+        """
+        if not updates_enabled():
+            return Response({
+                "detail": "The updates stream is not enabled"
+            }, status=HTTP_404_NOT_FOUND)
+        if not settings.UPDATES_STREAM_SERVER:
+            return Response({
+                "detail": "The updates stream is not served by this server"
+            }, status=HTTP_404_NOT_FOUND)
+        if not Repository.objects.filter(name=project).exists():
+            return Response({
+                "detail": "No project with name {}".format(project)
+            }, status=HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            self._stream(project, request.META.get('HTTP_LAST_EVENT_ID')),
+            content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # stop proxies from holding back events until there are enough of them
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def _stream(project, last_event_id):
+        # subscribe once the stream is started, since the subscription is only
+        # closed by the stream ending, which never happens if the response is
+        # closed before it starts (e.g. as the client has disconnected)
+        subscription = get_hub().subscribe(project, last_event_id=last_event_id)
+        try:
+            deadline = time.time() + settings.UPDATES_STREAM_DURATION
+            while time.time() < deadline:
+                if subscription.overflowed:
+                    subscription.reset()
+                    yield format_event({}, event='reset', event_id='')
+                    continue
+                event = subscription.get(timeout=min(
+                    settings.UPDATES_KEEPALIVE_INTERVAL,
+                    max(deadline - time.time(), 0)))
+                if event:
+                    yield format_event(event['data'], event=event['type'],
+                                       event_id=event['id'])
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            subscription.close()
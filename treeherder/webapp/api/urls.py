@@ -11,13 +11,15 @@ from treeherder.webapp.api import (auth,
                                    failureline,
                                    job_log_url,
                                    jobs,
+                                   metrics,
                                    note,
                                    performance_data,
                                    push,
                                    refdata,
                                    runnable_jobs,
                                    seta,
-                                   text_log_error)
+                                   text_log_error,
+                                   updates)
 
 # router for views that are bound to a project
 # i.e. all those views that don't involve reference data
@@ -59,6 +61,12 @@ project_bound_router.register(
     base_name='push',
 )
 
+project_bound_router.register(
+    r'updates',
+    updates.UpdatesViewSet,
+    base_name='updates',
+)
+
 project_bound_router.register(
     r'note',
     note.NoteViewSet,
@@ -139,6 +147,8 @@ default_router.register(r'jobdetail', jobs.JobDetailViewSet,
                         base_name='jobdetail')
 default_router.register(r'auth', auth.TaskclusterAuthViewSet,
                         base_name='auth')
+default_router.register(r'request-metrics', metrics.RequestMetricsViewSet,
+                        base_name='request-metrics')
 default_router.register(r'seta/failures-fixed-by-commit',
                         seta.SetaFailuresFixedByCommit,
                         base_name='seta_failures_fixed_by_commit')
@@ -1,4 +1,5 @@
 from graphene_django.filter import DjangoFilterConnectionField
+from promise import Promise
 
 
 def collect_fields(node):
@@ -70,3 +71,25 @@ class OptimizedFilterConnectionField(DjangoFilterConnectionField):
         queryset.query.set_limits(low, high)
 
         return queryset
+
+
+class LoadedFilterConnectionField(DjangoFilterConnectionField):
+    """
+    A DjangoFilterConnectionField whose resolver returns a promise of the
+    list of objects (e.g. from a loader), rather than a queryset, so is
+    given just the filter arguments to apply itself
+    """
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, max_limit,
+                            enforce_first_or_last, filterset_class, filtering_args,
+                            root, args, context, info):
+        def resolve_connection(iterable):
+            return super(LoadedFilterConnectionField, cls).connection_resolver(
+                lambda *_: iterable, connection, default_manager, max_limit,
+                enforce_first_or_last, filterset_class, filtering_args,
+                root, args, context, info)
+
+        filter_kwargs = {k: v for k, v in args.items() if k in filtering_args}
+        return Promise.resolve(resolver(root, filter_kwargs, context, info)).then(
+            resolve_connection)
@@ -0,0 +1,99 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from treeherder.model import error_summary
+
+
+class ObjectLoader(DataLoader):
+    """
+    Load objects of a model by id, in a single query per batch
+    """
+
+    def __init__(self, model):
+        super(ObjectLoader, self).__init__()
+        self.model = model
+
+    def batch_load_fn(self, ids):
+        objects = self.model.objects.in_bulk(ids)
+        return Promise.resolve([objects.get(id) for id in ids])
+
+
+class RelatedObjectsLoader(DataLoader):
+    """
+    Load the objects of a queryset related to each of a batch of objects by
+    the given foreign key field, in a single query per batch
+    """
+
+    def __init__(self, queryset, field):
+        super(RelatedObjectsLoader, self).__init__()
+        self.queryset = queryset
+        self.field = field
+
+    def batch_load_fn(self, keys):
+        related_objects = defaultdict(list)
+        for obj in self.queryset.filter(**{self.field + '__in': keys}):
+            related_objects[getattr(obj, self.field)].append(obj)
+        return Promise.resolve([related_objects[key] for key in keys])
+
+
+class BugSuggestionsLoader(DataLoader):
+    """
+    Load the bug suggestions of text log errors, searching for the bugs of
+    a whole batch of errors at once
+    """
+
+    def get_cache_key(self, text_log_error):
+        return text_log_error.id
+
+    def batch_load_fn(self, text_log_errors):
+        return Promise.resolve(error_summary.bug_suggestions_lines(text_log_errors))
+
+
+class Loaders(object):
+    """
+    The loaders of a GraphQL request, which batch up the loads of all the
+    objects resolved at the same level of the query
+    """
+
+    def __init__(self):
+        self.bug_suggestions = BugSuggestionsLoader()
+        self.object_loaders = {}
+        self.related_objects_loaders = {}
+
+    def objects(self, model):
+        if model not in self.object_loaders:
+            self.object_loaders[model] = ObjectLoader(model)
+        return self.object_loaders[model]
+
+    def related_objects(self, model, field, **filters):
+        key = (model, field, tuple(sorted(filters.items())))
+        if key not in self.related_objects_loaders:
+            self.related_objects_loaders[key] = RelatedObjectsLoader(
+                model.objects.filter(**filters), field)
+        return self.related_objects_loaders[key]
+
+
+def get_loaders(context):
+    """
+    Get the loaders of a GraphQL request, given its context (the request)
+    """
+    if not hasattr(context, 'graphql_loaders'):
+        context.graphql_loaders = Loaders()
+    return context.graphql_loaders
+
+
+def load_related(obj, field_name, context):
+    """
+    Resolve a foreign key of an object, from the object if it was fetched
+    with it (e.g. by ``helpers.optimize``), or else batched with the same
+    foreign key of the other objects being resolved
+    """
+    field = obj._meta.get_field(field_name)
+    if hasattr(obj, field.get_cache_name()):
+        return getattr(obj, field_name)
+    related_id = getattr(obj, field.attname)
+    if related_id is None:
+        return None
+    return get_loaders(context).objects(field.related_model).load(related_id)
@@ -4,8 +4,9 @@ from graphene_django.types import DjangoObjectType
 from graphql.utils.ast_to_dict import ast_to_dict
 
 import helpers
-from treeherder.model import error_summary
 from treeherder.model.models import *
+from treeherder.webapp.graphql.loaders import (get_loaders,
+                                               load_related)
 from treeherder.webapp.graphql.types import ObjectScalar
 
 
@@ -25,7 +26,7 @@ class TextLogErrorGraph(DjangoObjectType):
     bug_suggestions = ObjectScalar()
 
     def resolve_bug_suggestions(self, args, context, info):
-        return error_summary.bug_suggestions_line(self)
+        return get_loaders(context).bug_suggestions.load(self)
 
 
 class TextLogStepGraph(DjangoObjectType):
@@ -44,10 +45,38 @@ class JobGraph(DjangoObjectType):
         }
         interfaces = (graphene.relay.Node, )
 
-    job_details = DjangoFilterConnectionField(JobDetailGraph)
+    job_details = helpers.LoadedFilterConnectionField(JobDetailGraph)
 
     def resolve_job_details(self, args, context, info):
-        return JobDetail.objects.filter(job=self, **args)
+        return get_loaders(context).related_objects(
+            JobDetail, 'job_id', **args).load(self.id)
+
+    def resolve_build_platform(self, args, context, info):
+        return load_related(self, 'build_platform', context)
+
+    def resolve_machine_platform(self, args, context, info):
+        return load_related(self, 'machine_platform', context)
+
+    def resolve_machine(self, args, context, info):
+        return load_related(self, 'machine', context)
+
+    def resolve_job_type(self, args, context, info):
+        return load_related(self, 'job_type', context)
+
+    def resolve_job_group(self, args, context, info):
+        return load_related(self, 'job_group', context)
+
+    def resolve_product(self, args, context, info):
+        return load_related(self, 'product', context)
+
+    def resolve_failure_classification(self, args, context, info):
+        return load_related(self, 'failure_classification', context)
+
+    def resolve_repository(self, args, context, info):
+        return load_related(self, 'repository', context)
+
+    def resolve_push(self, args, context, info):
+        return load_related(self, 'push', context)
 
 
 class BuildPlatformGraph(DjangoObjectType):
@@ -0,0 +1,22 @@
+from graphene_django.views import GraphQLView
+from promise import Promise
+
+from treeherder.webapp.graphql.loaders import Loaders
+
+
+class BatchingGraphQLView(GraphQLView):
+    """
+    A GraphQL view whose resolvers can batch up their queries with the
+    request's loaders (see ``loaders.get_loaders``)
+    """
+
+    def get_context(self, request):
+        request.graphql_loaders = Loaders()
+        return request
+
+    def execute(self, *args, **kwargs):
+        # Run the query within a promise callback, so that the loads of the
+        # resolvers are queued up until the query has been walked as far as
+        # it can be, and then dispatched in batches, rather than immediately.
+        return Promise.resolve(None).then(
+            lambda _: super(BatchingGraphQLView, self).execute(*args, **kwargs)).get()